@@ -0,0 +1,47 @@
+"""Compares the size and speed of the binary AST encoding with `pickle`.
+
+Run with `poetry run python benchmarks/ast_codec_benchmark.py`.
+"""
+import gc
+import pickle
+import sys
+import time
+from typing import Any, Callable
+
+from compiler.ast_codec import decode, encode
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from program_generator import generate
+
+SIZE = 1_000_000
+SHAPES = ["control", "nesting", "comments"]
+
+
+def best_time(function: Callable[[], Any], repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    # pickle recurses into the nested dataclasses
+    sys.setrecursionlimit(100_000)
+    print(f"{'shape':<10} {'format':<8} {'bytes':>11} {'encode s':>9} {'decode s':>9}")
+    for shape in SHAPES:
+        tree = parse(tokenize(generate(shape, SIZE)))
+        formats: dict[str, tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+            "codec": (encode, decode),
+            "pickle": (lambda tree: pickle.dumps(tree, pickle.HIGHEST_PROTOCOL), pickle.loads),
+        }
+        for name, (dump, load) in formats.items():
+            data = dump(tree)
+            assert load(data) == tree
+            print(f"{shape:<10} {name:<8} {len(data):>11} {best_time(lambda: dump(tree)):>9.3f} {best_time(lambda: load(data)):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
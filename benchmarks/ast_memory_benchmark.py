@@ -0,0 +1,51 @@
+"""Compares memory and allocations of large ASTs built with and without an `Arena`.
+
+Run with `poetry run python benchmarks/ast_memory_benchmark.py`.
+"""
+import gc
+import random
+import time
+import tracemalloc
+
+from compiler.arena import Arena
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+ARGUMENTS = 100_000
+
+
+def make_source(arguments: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    names = [f"var_{i}" for i in range(50)]
+    parts = []
+    for _ in range(arguments):
+        a, b = rng.choice(names), rng.choice(names)
+        parts.append(f"{a} * {rng.randint(0, 9)} + g({b}, {rng.randint(0, 99)}) - not {a}")
+    return "f(" + ",\n".join(parts) + ")"
+
+
+def measure(name: str, source: str, use_arena: bool) -> None:
+    tokens = tokenize(source)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tree = parse(tokens, Arena() if use_arena else None)
+    elapsed = time.perf_counter() - start
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    size = sum(stat.size for stat in snapshot.statistics('filename'))
+    print(f"{name:<10} {size / 2**20:>10.1f} {blocks:>12} {elapsed:>8.3f}")
+    del tree
+
+
+def main() -> None:
+    source = make_source(ARGUMENTS)
+    print(f"{len(source)} bytes of source code")
+    print(f"{'parser':<10} {'live MiB':>10} {'live blocks':>12} {'seconds':>8}")
+    measure("plain", source, use_arena=False)
+    measure("arena", source, use_arena=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Measures the front end and the compile server on generated programs of several shapes and sizes.
+
+Writes the results to a JSON file and, given a baseline file from an earlier run,
+reports the measurements that got slower than the baseline by more than the threshold.
+
+Run with `poetry run python benchmarks/benchmark_suite.py [--output=results.json]
+[--compare=baseline.json] [--threshold=0.1] [--sizes=1000,10000,100000] [--seed=0]`.
+Exits with status 1 if there are regressions.
+"""
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import compiler
+from compiler.__main__ import call_compiler
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from program_generator import SHAPES, generate
+from server_load_test import request, wait_until_listening
+
+PORT = 3911
+SERVER_REQUESTS = 200
+
+
+def best_time(function: Callable[[], Any], min_total: float = 0.2, max_repeats: int = 20) -> float:
+    """The best time of repeated calls, repeating until `min_total` seconds have passed."""
+    best = float("inf")
+    total = 0.0
+    for _ in range(max_repeats):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        total += elapsed
+        if total >= min_total:
+            break
+    return best
+
+
+def compile_front_end(source: str) -> None:
+    # there is no code generator yet, so this measures everything before it
+    try:
+        call_compiler(source, "(benchmark)")
+    except NotImplementedError:
+        pass
+
+
+def measure_front_end(sizes: list[int], seed: int) -> dict[str, dict[str, float]]:
+    results = {}
+    for shape in SHAPES:
+        for size in sizes:
+            source = generate(shape, size, seed)
+            tokens = tokenize(source)
+            for phase, function in [
+                ("tokenize", lambda: tokenize(source)),
+                ("parse", lambda: parse(tokens)),
+                ("call_compiler", lambda: compile_front_end(source)),
+            ]:
+                seconds = best_time(function)
+                results[f"{phase}/{shape}/{size}"] = {
+                    "seconds": seconds,
+                    "bytes": len(source),
+                    "tokens": len(tokens),
+                    "bytes_per_second": len(source) / seconds,
+                }
+                print(f"{phase:<14} {shape:<11} {len(source):>10} {seconds * 1000:>10.3f} {len(source) / seconds / 1e6:>10.2f}")
+    return results
+
+
+def measure_server(size: int, seed: int) -> dict[str, dict[str, float]]:
+    src_dir = str(Path(compiler.__file__).parent.parent)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "compiler", "serve", f"--port={PORT}"],
+        env={**os.environ, "PYTHONPATH": src_dir}, stdout=subprocess.DEVNULL,
+    )
+    results = {}
+    try:
+        wait_until_listening(PORT)
+        for shape in SHAPES:
+            payload = json.dumps({"command": "compile", "code": generate(shape, size, seed)}).encode()
+            start = time.perf_counter()
+            for _ in range(SERVER_REQUESTS):
+                request(PORT, payload)
+            seconds = (time.perf_counter() - start) / SERVER_REQUESTS
+            results[f"serve/{shape}/{size}"] = {"seconds": seconds, "requests_per_second": 1 / seconds}
+            print(f"{'serve':<14} {shape:<11} {len(payload):>10} {seconds * 1000:>10.3f} {'':>10}")
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]], threshold: float) -> list[str]:
+    """Returns the names of the measurements that are slower than in `baseline` by more than `threshold`."""
+    regressions = []
+    print(f"\n{'measurement':<36} {'baseline ms':>12} {'ms':>10} {'change':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]["seconds"], result["seconds"]
+        change = new / old - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<36} {old * 1000:>12.3f} {new * 1000:>10.3f} {change:>+8.1%}" + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main() -> int:
+    output = "benchmark_results.json"
+    baseline_file: str | None = None
+    threshold = 0.1
+    sizes = [1_000, 10_000, 100_000]
+    seed = 0
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
+            output = m[1]
+        elif (m := re.fullmatch(r'--compare=(.+)', arg)) is not None:
+            baseline_file = m[1]
+        elif (m := re.fullmatch(r'--threshold=(.+)', arg)) is not None:
+            threshold = float(m[1])
+        elif (m := re.fullmatch(r'--sizes=(.+)', arg)) is not None:
+            sizes = [int(size) for size in m[1].split(",")]
+        elif (m := re.fullmatch(r'--seed=(.+)', arg)) is not None:
+            seed = int(m[1])
+        else:
+            raise Exception(f"Unknown argument: {arg}")
+
+    print(f"{'phase':<14} {'shape':<11} {'bytes':>10} {'ms':>10} {'MB/s':>10}")
+    results = measure_front_end(sizes, seed)
+    results.update(measure_server(sizes[0], seed))
+    with open(output, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "seed": seed,
+            "results": results,
+        }, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if baseline_file is not None:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+        if baseline.get("seed") != seed:
+            print(f"Warning: the baseline was generated with seed {baseline.get('seed')}", file=sys.stderr)
+        regressions = compare(results, baseline["results"], threshold)
+        if regressions:
+            print(f"{len(regressions)} measurements regressed by more than {threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
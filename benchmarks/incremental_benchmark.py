@@ -0,0 +1,42 @@
+"""Compares the latency of incremental edits with tokenizing and parsing the whole source again.
+
+Run with `poetry run python benchmarks/incremental_benchmark.py`.
+"""
+import random
+import time
+
+from compiler.incremental import IncrementalParser
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from ast_memory_benchmark import make_source
+
+LINES = 100_000
+EDITS = 20
+
+
+def main() -> None:
+    source = make_source(LINES)
+    print(f"{source.count(chr(10)) + 1} lines, {len(source)} bytes of source code")
+
+    start = time.perf_counter()
+    parse(tokenize(source))
+    full = time.perf_counter() - start
+    print(f"{'full re-parse':<24} {full * 1000:>10.1f} ms")
+
+    incremental = IncrementalParser(source)
+    rng = random.Random(0)
+    for name, inserted in [("same-line edit", "1"), ("edit adding a newline", "\n1")]:
+        timings = []
+        for _ in range(EDITS):
+            # replace a digit, which keeps the program valid
+            offset = incremental.source_code.find(" * ", rng.randrange(len(incremental.source_code) - 100)) + 3
+            start = time.perf_counter()
+            incremental.edit(offset, 1, inserted)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        median = timings[len(timings) // 2]
+        print(f"{name:<24} {median * 1000:>10.1f} ms (median of {EDITS}, {full / median:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Compares the closure-compiling interpreter with a naive tree-walking evaluator on loop-heavy programs.
+
+Run with `poetry run python benchmarks/interpreter_benchmark.py`.
+"""
+import time
+from typing import Callable
+
+from compiler import ast
+from compiler.interpreter import Program, Value
+from compiler.optimizer import divide, remainder, wrap
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+ITERATIONS = 100_000
+
+PROGRAMS = {
+    "counter": "while i < n i = i + 1",
+    "arithmetic": "while i < n i = i + 1 + (i * 7 % 3 - (i * 7) % 3) / 5",
+    "branches": "while not (i >= n) i = if i % 3 == 0 then i + 1 else if i % 3 == 1 then i + 2 else i - 1",
+    "booleans": "while i < n and (i == i or false) i = i + (if (i < 0) == false then 1 else 0)",
+}
+
+OPERATORS: dict[str, Callable[[int, int], Value]] = {
+    "+": lambda a, b: wrap(a + b), "-": lambda a, b: wrap(a - b), "*": lambda a, b: wrap(a * b),
+    "/": lambda a, b: wrap(divide(a, b)), "%": remainder,
+    "==": lambda a, b: a == b, "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">": lambda a, b: a > b, ">=": lambda a, b: a >= b,
+}
+
+
+def evaluate(expr: ast.Expression, env: dict[str, Value]) -> Value:
+    """Evaluates the AST directly, looking variables up by name."""
+    if isinstance(expr, ast.Literal):
+        return expr.value
+    if isinstance(expr, ast.Identifier):
+        if expr.name in ("true", "false"):
+            return expr.name == "true"
+        return env[expr.name]
+    if isinstance(expr, ast.UnaryOp):
+        value = evaluate(expr.value, env)
+        return wrap(-value) if expr.op == "-" else not value  # type: ignore[operator]
+    if isinstance(expr, ast.BinaryOp):
+        if expr.op == "=":
+            assert isinstance(expr.left, ast.Identifier)
+            value = env[expr.left.name] = evaluate(expr.right, env)
+            return value
+        if expr.op == "and":
+            return evaluate(expr.left, env) and evaluate(expr.right, env)
+        if expr.op == "or":
+            return evaluate(expr.left, env) or evaluate(expr.right, env)
+        a, b = evaluate(expr.left, env), evaluate(expr.right, env)
+        return OPERATORS[expr.op](a, b)  # type: ignore[arg-type]
+    if isinstance(expr, ast.IfExpression):
+        if evaluate(expr.cond, env):
+            return evaluate(expr.then_clause, env)
+        return evaluate(expr.else_clause, env) if expr.else_clause is not None else None
+    if isinstance(expr, ast.WhileExpression):
+        while evaluate(expr.cond, env):
+            evaluate(expr.body, env)
+        return None
+    raise Exception(f"cannot evaluate {expr}")
+
+
+def main() -> None:
+    print(f"{ITERATIONS} loop iterations")
+    print(f"{'program':<12} {'tree walker s':>14} {'closures s':>11} {'speedup':>8}")
+    for name, source in PROGRAMS.items():
+        expr = parse(tokenize(source))
+
+        walker_env: dict[str, Value] = {"i": 0, "n": ITERATIONS}
+        start = time.perf_counter()
+        evaluate(expr, walker_env)
+        walker = time.perf_counter() - start
+
+        program = Program(expr)
+        variables: dict[str, Value] = {"i": 0, "n": ITERATIONS}
+        start = time.perf_counter()
+        program(variables)
+        closures = time.perf_counter() - start
+
+        assert variables == walker_env
+        print(f"{name:<12} {walker:>14.3f} {closures:>11.3f} {walker / closures:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Compares tokenizing a large file read into a str with tokenizing it as bytes from a memory map.
+
+Each way runs in its own process, whose peak RSS is reported. The tokens are only
+counted, so the memory is what the source code takes. The pages of a memory-mapped
+file count in RSS once they are read, but belong to the page cache and aren't copied.
+
+Run with `poetry run python benchmarks/mmap_tokenizer_benchmark.py [megabytes]`.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from compiler.tokenizer import map_source_file, scan_spans
+from tokenizer_benchmark import make_source
+
+
+def tokenize_file(mode: str, path: str) -> None:
+    start = time.perf_counter()
+    if mode == "str":
+        with open(path) as f:
+            source = f.read()
+        count = sum(1 for _ in scan_spans(source))
+    else:
+        mapped = map_source_file(path)
+        assert mapped is not None
+        with mapped:
+            count = sum(1 for _ in scan_spans(mapped))
+    print(f"{count} {time.perf_counter() - start}")
+
+
+def main() -> None:
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program")
+        # written a megabyte at a time, because the child processes start with the RSS of this one
+        piece = make_source(1_000_000)
+        with open(path, "w") as f:
+            for _ in range(megabytes):
+                f.write(piece)
+        del piece
+
+        print(f"{'input':<6} {'MB':>6} {'tokens':>10} {'seconds':>9} {'peak RSS MB':>12}")
+        for mode in ["str", "mmap"]:
+            process = subprocess.Popen([sys.executable, __file__, "--child", mode, path], stdout=subprocess.PIPE, text=True)
+            assert process.stdout is not None
+            output = process.stdout.read()
+            _, _, usage = os.wait4(process.pid, 0)
+            tokens, seconds = output.split()
+            # ru_maxrss is in kilobytes on Linux
+            print(f"{mode:<6} {megabytes:>6} {tokens:>10} {float(seconds):>9.2f} {usage.ru_maxrss / 1024:>12.1f}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--child"]:
+        tokenize_file(sys.argv[2], sys.argv[3])
+    else:
+        main()
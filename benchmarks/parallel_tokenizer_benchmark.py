@@ -0,0 +1,32 @@
+"""Compares tokenizing large sources serially and in parallel over chunks of lines.
+
+Run with `poetry run python benchmarks/parallel_tokenizer_benchmark.py [workers]`.
+"""
+import os
+import sys
+import time
+
+from compiler.tokenizer import tokenize_to_buffer, tokenize_parallel
+from tokenizer_benchmark import make_source
+
+SIZES = [100_000, 1_000_000, 10_000_000]
+
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    print(f"{workers} workers")
+    print(f"{'bytes':>12} {'serial s':>10} {'parallel s':>11} {'speedup':>8}")
+    for size in SIZES:
+        source = make_source(size)
+        start = time.perf_counter()
+        serial = tokenize_to_buffer(source)
+        serial_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = tokenize_parallel(source, workers)
+        parallel_seconds = time.perf_counter() - start
+        assert list(parallel) == list(serial)
+        print(f"{size:>12} {serial_seconds:>10.4f} {parallel_seconds:>11.4f} {serial_seconds / parallel_seconds:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""Compares the throughput of the recursive parser and the Pratt parser.
+
+Run with `poetry run python benchmarks/parser_benchmark.py`.
+"""
+import time
+from typing import Callable, Iterable
+
+from compiler import ast, parser, pratt_parser
+from compiler.tokenizer import Token, tokenize
+from ast_memory_benchmark import make_source
+
+ParseFunction = Callable[[Iterable[Token]], ast.Expression]
+
+INPUTS = {
+    "mixed": make_source(20_000),
+    "operators": " + ".join(f"a * {i} - b / 2 % c == d" for i in range(20_000)),
+    "nesting (150)": "(" * 150 + "if a then -b" + ")" * 150,
+}
+
+
+def tokens_per_second(parse: ParseFunction, tokens: list[Token], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        parse(tokens)
+        best = min(best, time.perf_counter() - start)
+    return len(tokens) / best
+
+
+def main() -> None:
+    parsers: dict[str, ParseFunction] = {"recursive": parser.parse, "pratt": pratt_parser.parse}
+    print(f"{'input':<14} {'tokens':>9} " + " ".join(f"{name + ' tok/s':>16}" for name in parsers))
+    for name, source in INPUTS.items():
+        tokens = tokenize(source)
+        repeats = 3 if len(tokens) > 10_000 else 200
+        rates = [tokens_per_second(parse, tokens, repeats) for parse in parsers.values()]
+        print(f"{name:<14} {len(tokens):>9} " + " ".join(f"{rate:>16,.0f}" for rate in rates))
+
+    # the recursive parser hits the recursion limit long before this
+    depth = 100_000
+    tokens = tokenize("(" * depth + "1" + ")" * depth)
+    print(f"{f'nesting ({depth})':<14} {len(tokens):>9} {'(RecursionError)':>16} "
+          f"{tokens_per_second(pratt_parser.parse, tokens, 3):>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
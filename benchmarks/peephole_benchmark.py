@@ -0,0 +1,176 @@
+"""Compares programs compiled with and without the peephole optimizer, in code size and run time.
+
+There is no code generator in the compiler yet, so this has a deliberately naive one, in
+the style of generating one IR instruction at a time: every intermediate value is stored
+in a stack slot and loaded back for the next operation. It compiles the loops of
+`interpreter_benchmark.py`, assembles them with gcc, and runs them.
+
+Run with `poetry run python benchmarks/peephole_benchmark.py [iterations]`.
+"""
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from compiler import ast
+from compiler.optimizer import PassManager
+from compiler.parser import parse
+from compiler.peephole import optimize_assembly
+from compiler.profiling import Profiler
+from compiler.tokenizer import tokenize
+from interpreter_benchmark import PROGRAMS
+
+ITERATIONS = 100_000_000
+RUNS = 3
+
+ARITHMETIC = {"+": "addq", "-": "subq", "*": "imulq"}
+COMPARISONS = {"==": "sete", "!=": "setne", "<": "setl", "<=": "setle", ">": "setg", ">=": "setge"}
+
+
+class NaiveCodegen:
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+        self.slots: dict[str, int] = {}
+        self.labels = 0
+
+    def slot(self, name: str) -> str:
+        if name not in self.slots:
+            self.slots[name] = -8 * (len(self.slots) + 1)
+        return f"{self.slots[name]}(%rbp)"
+
+    def temporary(self) -> str:
+        return self.slot(f"t{len(self.slots)}")
+
+    def label(self) -> str:
+        self.labels += 1
+        return f".L{self.labels}"
+
+    def emit(self, line: str) -> None:
+        self.lines.append(line if line.endswith(":") else f"    {line}")
+
+    def expression(self, expr: ast.Expression) -> str:
+        """Emits the code for `expr` and returns the slot of its value."""
+        result = self.temporary()
+        if isinstance(expr, ast.Literal):
+            self.emit(f"movq ${int(expr.value or 0)}, %rax")
+        elif isinstance(expr, ast.Identifier):
+            if expr.name in ("true", "false"):
+                self.emit(f"movq ${int(expr.name == 'true')}, %rax")
+            else:
+                self.emit(f"movq {self.slot(expr.name)}, %rax")
+        elif isinstance(expr, ast.UnaryOp):
+            self.emit(f"movq {self.expression(expr.value)}, %rax")
+            self.emit("negq %rax" if expr.op == "-" else "xorq $1, %rax")
+        elif isinstance(expr, ast.BinaryOp) and expr.op == "=":
+            assert isinstance(expr.left, ast.Identifier)
+            self.emit(f"movq {self.expression(expr.right)}, %rax")
+            self.emit(f"movq %rax, {self.slot(expr.left.name)}")
+        elif isinstance(expr, ast.BinaryOp) and expr.op in ("and", "or"):
+            end = self.label()
+            self.emit(f"movq {self.expression(expr.left)}, %rax")
+            self.emit("cmpq $0, %rax")
+            self.emit(f"{'je' if expr.op == 'and' else 'jne'} {end}")
+            self.emit(f"movq {self.expression(expr.right)}, %rax")
+            self.emit(f"{end}:")
+        elif isinstance(expr, ast.BinaryOp):
+            left = self.expression(expr.left)
+            right = self.expression(expr.right)
+            self.emit(f"movq {right}, %rcx")
+            self.emit(f"movq {left}, %rax")
+            if expr.op in ARITHMETIC:
+                self.emit(f"{ARITHMETIC[expr.op]} %rcx, %rax")
+            elif expr.op in COMPARISONS:
+                self.emit("cmpq %rcx, %rax")
+                self.emit(f"{COMPARISONS[expr.op]} %al")
+                self.emit("movzbq %al, %rax")
+            else:
+                self.emit("cqto")
+                self.emit("idivq %rcx")
+            self.emit(f"movq {'%rdx' if expr.op == '%' else '%rax'}, %rax")
+        elif isinstance(expr, ast.IfExpression):
+            else_label, end = self.label(), self.label()
+            self.emit(f"movq {self.expression(expr.cond)}, %rax")
+            self.emit("cmpq $0, %rax")
+            self.emit(f"je {else_label}")
+            self.emit(f"movq {self.expression(expr.then_clause)}, %rax")
+            self.emit(f"jmp {end}")
+            self.emit(f"{else_label}:")
+            if expr.else_clause is not None:
+                self.emit(f"movq {self.expression(expr.else_clause)}, %rax")
+            self.emit(f"{end}:")
+        elif isinstance(expr, ast.WhileExpression):
+            start, end = self.label(), self.label()
+            self.emit(f"{start}:")
+            self.emit(f"movq {self.expression(expr.cond)}, %rax")
+            self.emit("cmpq $0, %rax")
+            self.emit(f"je {end}")
+            self.expression(expr.body)
+            self.emit(f"jmp {start}")
+            self.emit(f"{end}:")
+        else:
+            raise Exception(f"cannot generate code for {expr}")
+        self.emit(f"movq %rax, {result}")
+        return result
+
+    def program(self, expr: ast.Expression, iterations: int) -> list[str]:
+        """A `main` that runs `expr` with `i = 0` and `n = iterations`, and prints `i`."""
+        self.emit(f"movq ${iterations}, %rax")
+        self.emit(f"movq %rax, {self.slot('n')}")
+        self.emit(f"movq $0, {self.slot('i')}")
+        self.expression(expr)
+        body = self.lines
+        frame = (len(self.slots) * 8 + 15) // 16 * 16
+        return [
+            "    .section .rodata", ".format:", '    .string "%ld\\n"', "    .text", "    .global main", "main:",
+            "    pushq %rbp", "    movq %rsp, %rbp", f"    subq ${frame}, %rsp",
+            *body,
+            f"    movq {self.slot('i')}, %rsi", "    leaq .format(%rip), %rdi", "    movq $0, %rax", "    call printf@PLT",
+            "    movq $0, %rax", "    movq %rbp, %rsp", "    popq %rbp", "    ret",
+            "    .section .note.GNU-stack,\"\",@progbits",
+        ]
+
+
+def build(lines: list[str], path: Path) -> int:
+    """Assembles `lines` into an executable at `path` and returns the size of its code in bytes."""
+    path.with_suffix(".s").write_text("\n".join(lines) + "\n")
+    subprocess.run(["gcc", "-c", "-o", str(path.with_suffix(".o")), str(path.with_suffix(".s"))], check=True)
+    subprocess.run(["gcc", "-o", str(path), str(path.with_suffix(".o"))], check=True)
+    sizes = subprocess.run(["size", "-A", str(path.with_suffix(".o"))], check=True, capture_output=True, text=True).stdout
+    return next(int(line.split()[1]) for line in sizes.splitlines() if line.startswith(".text"))
+
+
+def run(path: Path) -> tuple[float, str]:
+    """The best time of running the executable at `path`, and its output."""
+    best = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        output = subprocess.run([str(path)], check=True, capture_output=True, text=True).stdout
+        best = min(best, time.perf_counter() - start)
+    return best, output
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else ITERATIONS
+    print(f"{iterations} iterations, best of {RUNS} runs")
+    print(f"{'program':<12} {'lines':>6} {'-O2':>6} {'bytes':>6} {'-O2':>6} {'ms':>8} {'-O2':>8}  rewrites")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, source in PROGRAMS.items():
+            expr = PassManager.for_level(2).run(parse(tokenize(source)))
+            lines = NaiveCodegen().program(expr, iterations)
+            profiler = Profiler()
+            optimized = optimize_assembly(lines, 2, profiler)
+            naive_size = build(lines, Path(directory) / name)
+            optimized_size = build(optimized, Path(directory) / f"{name}-O2")
+            naive_time, naive_output = run(Path(directory) / name)
+            optimized_time, optimized_output = run(Path(directory) / f"{name}-O2")
+            assert naive_output == optimized_output, f"{name}: {naive_output!r} != {optimized_output!r}"
+            rewrites = ", ".join(f"{count} {pattern.removeprefix('rewrites:')}" for pattern, count in profiler.counts.items())
+            print(
+                f"{name:<12} {len(lines):>6} {len(optimized):>6} {naive_size:>6} {optimized_size:>6}"
+                f" {naive_time * 1000:>8.0f} {optimized_time * 1000:>8.0f}  {rewrites}"
+            )
+
+
+if __name__ == '__main__':
+    main()
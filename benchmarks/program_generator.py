@@ -0,0 +1,99 @@
+"""Seeded generator of valid programs of various shapes for the benchmarks.
+
+The same shape, size and seed always give the same program. Only the top level
+of a program can be a `while` loop or an assignment, like the parser requires,
+and nesting is kept shallow enough for the recursive parser.
+"""
+import random
+from typing import Callable
+
+# the deepest nesting generated, which the recursive parser handles within the default recursion limit
+MAX_DEPTH = 100
+
+BINARY_OPERATORS = ["+", "-", "*", "/", "%", "==", "!=", "<", "<=", ">", ">=", "and", "or"]
+
+
+class ProgramGenerator:
+    def __init__(self, seed: int) -> None:
+        self.rng = random.Random(seed)
+        self.names = [f"v{i}" for i in range(64)]
+        self.functions = [f"fn{i}" for i in range(16)]
+
+    def name(self) -> str:
+        return self.rng.choice(self.names)
+
+    def leaf(self) -> str:
+        return str(self.rng.randint(0, 999)) if self.rng.random() < 0.5 else self.name()
+
+    def expression(self, depth: int) -> str:
+        """A random expression nested at most `depth` levels deep."""
+        if depth <= 0:
+            return self.leaf()
+        kind = self.rng.randrange(7)
+        if kind == 0:
+            return f"({self.expression(depth - 1)})"
+        if kind == 1:
+            return f"{self.rng.choice(['-', 'not '])}{self.expression(depth - 1)}"
+        if kind == 2:
+            arguments = ", ".join(self.expression(depth - 1) for _ in range(self.rng.randint(0, 3)))
+            return f"{self.rng.choice(self.functions)}({arguments})"
+        if kind == 3:
+            else_clause = f" else {self.expression(depth - 1)}" if self.rng.random() < 0.7 else ""
+            return f"if {self.expression(depth - 1)} then {self.expression(depth - 1)}{else_clause}"
+        return f"{self.expression(depth - 1)} {self.rng.choice(BINARY_OPERATORS)} {self.expression(depth - 1)}"
+
+    def nested(self, depth: int) -> str:
+        """An expression that nests parentheses, calls, unary operators and `if`s `depth` levels deep."""
+        text = self.leaf()
+        for _ in range(depth):
+            kind = self.rng.randrange(4)
+            if kind == 0:
+                text = f"({text})"
+            elif kind == 1:
+                text = f"{self.rng.choice(self.functions)}({text}, {self.leaf()})"
+            elif kind == 2:
+                text = f"-{text}" if not text.startswith("-") else f"not {text}"
+            else:
+                text = f"if {self.leaf()} then {text} else {self.leaf()}"
+        return text
+
+    def parts(self, make_part: Callable[[], str], size: int) -> list[str]:
+        """Parts from `make_part()` until they add up to about `size` characters."""
+        parts = [make_part()]
+        total = len(parts[0])
+        while total < size:
+            parts.append(make_part())
+            total += len(parts[-1]) + 2
+        return parts
+
+    def program(self, shape: str, size: int) -> str:
+        """A program of the given shape and about `size` characters long."""
+        if shape == "nesting":
+            parts = self.parts(lambda: self.nested(self.rng.randint(MAX_DEPTH // 2, MAX_DEPTH)), size)
+            return f"{self.rng.choice(self.functions)}({', '.join(parts)})"
+        if shape == "operators":
+            parts = self.parts(lambda: f"{self.leaf()} {self.rng.choice(BINARY_OPERATORS)}", size)
+            return " ".join(parts) + f" {self.leaf()}"
+        if shape == "control":
+            arguments = ",\n  ".join(self.parts(lambda: self.expression(4), size))
+            return f"while {self.name()} < {self.leaf()} {self.name()} = {self.name()} = fn0(\n  {arguments}\n)"
+        if shape == "comments":
+            def commented_argument() -> str:
+                comment = " ".join(self.rng.choices(self.names, k=8))
+                return f"  // {comment}\n  {self.expression(2)},  # {self.rng.random()}"
+            return "fn0(\n" + "\n".join(self.parts(commented_argument, size)) + "\n  0\n)"
+        if shape == "whitespace":
+            # the "control" shape with random whitespace after many of the characters
+            program = self.program("control", size // 2)
+            return "".join(
+                char + self.rng.choice(["", " ", "  ", "\t", "\n", "\n\n    "]) if char in " (),+-*/" else char
+                for char in program
+            )
+        raise ValueError(f"unknown program shape: {shape}")
+
+
+SHAPES = ["nesting", "operators", "control", "comments", "whitespace"]
+
+
+def generate(shape: str, size: int, seed: int = 0) -> str:
+    return ProgramGenerator(seed).program(shape, size)
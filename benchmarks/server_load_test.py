@@ -0,0 +1,81 @@
+"""Load-tests the compile server in fork-per-connection mode and in pre-fork mode.
+
+Starts each server mode in turn on a local port, sends requests from
+concurrent clients and reports requests/sec and p50/p99 latency.
+
+Run with `poetry run python benchmarks/server_load_test.py [--requests=N] [--clients=N] [--workers=N]`.
+"""
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import compiler
+
+PORT = 3901
+SOURCE = "while (x < 10) x = x + f(1, 2 * 3) - if a then b else c"
+
+
+def request(port: int, payload: bytes) -> float:
+    start = time.perf_counter()
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(payload)
+        sock.shutdown(socket.SHUT_WR)
+        while sock.recv(65536):
+            pass
+    return time.perf_counter() - start
+
+
+def wait_until_listening(port: int) -> None:
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+    raise Exception(f"server did not start on port {port}")
+
+
+def run(mode: str, port: int, server_args: list[str], requests: int, clients: int) -> None:
+    src_dir = str(Path(compiler.__file__).parent.parent)
+    env = {**os.environ, "PYTHONPATH": src_dir}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "compiler", "serve", f"--port={port}", *server_args],
+        env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_listening(port)
+        payload = json.dumps({"command": "compile", "code": SOURCE}).encode()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(clients) as pool:
+            latencies = sorted(pool.map(lambda _: request(port, payload), range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{mode:<14} {requests / elapsed:>10.0f} {p50:>9.2f} {p99:>9.2f}")
+
+
+def main() -> None:
+    options = {"requests": 2000, "clients": 16, "workers": os.cpu_count() or 4}
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r'--(requests|clients|workers)=(\d+)', arg)) is not None:
+            options[m[1]] = int(m[2])
+        else:
+            raise Exception(f"Unknown argument: {arg}")
+    print(f"{options['requests']} requests from {options['clients']} clients")
+    print(f"{'mode':<14} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    # each mode gets its own port, because handlers forked by a stopped server may still hold the old socket
+    run("forking", PORT, [], options["requests"], options["clients"])
+    run(f"prefork ({options['workers']})", PORT + 1, [f"--workers={options['workers']}"], options["requests"], options["clients"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Measures how single-flight coalescing handles a burst of identical compile requests,
+as when CI fans out the same program to many clients at once.
+
+Starts a fork-per-connection server and sends a burst of concurrent requests, once with
+the same program and once with programs that differ only in a comment, so that none of
+them are coalesced or cached. Reports the wall time of each burst and the server's
+`single_flight` stats.
+
+Run with `poetry run python benchmarks/singleflight_benchmark.py [--clients=N] [--size=N]`.
+"""
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import compiler
+from program_generator import generate
+from server_load_test import request, wait_until_listening
+
+PORT = 3914
+
+
+def stats(port: int) -> dict[str, int]:
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(json.dumps({"command": "stats"}).encode())
+        sock.shutdown(socket.SHUT_WR)
+        return json.loads(sock.makefile().read())["single_flight"]  # type: ignore[no-any-return]
+
+
+def burst(port: int, programs: list[str]) -> float:
+    payloads = [json.dumps({"command": "compile", "code": program}).encode() for program in programs]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(payloads)) as pool:
+        list(pool.map(lambda payload: request(port, payload), payloads))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    options = {"clients": 16, "size": 20_000}
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r'--(clients|size)=(\d+)', arg)) is not None:
+            options[m[1]] = int(m[2])
+        else:
+            raise Exception(f"Unknown argument: {arg}")
+    program = generate("operators", options["size"])
+    src_dir = str(Path(compiler.__file__).parent.parent)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "compiler", "serve", f"--port={PORT}"],
+        env={**os.environ, "PYTHONPATH": src_dir}, stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_listening(PORT)
+        print(f"{options['clients']} concurrent requests, {len(program) / 1024:.0f} KiB program")
+        print(f"{'programs':<10} {'wall ms':>9} {'compiled':>9} {'coalesced':>10}")
+        before = stats(PORT)
+        for name, programs in [
+            ("distinct", [f"// {i}\n{program}" for i in range(options["clients"])]),
+            ("same", [f"// same\n{program}"] * options["clients"]),
+        ]:
+            seconds = burst(PORT, programs)
+            after = stats(PORT)
+            print(
+                f"{name:<10} {seconds * 1000:>9.0f} {after['compiled'] - before['compiled']:>9}"
+                f" {after['coalesced'] - before['coalesced']:>10}"
+            )
+            before = after
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Measures how long one `compile` command takes, from starting Python to exiting,
+when it compiles in-process and when it forwards the program to a running server.
+
+Run with `poetry run python benchmarks/startup_benchmark.py [runs]`.
+There is no code generator yet, so every compilation ends with its error,
+which takes the same path back to the command line as an executable would.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import compiler
+from server_load_test import wait_until_listening
+
+PORT = 3912
+UNUSED_PORT = 3913
+PROGRAM = "x = 1 + 2 * 3\n"
+
+
+def time_command(arguments: list[str], env: dict[str, str], runs: int) -> float:
+    """The median wall time of running the client with `arguments`."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "compiler.client", *arguments], env=env, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    env = {**os.environ, "PYTHONPATH": str(Path(compiler.__file__).parent.parent)}
+    env.pop("COMPILER_SERVER", None)
+    with tempfile.TemporaryDirectory() as directory:
+        program = Path(directory) / "program"
+        program.write_text(PROGRAM)
+        compile_arguments = ["compile", str(program), f"--output={Path(directory) / 'output'}"]
+
+        server = subprocess.Popen([sys.executable, "-m", "compiler", "serve", f"--port={PORT}"], env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_until_listening(PORT)
+            results = [
+                ("in-process", time_command(compile_arguments, env, runs)),
+                ("server", time_command(compile_arguments + [f"--server=127.0.0.1:{PORT}"], env, runs)),
+                ("no server, fallback", time_command(compile_arguments + [f"--server=127.0.0.1:{UNUSED_PORT}"], env, runs)),
+            ]
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'path':<20} {'median ms':>10}")
+    for name, seconds in results:
+        print(f"{name:<20} {seconds * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""Compares the memory used by a list of `Token`s and by a `TokenBuffer`.
+
+Run with `poetry run python benchmarks/token_memory_benchmark.py`.
+"""
+import gc
+import time
+import tracemalloc
+from typing import Callable
+
+from compiler.tokenizer import tokenize, tokenize_to_buffer
+from tokenizer_benchmark import make_source
+
+SIZE = 1_000_000
+
+
+def measure(name: str, build: Callable[[str], object], source: str) -> None:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tokens = build(source)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(tokens)  # type: ignore[arg-type]
+    print(f"{name:<14} {count:>9} {current / count:>12.1f} {peak / 2**20:>10.1f} {elapsed:>8.3f}")
+
+
+def main() -> None:
+    source = make_source(SIZE)
+    print(f"{SIZE} bytes of source code")
+    print(f"{'representation':<14} {'tokens':>9} {'bytes/token':>12} {'peak MiB':>10} {'seconds':>8}")
+    measure("list[Token]", tokenize, source)
+    measure("TokenBuffer", tokenize_to_buffer, source)
+
+
+if __name__ == '__main__':
+    main()
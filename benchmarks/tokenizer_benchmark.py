@@ -0,0 +1,34 @@
+"""Measures how tokenizing time scales with input size.
+
+Run with `poetry run python benchmarks/tokenizer_benchmark.py`.
+"""
+import time
+
+from compiler.tokenizer import tokenize
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+SNIPPET = """\
+// update the counter
+while (counter < limit) counter = counter + step * 2
+if a >= 10 then f(a, b % 3) else -x  # trailing comment
+"""
+
+
+def make_source(size: int) -> str:
+    repeats = size // len(SNIPPET) + 1
+    return (SNIPPET * repeats)[:size]
+
+
+def main() -> None:
+    print(f"{'bytes':>12} {'tokens':>10} {'seconds':>10} {'ns/byte':>10}")
+    for size in SIZES:
+        source = make_source(size)
+        start = time.perf_counter()
+        tokens = tokenize(source)
+        elapsed = time.perf_counter() - start
+        print(f"{size:>12} {len(tokens):>10} {elapsed:>10.4f} {elapsed / size * 1e9:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
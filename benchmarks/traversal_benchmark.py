@@ -0,0 +1,94 @@
+"""Measures the iterative visitor and transformer on trees of about a million nodes,
+against a recursive `isinstance` walk.
+
+Run with `poetry run python benchmarks/traversal_benchmark.py`.
+"""
+import sys
+import time
+from typing import Any, Callable
+
+from compiler import ast
+from compiler.optimizer import fold_constants
+from compiler.traversal import Transformer, Visitor
+
+NODES = 1_000_000
+
+
+class NodeCounter(Visitor[int]):
+    def visit_expression(self, node: ast.Expression, *children: int) -> int:
+        return 1 + sum(children)
+
+
+def count_recursively(expr: ast.Expression) -> int:
+    if isinstance(expr, ast.BinaryOp):
+        return 1 + count_recursively(expr.left) + count_recursively(expr.right)
+    if isinstance(expr, ast.UnaryOp):
+        return 1 + count_recursively(expr.value)
+    if isinstance(expr, ast.IfExpression):
+        return 1 + count_recursively(expr.cond) + count_recursively(expr.then_clause) + (
+            count_recursively(expr.else_clause) if expr.else_clause is not None else 0
+        )
+    if isinstance(expr, ast.WhileExpression):
+        return 1 + count_recursively(expr.cond) + count_recursively(expr.body)
+    if isinstance(expr, ast.FunctionCall):
+        return 1 + sum(count_recursively(argument) for argument in expr.arguments)
+    return 1
+
+
+def balanced_tree(nodes: int) -> ast.Expression:
+    """A tree of all node types, about `nodes` nodes in total, built level by level."""
+    level: list[ast.Expression] = [
+        ast.Literal(i % 7) if i % 3 else ast.Identifier(f"x{i % 10}") for i in range(nodes // 2)
+    ]
+    while len(level) > 1:
+        next_level: list[ast.Expression] = []
+        for i in range(0, len(level) - 1, 2):
+            left, right = level[i], level[i + 1]
+            kind = len(next_level) % 5
+            if kind == 0:
+                next_level.append(ast.BinaryOp(left, "+", right))
+            elif kind == 1:
+                next_level.append(ast.IfExpression(ast.Identifier("true"), left, right))
+            elif kind == 2:
+                next_level.append(ast.FunctionCall(ast.Identifier("f"), [left, ast.UnaryOp("-", right)]))
+            elif kind == 3:
+                next_level.append(ast.WhileExpression(ast.Identifier("false"), ast.BinaryOp(left, "*", right)))
+            else:
+                next_level.append(ast.BinaryOp(left, "<", right))
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0]
+
+
+def deep_tree(nodes: int) -> ast.Expression:
+    """`x + 1 + 1 + ...`, which is as deep as it is long."""
+    expr: ast.Expression = ast.Identifier("x")
+    for _ in range(nodes // 2):
+        expr = ast.BinaryOp(expr, "+", ast.Literal(1))
+    return expr
+
+
+def measure(name: str, function: Callable[[], Any]) -> None:
+    start = time.perf_counter()
+    try:
+        function()
+    except RecursionError:
+        print(f"{name:<36} {'RecursionError':>10}")
+        return
+    print(f"{name:<36} {time.perf_counter() - start:>10.3f}")
+
+
+def main() -> None:
+    print(f"{'tree / walk':<36} {'seconds':>10}")
+    for tree_name, tree in [("balanced", balanced_tree(NODES)), ("deep", deep_tree(NODES))]:
+        print(f"({tree_name}: {NodeCounter().visit(tree)} nodes)")
+        measure(f"{tree_name} / recursive isinstance count", lambda: count_recursively(tree))
+        measure(f"{tree_name} / Visitor count", lambda: NodeCounter().visit(tree))
+        measure(f"{tree_name} / Transformer, no changes", lambda: Transformer().transform(tree))
+        measure(f"{tree_name} / constant folding", lambda: fold_constants(tree))
+
+
+if __name__ == '__main__':
+    sys.setrecursionlimit(10_000)
+    main()
@@ -0,0 +1,61 @@
+"""Measures type checking a program of about a million nodes, from scratch and after edits
+that the incremental parser handles by reusing most of the previous AST.
+
+Run with `poetry run python benchmarks/type_checker_benchmark.py`.
+"""
+import random
+import statistics
+import time
+
+from compiler.incremental import IncrementalParser
+from compiler.type_checker import Int, TypeChecker, Unit
+
+ARGUMENTS = 62_500     # 16 nodes each
+EDITS = 20
+NAMES = [f"var_{i}" for i in range(50)]
+
+
+def make_source(arguments: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for _ in range(arguments):
+        a, b = rng.choice(NAMES), rng.choice(NAMES)
+        parts.append(f"({a} * {rng.randint(0, 9)} + g({b}, {rng.randint(0, 99)})) - (if {a} < {b} then {a} else {b} % 3)")
+    return "f(" + ",\n".join(parts) + ")"
+
+
+def main() -> None:
+    source = make_source(ARGUMENTS)
+    incremental = IncrementalParser(source)
+    functions = {"f": ([Int] * ARGUMENTS, Unit), "g": ([Int, Int], Int)}
+    variables = {name: Int for name in NAMES}
+
+    start = time.perf_counter()
+    checker = TypeChecker(functions)
+    checker.check(incremental.tree, variables)  # type: ignore[arg-type]
+    full = time.perf_counter() - start
+    print(f"{'full check':<28} {full * 1000:>10.1f} ms")
+
+    start = time.perf_counter()
+    checker.check(incremental.tree, variables)  # type: ignore[arg-type]
+    print(f"{'check of the same AST':<28} {(time.perf_counter() - start) * 1000:>10.3f} ms")
+
+    rng = random.Random(0)
+    parse_times, check_times = [], []
+    for _ in range(EDITS):
+        # replace a digit, which keeps the program valid
+        offset = incremental.source_code.find(" * ", rng.randrange(len(incremental.source_code) - 100)) + 3
+        start = time.perf_counter()
+        tree = incremental.edit(offset, 1, str(rng.randint(0, 9)))
+        parse_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        checker.check(tree, variables)
+        check_times.append(time.perf_counter() - start)
+    check = statistics.median(check_times)
+    print(f"{'incremental parse':<28} {statistics.median(parse_times) * 1000:>10.1f} ms (median of {EDITS})")
+    print(f"{'check after an edit':<28} {check * 1000:>10.1f} ms (median of {EDITS}, {full / check:.0f}x faster)")
+    print(f"({checker.reused_subtrees} subtrees reused in the last check)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,104 +1,502 @@
 from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from itertools import repeat
+from pathlib import Path
+import io
 import json
+import multiprocessing
+import os
 import re
 import sys
-from socketserver import ForkingTCPServer, StreamRequestHandler
+import time
+from socketserver import ForkingTCPServer, StreamRequestHandler, TCPServer
 from traceback import format_exception
-from typing import Any
+from typing import Any, Iterable, TextIO
 
+from compiler import binary_protocol
+from compiler.async_server import run_async_server
+from compiler.cache import CompilationCache, cache_key
+from compiler.client import SERVER_ENVIRONMENT_VARIABLE, compile_remote, write_remote_result
+from compiler.interpreter import Program, Value
+from compiler.metrics import ServerMetrics, start_metrics_server, stop_metrics_server
+from compiler.optimizer import DEFAULT_OPTIMIZATION_LEVEL, PassManager
+from compiler.parser import parse
+from compiler.prefork import serve_prefork
+from compiler.profiling import NULL_PROFILER, Profiler, count_nodes
+from compiler.singleflight import SingleFlight
+from compiler.tokenizer import Source, Token, iter_tokens, map_source_file, tokenize_parallel
+
+# sources at least this large are tokenized in parallel by 'compile'
+DEFAULT_PARALLEL_THRESHOLD = 1024 * 1024
+
+
+def parallel_tokenizer_jobs(input_file: str | None, jobs: int | None, parallel_threshold: int) -> int:
+    """The number of processes to tokenize `input_file` with: `jobs`, one per CPU by default,
+    if the file is at least `parallel_threshold` bytes, and otherwise 1."""
+    if input_file is None or os.path.getsize(input_file) < parallel_threshold:
+        return 1
+    return jobs if jobs is not None else os.cpu_count() or 1
+
+
+def call_compiler(
+    source_code: Source | TextIO,
+    input_file_name: str,
+    profiler: Profiler = NULL_PROFILER,
+    optimization_level: int = DEFAULT_OPTIMIZATION_LEVEL,
+    tokenizer_jobs: int = 1,
+) -> bytes:
+    # The source code can also be an open file or a memory-mapped one: it is then tokenized
+    # in chunks or directly as bytes, and the parser consumes the tokens as they are produced.
+    tokens: Iterable[Token]
+    if isinstance(source_code, str) and tokenizer_jobs > 1:
+        tokens = tokenize_parallel(source_code, tokenizer_jobs)
+    else:
+        tokens = iter_tokens(source_code)
+    if profiler.enabled:
+        # tokenize everything up front so that tokenizing and parsing are measured separately
+        with profiler.phase("tokenize"):
+            tokens = list(tokens)
+        profiler.count("tokens", len(tokens))
+    with profiler.phase("parse"):
+        expr = parse(tokens)
+    if profiler.node_counts:
+        profiler.count("nodes", count_nodes(expr))
+    expr = PassManager.for_level(optimization_level).run(expr, profiler)
 
-def call_compiler(source_code: str, input_file_name: str) -> bytes:
     # *** TODO ***
-    # Call your compiler here and return the compiled executable.
+    # Generate code for `expr` and return the compiled executable.
     # Raise an exception on compilation error.
     #
     # The input file name is informational only: you can optionally include in your source locations and error messages,
     # or you can ignore it.
+    #
+    # Pass the generated assembly lines through `optimize_assembly(lines, optimization_level, profiler)`
+    # before assembling them, outside the "codegen" phase, which would otherwise include the "peephole" phase.
     # *** TODO ***
-    raise NotImplementedError("Compiler not implemented")
+    with profiler.phase("codegen"):
+        raise NotImplementedError("Code generation not implemented")
+
+
+def try_compile(source_code: str, input_file_name: str, optimization_level: int = DEFAULT_OPTIMIZATION_LEVEL) -> bytes | str:
+    """Returns the compiled executable, or the formatted error if compilation fails."""
+    try:
+        return call_compiler(source_code, input_file_name, optimization_level=optimization_level)
+    except Exception as e:
+        return "".join(format_exception(e))
+
+
+def compile_batch(
+    sources: list[tuple[str, str]],
+    jobs: int = 1,
+    cache: CompilationCache | None = None,
+    optimization_level: int = DEFAULT_OPTIMIZATION_LEVEL,
+) -> list[bytes | str]:
+    """Compiles `(source_code, input_file_name)` pairs, with `jobs` processes in parallel.
+
+    Returns an executable or an error message for each source, in the same order.
+    """
+    results: dict[int, bytes | str] = {}
+    keys = [cache_key(source_code, f"-O{optimization_level}") for source_code, _ in sources] if cache is not None else []
+    if cache is not None:
+        for i, key in enumerate(keys):
+            if (executable := cache.get(key)) is not None:
+                results[i] = executable
+
+    missing = [i for i in range(len(sources)) if i not in results]
+    source_codes = [sources[i][0] for i in missing]
+    file_names = [sources[i][1] for i in missing]
+    if jobs > 1 and len(missing) > 1:
+        jobs = min(jobs, len(missing))
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("fork")) as pool:
+            # send the programs in chunks to cut per-program overhead
+            compiled = list(pool.map(
+                try_compile, source_codes, file_names, repeat(optimization_level),
+                chunksize=max(1, len(missing) // (jobs * 4)),
+            ))
+    else:
+        compiled = list(map(try_compile, source_codes, file_names, repeat(optimization_level)))
+
+    for i, result in zip(missing, compiled):
+        results[i] = result
+        if cache is not None and isinstance(result, bytes):
+            cache.put(keys[i], result)
+    return [results[i] for i in range(len(sources))]
 
 
 def main() -> int:
     # === Option parsing ===
     command: str | None = None
-    input_file: str | None = None
+    input_files: list[str] = []
     output_file: str | None = None
+    output_dir: str | None = None
+    jobs: int | None = None
+    parallel_threshold = DEFAULT_PARALLEL_THRESHOLD
+    server = os.environ.get(SERVER_ENVIRONMENT_VARIABLE)
+    explicit_optimization_level = False
     host = "127.0.0.1"
     port = 3000
+    cache_dir: str | None = None
+    cache_size = 64 * 1024 * 1024
+    workers: int | None = None
+    queue_size = 32
+    use_asyncio = False
+    metrics_port: int | None = None
+    profile = False
+    profile_json: str | None = None
+    profile_memory = False
+    optimization_level = DEFAULT_OPTIMIZATION_LEVEL
+    variables: dict[str, Value] = {}
     for arg in sys.argv[1:]:
         if (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
             output_file = m[1]
+        elif (m := re.fullmatch(r'--output-dir=(.+)', arg)) is not None:
+            output_dir = m[1]
+        elif (m := re.fullmatch(r'--jobs=(.+)', arg)) is not None:
+            jobs = int(m[1]) if m[1] != 'auto' else os.cpu_count() or 1
+        elif (m := re.fullmatch(r'--parallel-threshold=([0-9]+)', arg)) is not None:
+            parallel_threshold = int(m[1])
+        elif (m := re.fullmatch(r'--server=(.+)', arg)) is not None:
+            server = m[1]
         elif (m := re.fullmatch(r'--host=(.+)', arg)) is not None:
             host = m[1]
         elif (m := re.fullmatch(r'--port=(.+)', arg)) is not None:
             port = int(m[1])
+        elif (m := re.fullmatch(r'--cache-dir=(.+)', arg)) is not None:
+            cache_dir = m[1]
+        elif (m := re.fullmatch(r'--cache-size=(.+)', arg)) is not None:
+            cache_size = int(m[1])
+        elif (m := re.fullmatch(r'--workers=(.+)', arg)) is not None:
+            workers = int(m[1])
+        elif (m := re.fullmatch(r'--queue-size=(.+)', arg)) is not None:
+            queue_size = int(m[1])
+        elif arg == '--async':
+            use_asyncio = True
+        elif (m := re.fullmatch(r'--metrics-port=([0-9]+)', arg)) is not None:
+            metrics_port = int(m[1])
+        elif arg == '--profile':
+            profile = True
+        elif (m := re.fullmatch(r'--profile-json=(.+)', arg)) is not None:
+            profile_json = m[1]
+        elif arg == '--profile-memory':
+            profile_memory = True
+        elif (m := re.fullmatch(r'-O([0-9])', arg)) is not None:
+            optimization_level = int(m[1])
+            explicit_optimization_level = True
+        elif (m := re.fullmatch(r'--var=([a-zA-Z_][a-zA-Z0-9_]*)=(-?[0-9]+|true|false)', arg)) is not None:
+            variables[m[1]] = int(m[2]) if m[2] not in ('true', 'false') else m[2] == 'true'
         elif arg.startswith('-'):
             raise Exception(f"Unknown argument: {arg}")
         elif command is None:
             command = arg
-        elif input_file is None:
-            input_file = arg
         else:
-            raise Exception("Multiple input files not supported")
+            input_files.append(arg)
 
     if command is None:
         print(f"Error: command argument missing", file=sys.stderr)
         return 1
 
-    def read_source_code() -> str:
+    if len(input_files) > 1 and command != 'compile-batch':
+        raise Exception("Multiple input files not supported")
+    input_file = input_files[0] if input_files else None
+
+    def open_source_code() -> TextIO:
         if input_file is not None:
-            with open(input_file) as f:
-                return f.read()
+            return open(input_file)
         else:
-            return sys.stdin.read()
+            return sys.stdin
 
     # === Command implementations ===
 
     if command == 'compile':
-        source_code = read_source_code()
         if output_file is None:
             raise Exception("Output file flag --output=... required")
-        executable = call_compiler(source_code, input_file or '(source code)')
+        profiler = Profiler(profile_memory) if profile or profile_json is not None or profile_memory else NULL_PROFILER
+        # a profile needs the compiler to run in this process
+        if server and not profiler.enabled:
+            with open_source_code() as source_file:
+                source = source_file.read()
+            remote_result = compile_remote(server, source, optimization_level if explicit_optimization_level else None)
+            if remote_result is not None:
+                return write_remote_result(remote_result, output_file, input_file or '(source code)')
+            if input_file is None:
+                sys.stdin = io.StringIO(source)
+        # Large files are read whole and tokenized in parallel, by one process per CPU or '--jobs=N'.
+        # The parser still consumes the tokens in this process, so '--jobs=1' turns it off.
+        parallel_jobs = parallel_tokenizer_jobs(input_file, jobs, parallel_threshold)
+        parallel = parallel_jobs > 1
+        # Otherwise, ASCII files are tokenized as bytes from a memory map, without decoding them into a str.
+        mapped_source = map_source_file(input_file) if input_file is not None and not parallel else None
+        try:
+            if mapped_source is not None:
+                with mapped_source:
+                    executable = call_compiler(mapped_source, input_file or '(source code)', profiler, optimization_level)
+            else:
+                with open_source_code() as source_code:
+                    if parallel:
+                        executable = call_compiler(source_code.read(), input_file or '(source code)', profiler, optimization_level, parallel_jobs)
+                    else:
+                        executable = call_compiler(source_code, input_file or '(source code)', profiler, optimization_level)
+        finally:
+            # the profile is written even if compilation fails
+            if profile or profile_memory:
+                print(profiler.report(), file=sys.stderr)
+            if profile_json is not None:
+                with open(profile_json, "w") as profile_file:
+                    json.dump(profiler.as_dict(), profile_file, indent=2)
         with open(output_file, 'wb') as f:
             f.write(executable)
+    elif command == 'run':
+        # evaluates the program with the interpreter instead of compiling it
+        with open_source_code() as source_code:
+            expr = PassManager.for_level(optimization_level).run(parse(iter_tokens(source_code)))
+        Program(expr)(variables)
+    elif command == 'compile-batch':
+        # compiles each input file to a file of the same name without extension in the output directory
+        if output_dir is None:
+            raise Exception("Output directory flag --output-dir=... required")
+        # the input file that is compiled to each output path
+        output_paths: dict[Path, str] = {}
+        for path in input_files:
+            output_path = Path(output_dir) / Path(path).stem
+            if output_path in output_paths:
+                raise Exception(f"{output_paths[output_path]} and {path} would both be compiled to {output_path}")
+            output_paths[output_path] = path
+        sources = []
+        for path in input_files:
+            with open(path) as source_file:
+                sources.append((source_file.read(), path))
+        os.makedirs(output_dir, exist_ok=True)
+        failures = 0
+        for (output_path, path), result in zip(output_paths.items(), compile_batch(sources, jobs or 1, optimization_level=optimization_level)):
+            if isinstance(result, str):
+                failures += 1
+                print(f"{path}: {result}", file=sys.stderr)
+            else:
+                with open(output_path, 'wb') as f:
+                    f.write(result)
+        if failures > 0:
+            print(f"{failures} of {len(input_files)} programs failed to compile", file=sys.stderr)
+            return 1
     elif command == 'serve':
+        # Identical programs that are compiled at the same time are compiled once. Servers
+        # that share a cache directory also share their compilations in progress.
+        single_flight = SingleFlight(os.path.join(cache_dir, "inflight") if cache_dir is not None else None)
+        cache = CompilationCache(cache_size, cache_dir, single_flight)
+        # created before any worker is forked, so that all of them update the same metrics
+        metrics = ServerMetrics() if metrics_port is not None else None
         try:
-            run_server(host, port)
+            if use_asyncio:
+                metrics_pid = start_metrics_server(metrics, host, metrics_port) if metrics is not None and metrics_port is not None else None
+                try:
+                    run_async_server(
+                        host, port, partial(handle_request, cache=cache, optimization_level=optimization_level, metrics=metrics), workers,
+                        handle_binary_request=partial(handle_binary_request, cache=cache, optimization_level=optimization_level, metrics=metrics),
+                        metrics=metrics,
+                    )
+                finally:
+                    if metrics_pid is not None:
+                        stop_metrics_server(metrics_pid)
+            else:
+                run_server(host, port, cache, workers, queue_size, optimization_level, metrics, metrics_port)
         except KeyboardInterrupt:
             pass
+        finally:
+            single_flight.close()
     else:
         print(f"Error: unknown command: {command}", file=sys.stderr)
         return 1
     return 0
 
 
-def run_server(host: str, port: int) -> None:
-    class Server(ForkingTCPServer):
+def request_jobs(input: dict[str, Any]) -> int:
+    """The number of processes for a request's `"jobs"`, at most one per CPU of the server."""
+    jobs = int(input.get("jobs", 1))
+    if jobs < 1:
+        raise Exception(f'"jobs" must be at least 1, got {jobs}')
+    return min(jobs, os.cpu_count() or 1)
+
+
+def request_profiler(input: dict[str, Any]) -> Profiler:
+    """Returns a profiler for a request with `"profile": true` (and optionally `"profile_memory": true`)."""
+    if input.get("profile") or input.get("profile_memory"):
+        return Profiler(bool(input.get("profile_memory")))
+    return NULL_PROFILER
+
+
+def compile_request(
+    input: dict[str, Any],
+    cache: CompilationCache,
+    optimization_level: int,
+    result: dict[str, Any],
+    metrics: ServerMetrics | None = None,
+) -> bytes:
+    """Compiles the code of a 'compile' request, adding its profile to `result` if one was requested.
+
+    The request's `"optimization_level"` overrides the server's.
+    """
+    source_code = input["code"]
+    level = int(input.get("optimization_level", optimization_level))
+    profiler = request_profiler(input)
+    profile_requested = profiler.enabled
+    if metrics is not None and not profile_requested:
+        # only the phase times are needed
+        profiler = Profiler(node_counts=False)
+    start = time.perf_counter()
+    executable: bytes | None = None
+    try:
+        # a cached executable has no phases to report
+        executable = cache.compile(source_code, lambda: call_compiler(source_code, "(source code)", profiler, level), f"-O{level}")
+        return executable
+    finally:
+        if profile_requested:
+            result["profile"] = profiler.as_dict()
+        if metrics is not None:
+            metrics.observe_compile(
+                time.perf_counter() - start,
+                {name: stats.seconds for name, stats in profiler.phases.items()},
+                len(source_code.encode()),
+                len(executable) if executable is not None else None,
+            )
+
+
+def handle_request(
+    input_str: str,
+    cache: CompilationCache,
+    optimization_level: int = DEFAULT_OPTIMIZATION_LEVEL,
+    metrics: ServerMetrics | None = None,
+) -> dict[str, Any]:
+    result: dict[str, Any] = {}
+    command = None
+    with metrics.request_in_flight() if metrics is not None else nullcontext():
+        try:
+            input = json.loads(input_str)
+            command = input["command"]
+            if command == "compile":
+                executable = compile_request(input, cache, optimization_level, result, metrics)
+                result["program"] = b64encode(executable).decode()
+            elif command == "compile_batch":
+                # each program gets its own result, so one error doesn't fail the whole batch
+                sources = [(code, "(source code)") for code in input["programs"]]
+                result["results"] = [
+                    {"error": compiled} if isinstance(compiled, str) else {"program": b64encode(compiled).decode()}
+                    for compiled in compile_batch(
+                        sources, request_jobs(input), cache, int(input.get("optimization_level", optimization_level)),
+                    )
+                ]
+            elif command == "ping":
+                pass
+            elif command == "stats":
+                result["cache"] = cache.stats.as_dict()
+                if cache.single_flight is not None:
+                    result["single_flight"] = cache.single_flight.stats.as_dict()
+            else:
+                result["error"] = "Unknown command: " + input['command']
+        except Exception as e:
+            result["error"] = "".join(format_exception(e))
+    if metrics is not None:
+        metrics.count_request(command, "error" in result)
+    return result
+
+
+def handle_binary_request(
+    body: bytes | bytearray,
+    cache: CompilationCache,
+    optimization_level: int = DEFAULT_OPTIMIZATION_LEVEL,
+    metrics: ServerMetrics | None = None,
+) -> tuple[dict[str, Any], bytes]:
+    """Like `handle_request`, but returns the executable of a 'compile' command
+    as a separate payload instead of base64 in the result."""
+    metadata: dict[str, Any] = {}
+    command = None
+    try:
+        input = json.loads(body)
+        command = input["command"]
+        if command == "compile":
+            with metrics.request_in_flight() if metrics is not None else nullcontext():
+                executable = compile_request(input, cache, optimization_level, metadata, metrics)
+            if metrics is not None:
+                metrics.count_request(command, False)
+            return metadata, executable
+    except Exception as e:
+        if metrics is not None:
+            metrics.count_request(command, True)
+        return {"error": "".join(format_exception(e)), **metadata}, b""
+    # other commands are counted by 'handle_request'
+    return handle_request(body.decode(), cache, optimization_level, metrics), b""
+
+
+def run_server(
+    host: str,
+    port: int,
+    cache: CompilationCache,
+    workers: int | None = None,
+    queue_size: int = 32,
+    optimization_level: int = DEFAULT_OPTIMIZATION_LEVEL,
+    metrics: ServerMetrics | None = None,
+    metrics_port: int | None = None,
+) -> None:
+    # Without 'workers', every connection is handled in a freshly forked process.
+    # With 'workers', a fixed pool of long-lived processes handles one connection
+    # at a time each, keeping their imports and caches warm between requests.
+    # With 'metrics_port', 'metrics' are served over HTTP from another forked process.
+    class Server(ForkingTCPServer if workers is None else TCPServer):  # type: ignore[misc]
         allow_reuse_address = True
-        request_queue_size = 32
+        request_queue_size = queue_size
 
     class Handler(StreamRequestHandler):
         def handle(self) -> None:
-            result: dict[str, Any] = {}
+            if metrics is None:
+                self.handle_connection()
+                return
+            metrics.connections.inc()
             try:
-                input_str = self.rfile.read().decode()
-                input = json.loads(input_str)
-                if input["command"] == "compile":
-                    source_code = input["code"]
-                    executable = call_compiler(source_code, "(source code)")
-                    result["program"] = b64encode(executable).decode()
-                elif input["command"] == "ping":
-                    pass
-                else:
-                    result["error"] = "Unknown command: " + input['command']
-            except Exception as e:
-                result["error"] = "".join(format_exception(e))
+                self.handle_connection()
+            finally:
+                metrics.connections.dec()
+
+        def handle_connection(self) -> None:
+            # Clients that start with the binary protocol's magic bytes get binary responses,
+            # others send a single JSON request terminated by EOF.
+            start = self.rfile.read(len(binary_protocol.MAGIC))
+            if start == binary_protocol.MAGIC:
+                self.handle_binary()
+                return
+            input_str = (start + self.rfile.read()).decode()
+            result = handle_request(input_str, cache, optimization_level, metrics)
             result_str = json.dumps(result)
             self.request.sendall(str.encode(result_str))
 
-    print(f"Starting TCP server at {host}:{port}")
+        def handle_binary(self) -> None:
+            while True:
+                try:
+                    flags, body = binary_protocol.read_request(self.rfile)
+                except Exception as e:
+                    # the rest of the connection can't be parsed, so answer and close it
+                    binary_protocol.write_response(self.request, {"error": "".join(format_exception(e))}, b"", 0)
+                    return
+                metadata, payload = handle_binary_request(body, cache, optimization_level, metrics)
+                binary_protocol.write_response(self.request, metadata, payload, flags)
+                # further requests on the same connection must start with the magic bytes again
+                start = self.rfile.read(len(binary_protocol.MAGIC))
+                if start != binary_protocol.MAGIC:
+                    return
+
+    print(f"Starting TCP server at {host}:{port}" + (f" with {workers} workers" if workers is not None else ""))
     with Server((host, port), Handler) as server:
-        server.serve_forever()
+        metrics_pid: int | None = None
+        if metrics is not None and metrics_port is not None:
+            metrics.listen_socket = server.socket
+            metrics_pid = start_metrics_server(metrics, host, metrics_port)
+        try:
+            if workers is None:
+                server.serve_forever()
+            else:
+                serve_prefork(server, workers, metrics.workers.set if metrics is not None else None)
+        finally:
+            if metrics_pid is not None:
+                stop_metrics_server(metrics_pid)
 
 
 if __name__ == '__main__':
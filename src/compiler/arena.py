@@ -0,0 +1,36 @@
+import sys
+from compiler.tokenizer import Location
+import compiler.ast as ast
+
+class Arena:
+    """Shares names, operators and leaf nodes between the AST nodes built by the parser.
+
+    Identical literals and identifiers become the same node object,
+    so they must not be modified after parsing, and their location is where they first appear.
+    """
+
+    def __init__(self) -> None:
+        self._literals: dict[tuple[type, int | bool], ast.Literal] = {}
+        self._identifiers: dict[str, ast.Identifier] = {}
+        self.reused_nodes = 0
+
+    def name(self, text: str) -> str:
+        return sys.intern(text)
+
+    def literal(self, value: int | bool, loc: Location | None = None) -> ast.Literal:
+        # the type is part of the key because True == 1
+        key = (type(value), value)
+        node = self._literals.get(key)
+        if node is None:
+            node = self._literals[key] = ast.Literal(value, loc=loc)
+        else:
+            self.reused_nodes += 1
+        return node
+
+    def identifier(self, name: str, loc: Location | None = None) -> ast.Identifier:
+        node = self._identifiers.get(name)
+        if node is None:
+            node = self._identifiers[name] = ast.Identifier(sys.intern(name), loc=loc)
+        else:
+            self.reused_nodes += 1
+        return node
@@ -1,41 +1,45 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from compiler.tokenizer import Location
 
-@dataclass
+@dataclass(slots=True)
 class Expression:
     """Base class for AST nodes representing expressions."""
+    # where the expression starts, or its operator for operations; not compared, so that
+    # trees can be compared with ones built without locations
+    loc: Location | None = field(default=None, kw_only=True, compare=False, repr=False)
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expression):
-    value: int | bool
+    value: int | bool | None   # 'None' is the Unit value
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Expression):
     name: str
 
-@dataclass
+@dataclass(slots=True)
 class BinaryOp(Expression):
     """AST node for a binary operation like `A + B`"""
     left: Expression
     op: str
     right: Expression
 
-@dataclass
+@dataclass(slots=True)
 class IfExpression(Expression):
     cond: Expression
     then_clause: Expression
     else_clause: Expression | None
 
-@dataclass
+@dataclass(slots=True)
 class WhileExpression(Expression):
     cond: Expression
     body: Expression
 
-@dataclass
+@dataclass(slots=True)
 class FunctionCall(Expression):
     name: Identifier
     arguments: list[Expression]
 
-@dataclass
+@dataclass(slots=True)
 class UnaryOp(Expression):
     op: str
     value: Expression
\ No newline at end of file
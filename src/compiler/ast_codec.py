@@ -0,0 +1,265 @@
+"""A compact binary encoding of ASTs, for caching parsed trees and sending them between processes.
+
+The encoding is a header, a table of strings, and the nodes in preorder:
+
+    magic   b"CAST" and a version byte
+    strings varint count, then for each string a varint length and UTF-8 bytes
+    nodes   for each node, a kind byte and its operands, followed by its children
+
+Names, operators and file names are stored once in the string table and referred to
+by index. Integers are varints, with zigzag encoding for signed ones.
+
+A node with a location has `HAS_LOCATION` set in its kind byte, followed by the line
+as a signed difference from the previous location's line, and the column. If the file
+differs from the previous location's, `NEW_FILE` is also set and the file's string
+index comes first.
+"""
+from typing import Any
+from compiler.cache import CompilationCache, cache_key
+from compiler.parser import parse
+from compiler.tokenizer import Location, tokenize
+import compiler.ast as ast
+
+MAGIC = b"CAST\x01"
+
+# node kinds
+_INT = 0            # zigzag value
+_TRUE = 1
+_FALSE = 2
+_UNIT = 3
+_IDENTIFIER = 4     # name index
+_BINARY = 5         # operator index, left, right
+_UNARY = 6          # operator index, operand
+_IF = 7             # cond, then
+_IF_ELSE = 8        # cond, then, else
+_WHILE = 9          # cond, body
+_CALL = 10          # argument count, name (an identifier node), arguments
+
+HAS_LOCATION = 0x80
+NEW_FILE = 0x40
+KIND_MASK = 0x3f
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+def encode(expr: ast.Expression) -> bytes:
+    strings: dict[str, int] = {}
+    nodes = bytearray()
+    write_varint = _write_varint
+
+    def string_index(text: str) -> int:
+        index = strings.get(text)
+        if index is None:
+            index = strings[text] = len(strings)
+        return index
+
+    previous_file: str | None = None
+    previous_line = 0
+    # an explicit stack, because operator chains make very deep trees
+    stack: list[ast.Expression] = [expr]
+    while stack:
+        node = stack.pop()
+        loc = node.loc
+        flags = 0
+        if loc is not None:
+            flags = HAS_LOCATION if loc.file == previous_file else HAS_LOCATION | NEW_FILE
+
+        if isinstance(node, ast.Identifier):
+            nodes.append(_IDENTIFIER | flags)
+            operands: tuple[int, ...] = (string_index(node.name),)
+        elif isinstance(node, ast.BinaryOp):
+            nodes.append(_BINARY | flags)
+            operands = (string_index(node.op),)
+            stack.append(node.right)
+            stack.append(node.left)
+        elif isinstance(node, ast.Literal):
+            value = node.value
+            if value is True:
+                nodes.append(_TRUE | flags)
+            elif value is False:
+                nodes.append(_FALSE | flags)
+            elif value is None:
+                nodes.append(_UNIT | flags)
+            else:
+                nodes.append(_INT | flags)
+            operands = (_zigzag(value),) if type(value) is int else ()
+        elif isinstance(node, ast.FunctionCall):
+            nodes.append(_CALL | flags)
+            operands = (len(node.arguments),)
+            stack.extend(reversed(node.arguments))
+            stack.append(node.name)
+        elif isinstance(node, ast.UnaryOp):
+            nodes.append(_UNARY | flags)
+            operands = (string_index(node.op),)
+            stack.append(node.value)
+        elif isinstance(node, ast.IfExpression):
+            if node.else_clause is None:
+                nodes.append(_IF | flags)
+            else:
+                nodes.append(_IF_ELSE | flags)
+                stack.append(node.else_clause)
+            stack.append(node.then_clause)
+            stack.append(node.cond)
+            operands = ()
+        elif isinstance(node, ast.WhileExpression):
+            nodes.append(_WHILE | flags)
+            stack.append(node.body)
+            stack.append(node.cond)
+            operands = ()
+        else:
+            raise Exception(f'cannot encode {node}')
+
+        if loc is not None:
+            if flags & NEW_FILE:
+                write_varint(nodes, string_index(loc.file))
+                previous_file = loc.file
+            write_varint(nodes, _zigzag(loc.line - previous_line))
+            write_varint(nodes, loc.column)
+            previous_line = loc.line
+        for operand in operands:
+            write_varint(nodes, operand)
+
+    out = bytearray(MAGIC)
+    _write_varint(out, len(strings))
+    for text in strings:
+        data = text.encode()
+        _write_varint(out, len(data))
+        out += data
+    out += nodes
+    return bytes(out)
+
+def decode(data: bytes) -> ast.Expression:
+    if not data.startswith(MAGIC):
+        raise Exception('not an encoded AST')
+    try:
+        return _decode(data)
+    except IndexError:
+        raise Exception('encoded AST is truncated') from None
+
+def _read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    """Returns the varint at `pos` and the position after it."""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _decode(data: bytes) -> ast.Expression:
+    read_varint = _read_varint
+    make_location = Location
+    Identifier, Literal = ast.Identifier, ast.Literal
+
+    count, pos = read_varint(data, len(MAGIC))
+    strings = []
+    for _ in range(count):
+        length, pos = read_varint(data, pos)
+        strings.append(data[pos:pos + length].decode())
+        pos += length
+
+    # Most varints are a single byte, so those are read inline.
+    file: str | None = None
+    line = 0
+    # Nodes whose children are still being decoded, as [kind, loc, operand, children, child count].
+    pending: list[list[Any]] = []
+    end = len(data)
+    while pos < end:
+        kind = data[pos]
+        pos += 1
+        loc = None
+        if kind & HAS_LOCATION:
+            if kind & NEW_FILE:
+                index, pos = read_varint(data, pos)
+                file = strings[index]
+            delta = data[pos]
+            if delta < 0x80:
+                pos += 1
+            else:
+                delta, pos = read_varint(data, pos)
+            line += delta >> 1 if not delta & 1 else -(delta >> 1) - 1
+            column = data[pos]
+            if column < 0x80:
+                pos += 1
+            else:
+                column, pos = read_varint(data, pos)
+            loc = make_location(file, line, column)  # type: ignore[arg-type]
+            kind &= KIND_MASK
+
+        if kind == _IDENTIFIER or kind == _BINARY or kind == _INT or kind == _UNARY or kind == _CALL:
+            operand = data[pos]
+            if operand < 0x80:
+                pos += 1
+            else:
+                operand, pos = read_varint(data, pos)
+
+        node: ast.Expression
+        if kind == _IDENTIFIER:
+            node = Identifier(strings[operand], loc=loc)
+        elif kind == _BINARY:
+            pending.append([kind, loc, strings[operand], [], 2])
+            continue
+        elif kind == _INT:
+            node = Literal(operand >> 1 if not operand & 1 else -(operand >> 1) - 1, loc=loc)
+        elif kind == _TRUE or kind == _FALSE or kind == _UNIT:
+            node = Literal(True if kind == _TRUE else False if kind == _FALSE else None, loc=loc)
+        elif kind == _UNARY:
+            pending.append([kind, loc, strings[operand], [], 1])
+            continue
+        elif kind == _IF or kind == _WHILE:
+            pending.append([kind, loc, None, [], 2])
+            continue
+        elif kind == _IF_ELSE:
+            pending.append([kind, loc, None, [], 3])
+            continue
+        elif kind == _CALL:
+            pending.append([kind, loc, None, [], operand + 1])
+            continue
+        else:
+            raise Exception(f'unknown node kind {kind} at byte {pos - 1}')
+
+        # add the complete node to its parent, completing the parent too if this was its last child
+        while pending:
+            parent = pending[-1]
+            children = parent[3]
+            children.append(node)
+            if len(children) < parent[4]:
+                break
+            pending.pop()
+            parent_kind, parent_loc, operand = parent[0], parent[1], parent[2]
+            if parent_kind == _BINARY:
+                node = ast.BinaryOp(children[0], operand, children[1], loc=parent_loc)
+            elif parent_kind == _UNARY:
+                node = ast.UnaryOp(operand, children[0], loc=parent_loc)
+            elif parent_kind == _CALL:
+                node = ast.FunctionCall(children[0], children[1:], loc=parent_loc)
+            elif parent_kind == _WHILE:
+                node = ast.WhileExpression(children[0], children[1], loc=parent_loc)
+            else:
+                node = ast.IfExpression(children[0], children[1], children[2] if len(children) > 2 else None, loc=parent_loc)
+        else:
+            if pos != end:
+                raise Exception(f'unexpected data after the AST at byte {pos}')
+            return node
+    raise IndexError('missing nodes')
+
+def parse_cached(source_code: str, cache: CompilationCache) -> ast.Expression:
+    """Parses `source_code`, or decodes its AST from `cache` if it was parsed before."""
+    key = cache_key(source_code, "ast")
+    data = cache.get(key)
+    if data is not None:
+        return decode(data)
+    expr = parse(tokenize(source_code))
+    cache.put(key, encode(expr))
+    return expr
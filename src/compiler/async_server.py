@@ -0,0 +1,228 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from traceback import format_exception
+from typing import Any, AsyncIterator, Callable
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+from compiler import binary_protocol
+from compiler.metrics import ServerMetrics
+
+RequestHandler = Callable[[str], dict[str, Any]]
+BinaryRequestHandler = Callable[[bytes], tuple[dict[str, Any], bytes]]
+
+# the request handlers of a worker process, installed when the worker starts
+_worker_handler: RequestHandler | None = None
+_worker_binary_handler: BinaryRequestHandler | None = None
+
+def _install_handler(handler: RequestHandler, binary_handler: BinaryRequestHandler | None, inherited_fds: list[int]) -> None:
+    global _worker_handler, _worker_binary_handler
+    _worker_handler = handler
+    _worker_binary_handler = binary_handler
+    # A pool that replaces a broken one is forked while the server has open sockets,
+    # which would keep connections open after the server closes them.
+    for fd in inherited_fds:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+def _ping_worker() -> None:
+    pass
+
+# The workers return encoded responses, so that they also do the encoding and compressing.
+
+def _handle_in_worker(input_str: str) -> bytes:
+    assert _worker_handler is not None
+    return json.dumps(_worker_handler(input_str)).encode() + b"\n"
+
+def _handle_binary_in_worker(body: bytes, flags: int) -> bytes:
+    if _worker_binary_handler is not None:
+        metadata, payload = _worker_binary_handler(body)
+    else:
+        assert _worker_handler is not None
+        metadata, payload = _worker_handler(body.decode()), b""
+    head, payload = binary_protocol.encode_response(metadata, payload, flags)
+    return head + payload
+
+async def _read_lines(reader: asyncio.StreamReader, start: bytes) -> AsyncIterator[bytes]:
+    """The lines from `reader`, after the bytes in `start` that were already read from it."""
+    *lines, rest = start.split(b"\n")
+    for line in lines:
+        yield line
+    line = rest + await reader.readline()
+    while line:
+        yield line
+        line = await reader.readline()
+
+async def _read_binary_requests(reader: asyncio.StreamReader) -> AsyncIterator[tuple[bytes, int]]:
+    """The bodies and flags of binary protocol requests, whose first magic bytes were already read."""
+    while True:
+        header = await reader.readexactly(binary_protocol.request_header.size)
+        flags, length = binary_protocol.request_header.unpack(header)
+        binary_protocol.check_request_size(length)
+        yield await reader.readexactly(length), flags
+        # further requests on the same connection must start with the magic bytes again
+        try:
+            start = await reader.readexactly(len(binary_protocol.MAGIC))
+        except asyncio.IncompleteReadError:
+            return
+        if start != binary_protocol.MAGIC:
+            return
+
+def run_async_server(
+    host: str,
+    port: int,
+    handle_request: RequestHandler,
+    workers: int | None = None,
+    max_pipelined: int = 64,
+    handle_binary_request: BinaryRequestHandler | None = None,
+    metrics: ServerMetrics | None = None,
+) -> None:
+    """Serves newline-delimited JSON requests, many per connection.
+
+    Each line received is one request, and the responses are sent back as lines
+    in the same order. A client may send further requests without waiting for
+    the earlier responses, up to `max_pipelined` outstanding requests per connection.
+    A final request that is terminated by closing the connection instead of a
+    newline is answered too.
+
+    Connections that start with the magic bytes of `binary_protocol` are served with
+    that protocol instead, by `handle_binary_request`. Without it, binary requests are
+    answered by `handle_request` with an empty payload.
+
+    `handle_request` runs in a pool of `workers` processes (one per CPU by default).
+    The workers are forked, so it doesn't need to be picklable. If a worker dies, the
+    requests it was handling get error responses, and the pool is replaced.
+
+    With `metrics`, the number of workers, the open connections and the requests
+    that haven't been answered yet are kept up to date in it.
+    """
+    asyncio.run(_serve(host, port, handle_request, handle_binary_request, workers, max_pipelined, metrics))
+
+async def _serve(
+    host: str,
+    port: int,
+    handle_request: RequestHandler,
+    handle_binary_request: BinaryRequestHandler | None,
+    workers: int | None,
+    max_pipelined: int,
+    metrics: ServerMetrics | None,
+) -> None:
+    pool_size = workers or os.cpu_count() or 1
+    if metrics is not None:
+        metrics.workers.set(pool_size)
+    # the sockets of the server and of its connections, which the workers of a new pool close
+    open_fds: set[int] = set()
+
+    def start_pool() -> ProcessPoolExecutor:
+        pool = ProcessPoolExecutor(
+            pool_size,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_install_handler,
+            initargs=(handle_request, handle_binary_request, list(open_fds)),
+        )
+        # the workers are forked by the first submit, so they only inherit the sockets in 'open_fds'
+        pool.submit(_ping_worker)
+        return pool
+
+    pool = start_pool()
+
+    def run_in_pool(function: Callable[..., bytes], *args: Any) -> asyncio.Future[bytes]:
+        nonlocal pool
+        loop = asyncio.get_running_loop()
+        try:
+            return loop.run_in_executor(pool, function, *args)
+        except BrokenProcessPool:
+            # A worker died, for example killed for running out of memory, which breaks the whole pool.
+            # The requests that were in it have failed, and later ones go to a new pool.
+            pool.shutdown(wait=False, cancel_futures=True)
+            pool = start_pool()
+            return loop.run_in_executor(pool, function, *args)
+
+    async def serve_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        # pending responses in request order, 'None' marks the end of the connection
+        responses: asyncio.Queue[asyncio.Future[bytes] | None] = asyncio.Queue(max_pipelined)
+        binary = False
+        fd = writer.get_extra_info('socket').fileno()
+        open_fds.add(fd)
+        if metrics is not None:
+            metrics.connections.inc()
+
+        def error_response(e: Exception) -> bytes:
+            error = {"error": "".join(format_exception(e))}
+            if binary:
+                return b"".join(binary_protocol.encode_response(error, b"", 0))
+            return json.dumps(error).encode() + b"\n"
+
+        async def write_responses() -> None:
+            connected = True
+            while (response := await responses.get()) is not None:
+                try:
+                    result = await response
+                except Exception as e:
+                    result = error_response(e)
+                finally:
+                    if metrics is not None:
+                        metrics.pipelined_requests.dec()
+                if not connected:
+                    continue   # keep draining the queue so that the reading side never blocks
+                try:
+                    writer.write(result)
+                    await writer.drain()
+                except ConnectionError:
+                    connected = False
+
+        async def add_request(response: asyncio.Future[bytes]) -> None:
+            if metrics is not None:
+                metrics.pipelined_requests.inc()
+            await responses.put(response)
+
+        writer_task = asyncio.create_task(write_responses())
+        try:
+            try:
+                start = await reader.readexactly(len(binary_protocol.MAGIC))
+            except asyncio.IncompleteReadError as e:
+                start = e.partial
+            if start == binary_protocol.MAGIC:
+                binary = True
+                async for body, flags in _read_binary_requests(reader):
+                    await add_request(run_in_pool(_handle_binary_in_worker, body, flags))
+            else:
+                async for line in _read_lines(reader, start):
+                    if line.strip():
+                        await add_request(run_in_pool(_handle_in_worker, line.decode()))
+        except Exception as e:
+            error: asyncio.Future[bytes] = loop.create_future()
+            error.set_result(error_response(e))
+            await add_request(error)
+        finally:
+            await responses.put(None)
+            try:
+                await writer_task
+            finally:
+                open_fds.discard(fd)
+                if metrics is not None:
+                    metrics.connections.dec()
+                writer.close()
+
+    try:
+        # Start the workers before accepting any connection, so that they
+        # don't inherit client sockets and keep them open after we close them.
+        await asyncio.get_running_loop().run_in_executor(pool, _ping_worker)
+
+        # requests are whole lines, so allow long lines for large programs
+        server = await asyncio.start_server(serve_connection, host, port, limit=binary_protocol.MAX_REQUEST_SIZE, reuse_address=True)
+        open_fds.update(sock.fileno() for sock in server.sockets)
+        print(f"Starting asyncio TCP server at {host}:{port}")
+
+        # stop on SIGTERM like on Ctrl-C, so that the worker processes are shut down too
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        await stop.wait()
+        server.close()
+    finally:
+        pool.shutdown(cancel_futures=True)
@@ -0,0 +1,86 @@
+"""Binary framing for the compile server.
+
+A request is the magic bytes, a header with flags and the body length, and a
+JSON body with the same commands as the JSON protocol. A response is a header
+with status, flags and lengths, then JSON metadata (errors, stats...) and a raw
+payload, which is the executable of a 'compile' request. Unlike the JSON
+protocol, a connection can carry several requests, one after the other.
+Servers refuse requests whose body is larger than `MAX_REQUEST_SIZE`.
+"""
+from io import BufferedIOBase
+from typing import Any
+import json
+import socket
+import struct
+import zlib
+
+MAGIC = b"CBIN"
+
+# request flag: the client accepts a zlib-compressed payload
+# response flag: the payload is zlib-compressed
+FLAG_COMPRESS = 1
+
+# the largest request body a server reads, the same as the longest line of the JSON protocol
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+request_header = struct.Struct("!BxxxI")       # after MAGIC: flags, body length
+response_header = struct.Struct("!4sBBxxIQ")   # MAGIC, status, flags, metadata length, payload length
+
+def read_exactly(stream: BufferedIOBase, size: int) -> bytearray:
+    """Reads `size` bytes into a buffer allocated up front."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    position = 0
+    while position < size:
+        count = stream.readinto(view[position:])
+        if not count:
+            raise EOFError(f"connection closed after {position} of {size} bytes")
+        position += count
+    return buffer
+
+def check_request_size(length: int) -> None:
+    if length > MAX_REQUEST_SIZE:
+        raise Exception(f"request of {length} bytes is larger than the limit of {MAX_REQUEST_SIZE} bytes")
+
+def read_request(stream: BufferedIOBase) -> tuple[int, bytearray]:
+    """Reads the rest of a request whose MAGIC has already been read. Returns the flags and the body."""
+    flags, length = request_header.unpack(read_exactly(stream, request_header.size))
+    check_request_size(length)
+    return flags, read_exactly(stream, length)
+
+def encode_response(metadata: dict[str, Any], payload: bytes, flags: int) -> tuple[bytes, bytes]:
+    """Returns the header with the metadata, and the payload, compressed if the request's `flags` allow it."""
+    response_flags = 0
+    if flags & FLAG_COMPRESS and payload:
+        payload = zlib.compress(payload)
+        response_flags |= FLAG_COMPRESS
+    status = STATUS_ERROR if "error" in metadata else STATUS_OK
+    metadata_bytes = json.dumps(metadata).encode()
+    return response_header.pack(MAGIC, status, response_flags, len(metadata_bytes), len(payload)) + metadata_bytes, payload
+
+def write_response(sock: socket.socket, metadata: dict[str, Any], payload: bytes, flags: int) -> None:
+    head, payload = encode_response(metadata, payload, flags)
+    sock.sendall(head)
+    if payload:
+        sock.sendall(memoryview(payload))
+
+def send_request(sock: socket.socket, stream: BufferedIOBase, input: dict[str, Any], compress: bool = False) -> tuple[dict[str, Any], bytes]:
+    """Client side: sends a request and returns the response metadata and payload.
+
+    `stream` must be a binary file object reading from `sock`, such as `sock.makefile('rb')`.
+    """
+    body = json.dumps(input).encode()
+    flags = FLAG_COMPRESS if compress else 0
+    sock.sendall(MAGIC + request_header.pack(flags, len(body)) + body)
+
+    magic, _, response_flags, metadata_length, payload_length = response_header.unpack(read_exactly(stream, response_header.size))
+    if magic != MAGIC:
+        raise Exception(f"not a binary protocol response: {bytes(magic)!r}")
+    metadata: dict[str, Any] = json.loads(read_exactly(stream, metadata_length))
+    payload = bytes(read_exactly(stream, payload_length))
+    if response_flags & FLAG_COMPRESS:
+        payload = zlib.decompress(payload)
+    return metadata, payload
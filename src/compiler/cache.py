@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from functools import cache
+from hashlib import sha256
+from multiprocessing import Array
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+import os
+import tempfile
+
+if TYPE_CHECKING:
+    # imported only for type checking, because singleflight uses this module
+    from compiler.singleflight import SingleFlight
+
+@cache
+def compiler_version() -> str:
+    """A fingerprint of the compiler's own source files, so that editing the compiler invalidates cached results."""
+    digest = sha256()
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+def cache_key(source_code: str, options: str = "") -> str:
+    """The key of a compilation of `source_code`, with `options` such as the optimization level."""
+    return sha256(f"{compiler_version()}\0{options}\0{source_code}".encode()).hexdigest()
+
+def write_atomically(path: Path, *chunks: bytes) -> None:
+    """Writes `chunks` to the file at `path`, replacing it."""
+    # write to a temporary file first so that other processes never see a partial file
+    fd, temp_path = tempfile.mkstemp(dir=path.parent)
+    with os.fdopen(fd, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    os.replace(temp_path, path)
+
+class Counters:
+    """Named counters in shared memory, so that they add up across forked worker processes."""
+
+    def __init__(self, names: list[str]) -> None:
+        self.names = names
+        self._counters = Array('q', len(names))
+
+    def increment(self, name: str) -> None:
+        with self._counters.get_lock():
+            self._counters[self.names.index(name)] += 1
+
+    def as_dict(self) -> dict[str, int]:
+        with self._counters.get_lock():
+            return dict(zip(self.names, self._counters[:]))
+
+class CompilationCache:
+    """Compiled executables keyed by `cache_key`, in an in-memory LRU tier
+    limited to `memory_limit` bytes and an optional on-disk tier under `directory`.
+
+    The on-disk tier is shared by all processes using the same directory. With `single_flight`,
+    processes that miss the cache at the same time for the same key compile it only once.
+    """
+
+    def __init__(
+        self,
+        memory_limit: int = 64 * 1024 * 1024,
+        directory: str | None = None,
+        single_flight: "SingleFlight | None" = None,
+    ) -> None:
+        self.memory_limit = memory_limit
+        self.single_flight = single_flight
+        self.memory_size = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self.directory = Path(directory) if directory is not None else None
+        self.stats = Counters(["memory_hits", "disk_hits", "misses", "evictions"])
+
+    def compile(self, source_code: str, compile_function: Callable[[], bytes], options: str = "") -> bytes:
+        """Returns the cached executable for `source_code`, or calls `compile_function` and caches its result."""
+        key = cache_key(source_code, options)
+        executable = self.get(key)
+        if executable is None:
+            executable = compile_function() if self.single_flight is None else self.single_flight.run(key, compile_function)
+            self.put(key, executable)
+        return executable
+
+    def get(self, key: str) -> bytes | None:
+        executable = self._entries.get(key)
+        if executable is not None:
+            self._entries.move_to_end(key)
+            self.stats.increment("memory_hits")
+            return executable
+        path = self._disk_path(key)
+        if path is not None and path.exists():
+            executable = path.read_bytes()
+            self._remember(key, executable)
+            self.stats.increment("disk_hits")
+            return executable
+        self.stats.increment("misses")
+        return None
+
+    def put(self, key: str, executable: bytes) -> None:
+        self._remember(key, executable)
+        path = self._disk_path(key)
+        if path is not None and not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_atomically(path, executable)
+
+    def _remember(self, key: str, executable: bytes) -> None:
+        if key in self._entries or len(executable) > self.memory_limit:
+            return
+        self._entries[key] = executable
+        self.memory_size += len(executable)
+        while self.memory_size > self.memory_limit:
+            _, evicted = self._entries.popitem(last=False)
+            self.memory_size -= len(evicted)
+            self.stats.increment("evictions")
+
+    def _disk_path(self, key: str) -> Path | None:
+        if self.directory is None:
+            return None
+        # shard by the first two hex digits to keep directories small
+        return self.directory / key[:2] / key[2:]
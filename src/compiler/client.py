@@ -0,0 +1,124 @@
+"""A thin client for `compile` that sends the source code to a running `serve` process.
+
+Starting Python and importing the whole compiler can take longer than compiling a
+small program, so this module only imports what it needs to talk to the server.
+When no server is given or none is reachable, it runs `compiler.__main__` as usual.
+
+The server is given with `--server=host:port` or the environment variable `COMPILER_SERVER`.
+`COMPILER_SERVER_TIMEOUT` sets how many seconds to wait for its response, with 0 for no limit.
+"""
+from typing import Any, TextIO
+import os
+import re
+import socket
+import sys
+
+from compiler import binary_protocol
+
+SERVER_ENVIRONMENT_VARIABLE = "COMPILER_SERVER"
+TIMEOUT_ENVIRONMENT_VARIABLE = "COMPILER_SERVER_TIMEOUT"
+
+# how long to wait for a connection before compiling in-process instead
+CONNECT_TIMEOUT = 0.5
+# how long to wait for the response by default, which takes as long as compiling the program
+RESPONSE_TIMEOUT = 60.0
+
+
+def parse_server_address(address: str) -> tuple[str, int]:
+    host, separator, port = address.rpartition(":")
+    if not separator or not port.isdigit():
+        raise Exception(f"Invalid server address, expected host:port: {address}")
+    return host or "127.0.0.1", int(port)
+
+
+def response_timeout() -> float | None:
+    """The seconds to wait for a response from `COMPILER_SERVER_TIMEOUT`, or `RESPONSE_TIMEOUT`.
+    None waits as long as it takes."""
+    value = os.environ.get(TIMEOUT_ENVIRONMENT_VARIABLE)
+    if value is None:
+        return RESPONSE_TIMEOUT
+    try:
+        timeout = float(value)
+    except ValueError:
+        raise Exception(f"Invalid {TIMEOUT_ENVIRONMENT_VARIABLE}, expected seconds: {value}") from None
+    return timeout if timeout > 0 else None
+
+
+def compile_remote(address: str, source_code: str, optimization_level: int | None = None) -> tuple[dict[str, Any], bytes] | None:
+    """Compiles `source_code` on the server at `address` and returns the response metadata
+    and executable, or None if the server can't be reached, the connection fails
+    or the response doesn't arrive within `response_timeout()` seconds.
+
+    Without `optimization_level`, the server's own level is used.
+    """
+    request: dict[str, Any] = {"command": "compile", "code": source_code}
+    if optimization_level is not None:
+        request["optimization_level"] = optimization_level
+    try:
+        with socket.create_connection(parse_server_address(address), timeout=CONNECT_TIMEOUT) as sock:
+            # compiling can take much longer than connecting, but a server that doesn't answer,
+            # such as one that doesn't speak the binary protocol, must not block us forever
+            sock.settimeout(response_timeout())
+            with sock.makefile("rb") as stream:
+                return binary_protocol.send_request(sock, stream, request)  # type: ignore[arg-type]
+    except (OSError, EOFError):
+        # compiling is safe to repeat, so a server that went away is handled like a missing one
+        return None
+
+
+def write_remote_result(result: tuple[dict[str, Any], bytes], output_file: str, input_file_name: str) -> int:
+    """Writes the executable of a successful `compile_remote`, or prints its error
+    after the name of the input file. Returns the exit status."""
+    metadata, executable = result
+    if "error" in metadata:
+        print(f"{input_file_name}: {metadata['error']}", file=sys.stderr, end="")
+        return 1
+    with open(output_file, "wb") as f:
+        f.write(executable)
+    return 0
+
+
+def main() -> int:
+    # Only a plain 'compile' is handled here. Everything else, including
+    # the options that need an in-process compiler, goes to 'compiler.__main__'.
+    server = os.environ.get(SERVER_ENVIRONMENT_VARIABLE)
+    command: str | None = None
+    input_files: list[str] = []
+    output_file: str | None = None
+    optimization_level: int | None = None
+    simple = True
+    for arg in sys.argv[1:]:
+        if (m := re.fullmatch(r'--server=(.+)', arg)) is not None:
+            server = m[1]
+        elif (m := re.fullmatch(r'--output=(.+)', arg)) is not None:
+            output_file = m[1]
+        elif (m := re.fullmatch(r'-O([0-9])', arg)) is not None:
+            optimization_level = int(m[1])
+        elif arg.startswith('-'):
+            simple = False
+        elif command is None:
+            command = arg
+        else:
+            input_files.append(arg)
+
+    if simple and server and command == 'compile' and output_file is not None and len(input_files) <= 1:
+        source_file: TextIO
+        with open(input_files[0]) if input_files else sys.stdin as source_file:
+            source_code = source_file.read()
+        result = compile_remote(server, source_code, optimization_level)
+        if result is not None:
+            return write_remote_result(result, output_file, input_files[0] if input_files else '(source code)')
+        # the server can't be reached, so don't try it again
+        sys.argv = [arg for arg in sys.argv if not arg.startswith('--server=')]
+        os.environ.pop(SERVER_ENVIRONMENT_VARIABLE, None)
+        if not input_files:
+            # stdin has already been read
+            from io import StringIO
+            sys.stdin = StringIO(source_code)
+
+    from compiler.__main__ import main as compiler_main
+    return compiler_main()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from compiler.parser import SubtreeTable, parse
+from compiler.tokenizer import Location, Token, scan, tokenize
+import compiler.ast as ast
+
+@dataclass(frozen=True)
+class Edit:
+    """Replaces `removed` characters at `offset` with `inserted`."""
+    offset: int
+    removed: int
+    inserted: str
+
+    def apply(self, source_code: str) -> str:
+        if not 0 <= self.offset <= self.offset + self.removed <= len(source_code):
+            raise ValueError(f'edit at {self.offset} removing {self.removed} characters is outside the source')
+        return source_code[:self.offset] + self.inserted + source_code[self.offset + self.removed:]
+
+@dataclass(frozen=True)
+class Retokenized:
+    """The tokens after an edit: `tokens[start:end]` replaced `old_tokens[start:old_end]`,
+    the tokens before and after that are the same as before, except that the ones
+    after moved `line_delta` lines."""
+    source_code: str
+    tokens: list[Token]
+    start: int
+    old_end: int
+    end: int
+    line_delta: int
+
+def retokenize(source_code: str, tokens: list[Token], edit: Edit) -> Retokenized:
+    """Updates the tokens of `source_code` for `edit` by scanning only the edited lines.
+
+    No token spans a newline, so the tokens of the other lines stay the same.
+    Tokens after the edit only move to another line if the edit adds or removes newlines.
+    """
+    new_source = edit.apply(source_code)
+    edit_end = edit.offset + edit.removed
+
+    # the edited lines, from the start of the line of 'offset' to the end of the line of 'edit_end'
+    region_start = source_code.rfind("\n", 0, edit.offset) + 1
+    region_end = source_code.find("\n", edit_end)
+    region_end = len(source_code) if region_end == -1 else region_end + 1
+    first_line = source_code.count("\n", 0, region_start) + 1
+    last_line = first_line + source_code.count("\n", region_start, edit_end)
+    line_delta = edit.inserted.count("\n") - source_code.count("\n", edit.offset, edit_end)
+
+    new_region_end = region_end + len(new_source) - len(source_code)
+    middle = list(scan(new_source[region_start:new_region_end], first_line, region_start))
+
+    start = bisect_left(tokens, first_line, key=lambda token: token.loc.line)
+    old_end = bisect_right(tokens, last_line, lo=start, key=lambda token: token.loc.line)
+    after = tokens[old_end:]
+    if line_delta != 0:
+        after = [
+            Token(type=token.type, text=token.text, loc=Location(token.loc.file, token.loc.line + line_delta, token.loc.column))
+            for token in after
+        ]
+    return Retokenized(new_source, tokens[:start] + middle + after, start, old_end, start + len(middle), line_delta)
+
+class IncrementalParser:
+    """Keeps the tokens and AST of a source up to date as it is edited.
+
+    After an edit, only the edited lines are tokenized again, and subexpressions
+    (such as function arguments and the contents of parentheses) whose tokens
+    didn't change are reused from the previous AST instead of being parsed again.
+    """
+
+    def __init__(self, source_code: str) -> None:
+        self.source_code = source_code
+        self.tokens: list[Token] | None = None   # 'None' after a tokenization error
+        self.subtrees: SubtreeTable = {}
+        self.tree: ast.Expression | None = None   # the last successfully parsed AST
+        self._reparse(tokenize(source_code))
+
+    def edit(self, offset: int, removed: int, inserted: str) -> ast.Expression:
+        """Applies the edit and returns the new AST.
+
+        Raises like `tokenize` and `parse` if the edited source is invalid,
+        and `tree` then stays the last valid AST. Further edits still apply to the edited source.
+        """
+        edit = Edit(offset, removed, inserted)
+        if self.tokens is None:
+            self.source_code = edit.apply(self.source_code)
+            self._reparse(tokenize(self.source_code))
+            return self.tree  # type: ignore[return-value]
+
+        try:
+            result = retokenize(self.source_code, self.tokens, edit)
+        except Exception:
+            self.source_code = edit.apply(self.source_code)
+            self.tokens = None
+            self.subtrees = {}
+            raise
+
+        # Keep the subtrees whose tokens, including the one after them, lie entirely
+        # before the retokenized tokens, or after them if their locations didn't change.
+        shift = result.end - result.old_end
+        keep_after = result.line_delta == 0
+        self.subtrees = {
+            start if end < result.start else start + shift: (end if end < result.start else end + shift, node)
+            for start, (end, node) in self.subtrees.items()
+            if end < result.start or (keep_after and start >= result.old_end)
+        }
+        self.source_code = result.source_code
+        self._reparse(result.tokens)
+        return self.tree  # type: ignore[return-value]
+
+    def _reparse(self, tokens: list[Token]) -> None:
+        self.tokens = tokens
+        self.tree = parse(tokens, subtrees=self.subtrees)
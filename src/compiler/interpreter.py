@@ -0,0 +1,279 @@
+from typing import Callable, TextIO
+import operator
+import sys
+from compiler.optimizer import INT_MAX, INT_MIN, boolean_names, divide, remainder, wrap
+from compiler.traversal import Visitor
+import compiler.ast as ast
+
+Value = int | bool | None   # 'None' is the Unit value
+
+class Frame(list):
+    """The variables of a running program by slot index, and where its builtins read and write."""
+    __slots__ = ('stdin', 'stdout')
+
+    def __init__(self, size: int, stdin: TextIO, stdout: TextIO) -> None:
+        super().__init__([UNSET] * size)
+        self.stdin = stdin
+        self.stdout = stdout
+
+# the value of variables that haven't been assigned yet
+UNSET: object = object()
+
+Closure = Callable[[Frame], Value]
+
+def print_int(frame: Frame, value: Value) -> None:
+    if type(value) is not int:
+        raise Exception(f'print_int expects an Int, got {value!r}')
+    print(value, file=frame.stdout)
+
+def print_bool(frame: Frame, value: Value) -> None:
+    if type(value) is not bool:
+        raise Exception(f'print_bool expects a Bool, got {value!r}')
+    print('true' if value else 'false', file=frame.stdout)
+
+def read_int(frame: Frame) -> Value:
+    line = frame.stdin.readline()
+    if not line:
+        raise Exception('read_int: end of input')
+    return wrap(int(line))
+
+builtins: dict[str, Callable[..., Value]] = {
+    'print_int': print_int,
+    'print_bool': print_bool,
+    'read_int': read_int,
+}
+
+def equal(a: Value, b: Value) -> bool:
+    # 'True == 1' in Python, but not in the language
+    return type(a) is type(b) and a == b
+
+def check_int(value: Value, op: str) -> int:
+    if type(value) is not int:
+        raise Exception(f'operator "{op}" expects Int operands, got {value!r}')
+    return value
+
+def check_ints(a: Value, b: Value, op: str) -> None:
+    check_int(a, op)
+    check_int(b, op)
+
+def check_bool(value: Value, op: str) -> bool:
+    if type(value) is not bool:
+        raise Exception(f'{op} expects a Bool, got {value!r}')
+    return value
+
+# Like the 'idivq' instruction, INT_MIN / -1 and INT_MIN % -1 fail instead of wrapping
+# around, and the optimizer leaves them to fail at run time too.
+def check_divisor(a: int, b: int) -> None:
+    if b == 0:
+        raise Exception('division by zero')
+    if b == -1 and a == INT_MIN:
+        raise Exception('division overflow')
+
+def checked_divide(a: int, b: int) -> int:
+    check_divisor(a, b)
+    return divide(a, b)
+
+def checked_remainder(a: int, b: int) -> int:
+    check_divisor(a, b)
+    return remainder(a, b)
+
+# Operators on two Ints. Their results are wrapped around if they overflow,
+# which only the arithmetic ones can do (comparisons return bools, which are ints in Python).
+integer_operators: dict[str, Callable[[int, int], Value]] = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': checked_divide,
+    '%': checked_remainder,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+class _Compiler(Visitor[Closure]):
+    """Compiles each node into a closure that calls the closures of its children.
+    It is a visitor, because operator chains make very deep trees."""
+
+    def __init__(self, slots: dict[str, int]) -> None:
+        self.slots = slots
+
+    def _slot(self, name: str) -> int:
+        return self.slots.setdefault(name, len(self.slots))
+
+    def _variable_slot(self, expr: ast.Expression) -> int | None:
+        if isinstance(expr, ast.Identifier) and expr.name not in boolean_names:
+            return self._slot(expr.name)
+        return None
+
+    def visit_literal(self, expr: ast.Literal) -> Closure:
+        value = expr.value
+        return lambda frame: value
+
+    def visit_identifier(self, expr: ast.Identifier) -> Closure:
+        if expr.name in boolean_names:
+            value = boolean_names[expr.name]
+            return lambda frame: value
+        slot = self._slot(expr.name)
+        name = expr.name
+
+        def read(frame: Frame) -> Value:
+            value = frame[slot]
+            if value is UNSET:
+                raise Exception(f'variable "{name}" used before assignment')
+            return value  # type: ignore[no-any-return]
+        return read
+
+    def visit_binary_op(self, expr: ast.BinaryOp, left: Closure, right: Closure) -> Closure:
+        op = expr.op
+        if op == '=':
+            if not isinstance(expr.left, ast.Identifier) or expr.left.name in boolean_names:
+                raise Exception(f'can only assign to a variable, not {expr.left}')
+            slot = self._slot(expr.left.name)
+            value_closure = right
+
+            def assign(frame: Frame) -> Value:
+                frame[slot] = value = value_closure(frame)
+                return value
+            return assign
+
+        if op == 'and':
+            return lambda frame: check_bool(left(frame), op) and check_bool(right(frame), op)
+        if op == 'or':
+            return lambda frame: check_bool(left(frame), op) or check_bool(right(frame), op)
+        if op == '==':
+            return lambda frame: equal(left(frame), right(frame))
+        if op == '!=':
+            return lambda frame: not equal(left(frame), right(frame))
+        if op not in integer_operators:
+            raise Exception(f'unknown operator "{op}"')
+        integer_operator = integer_operators[op]
+
+        # These closures run the most often, so the type checks are inlined, and
+        # variable operands and a constant right operand are read without a closure call.
+        left_slot = self._variable_slot(expr.left)
+        if left_slot is not None and isinstance(expr.right, ast.Literal) and type(expr.right.value) is int:
+            constant = expr.right.value
+
+            def variable_constant_op(frame: Frame) -> Value:
+                a = frame[left_slot]
+                if type(a) is not int:
+                    check_ints(left(frame), constant, op)
+                result = integer_operator(a, constant)
+                return result if INT_MIN <= result <= INT_MAX else wrap(result)  # type: ignore[operator, arg-type]
+            return variable_constant_op
+
+        right_slot = self._variable_slot(expr.right)
+        if left_slot is not None and right_slot is not None:
+            def variable_variable_op(frame: Frame) -> Value:
+                a = frame[left_slot]
+                b = frame[right_slot]
+                if type(a) is not int or type(b) is not int:
+                    check_ints(left(frame), right(frame), op)
+                result = integer_operator(a, b)
+                return result if INT_MIN <= result <= INT_MAX else wrap(result)  # type: ignore[operator, arg-type]
+            return variable_variable_op
+
+        def integer_op(frame: Frame) -> Value:
+            a = left(frame)
+            b = right(frame)
+            if type(a) is not int or type(b) is not int:
+                check_ints(a, b, op)
+            result = integer_operator(a, b)  # type: ignore[arg-type]
+            return result if INT_MIN <= result <= INT_MAX else wrap(result)  # type: ignore[operator, arg-type]
+        return integer_op
+
+    def visit_unary_op(self, expr: ast.UnaryOp, operand: Closure) -> Closure:
+        if expr.op == '-':
+            return lambda frame: wrap(-check_int(operand(frame), '-'))
+        if expr.op == 'not':
+            return lambda frame: not check_bool(operand(frame), 'not')
+        raise Exception(f'unknown operator "{expr.op}"')
+
+    def visit_if_expression(self, expr: ast.IfExpression, cond: Closure, then_clause: Closure, *else_clause: Closure) -> Closure:
+        if not else_clause:
+            def if_then(frame: Frame) -> Value:
+                if check_bool(cond(frame), 'if'):
+                    then_clause(frame)
+                return None
+            return if_then
+        otherwise = else_clause[0]
+        return lambda frame: then_clause(frame) if check_bool(cond(frame), 'if') else otherwise(frame)
+
+    def visit_while_expression(self, expr: ast.WhileExpression, cond: Closure, body: Closure) -> Closure:
+        def loop(frame: Frame) -> Value:
+            while check_bool(cond(frame), 'while'):
+                body(frame)
+            return None
+        return loop
+
+    def visit_function_call(self, expr: ast.FunctionCall, *arguments: Closure) -> Closure:
+        function = builtins.get(expr.name.name)
+        if function is None:
+            raise Exception(f'unknown function "{expr.name.name}"')
+        arity = function.__code__.co_argcount - 1   # not counting the frame
+        if len(arguments) != arity:
+            raise Exception(f'function "{expr.name.name}" expects {arity} arguments, got {len(arguments)}')
+        if len(arguments) == 0:
+            return lambda frame: function(frame)
+        if len(arguments) == 1:
+            argument = arguments[0]
+            return lambda frame: function(frame, argument(frame))
+        return lambda frame: function(frame, *[argument(frame) for argument in arguments])
+
+    def visit_expression(self, expr: ast.Expression, *children: Closure) -> Closure:
+        raise Exception(f'cannot evaluate {expr}')
+
+class _Height(Visitor[int]):
+    def visit_expression(self, node: ast.Expression, *children: int) -> int:
+        return 1 + max(children, default=0)
+
+# Python frames for each level of the AST when the closures run, with a margin for the builtins
+_FRAMES_PER_LEVEL = 2
+_FRAME_MARGIN = 100
+
+class Program:
+    """An AST compiled into nested closures, with each variable resolved to a slot index.
+
+    The closures call each other once per level of the AST. For deep ASTs, the recursion
+    limit is raised while the program runs, which is safe because calls between Python
+    functions don't use the C stack.
+    """
+
+    def __init__(self, expr: ast.Expression) -> None:
+        self.slots: dict[str, int] = {}
+        self._run = _Compiler(self.slots).visit(expr)
+        self._frames_needed = _Height().visit(expr) * _FRAMES_PER_LEVEL + _FRAME_MARGIN
+
+    def __call__(
+        self,
+        variables: dict[str, Value] | None = None,
+        stdin: TextIO | None = None,
+        stdout: TextIO | None = None,
+    ) -> Value:
+        """Runs the program and returns its value. `variables` gives the initial values of
+        variables, and is updated with their final values."""
+        frame = Frame(len(self.slots), stdin or sys.stdin, stdout or sys.stdout)
+        for name, value in (variables or {}).items():
+            if name in self.slots:
+                frame[self.slots[name]] = value
+        recursion_limit = sys.getrecursionlimit()
+        if self._frames_needed > recursion_limit:
+            sys.setrecursionlimit(recursion_limit + self._frames_needed)
+        try:
+            return self._run(frame)
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+            if variables is not None:
+                for name, slot in self.slots.items():
+                    if frame[slot] is not UNSET:
+                        variables[name] = frame[slot]
+
+def run(
+    expr: ast.Expression,
+    variables: dict[str, Value] | None = None,
+    stdin: TextIO | None = None,
+    stdout: TextIO | None = None,
+) -> Value:
+    """Evaluates an AST. See `Program` to compile it once and run it several times."""
+    return Program(expr)(variables, stdin, stdout)
@@ -0,0 +1,276 @@
+"""Metrics of the compile server, served in the Prometheus text format.
+
+The values are kept in anonymous shared memory that is mapped before the server forks
+any worker, so the forked and pooled processes all update the same values. The HTTP
+listener is a forked process too, and reports the totals of all of them.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from mmap import mmap
+from typing import Any, Iterator
+import multiprocessing
+import os
+import signal
+import socket
+import struct
+import traceback
+from compiler.optimizer import passes
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, values)) + "}"
+
+class Registry:
+    """Metric families whose values are shared by all the processes forked after `allocate`.
+
+    The label values of each family are declared up front, because each combination
+    has its own slots in the shared memory.
+    """
+
+    def __init__(self) -> None:
+        self.families: list[Family] = []
+        self.size = 0
+        self._values: "memoryview[float] | None" = None
+        self._lock = multiprocessing.get_context("fork").Lock()
+
+    def reserve(self, count: int) -> int:
+        """Reserves `count` values before `allocate`, and returns the index of the first."""
+        if self._values is not None:
+            raise Exception('metrics must be declared before they are allocated')
+        self.size += count
+        return self.size - count
+
+    def allocate(self) -> None:
+        self._memory = mmap(-1, max(1, self.size) * 8)
+        self._values = memoryview(self._memory).cast('d')
+
+    def add(self, index: int, amount: float) -> None:
+        assert self._values is not None
+        with self._lock:
+            self._values[index] += amount
+
+    def add_many(self, changes: list[tuple[int, float]]) -> None:
+        """Applies several changes at once, so that no scrape sees only some of them."""
+        assert self._values is not None
+        with self._lock:
+            for index, amount in changes:
+                self._values[index] += amount
+
+    def set(self, index: int, value: float) -> None:
+        assert self._values is not None
+        self._values[index] = value
+
+    def snapshot(self) -> list[float]:
+        assert self._values is not None
+        with self._lock:
+            return list(self._values)
+
+    def render(self) -> str:
+        values = self.snapshot()
+        return "".join(family.render(values) for family in self.families)
+
+class Family:
+    kind = ''
+    values_per_series = 1
+
+    def __init__(self, registry: Registry, name: str, help: str, label_names: tuple[str, ...] = (), label_values: list[tuple[str, ...]] | None = None) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.series = label_values if label_values is not None else [()]
+        first = registry.reserve(len(self.series) * self.values_per_series)
+        self._indexes = {labels: first + i * self.values_per_series for i, labels in enumerate(self.series)}
+        registry.families.append(self)
+
+    def index(self, labels: tuple[str, ...]) -> int:
+        if labels not in self._indexes:
+            raise Exception(f'undeclared labels for metric {self.name}: {labels}')
+        return self._indexes[labels]
+
+    def render(self, values: list[float]) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels in self.series:
+            lines.extend(self.render_series(labels, values, self._indexes[labels]))
+        return "\n".join(lines) + "\n"
+
+    def render_series(self, labels: tuple[str, ...], values: list[float], index: int) -> list[str]:
+        return [f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(values[index])}"]
+
+class Counter(Family):
+    kind = 'counter'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.registry.add(self.index(labels), amount)
+
+class Gauge(Family):
+    kind = 'gauge'
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.registry.add(self.index(labels), amount)
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.registry.add(self.index(labels), -amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self.registry.set(self.index(labels), value)
+
+class Histogram(Family):
+    """Counts of observations in buckets, stored per bucket and made cumulative when rendered,
+    followed by the sum and the number of the observations."""
+    kind = 'histogram'
+
+    def __init__(self, registry: Registry, name: str, help: str, buckets: list[float], label_names: tuple[str, ...] = (), label_values: list[tuple[str, ...]] | None = None) -> None:
+        self.buckets = buckets
+        self.values_per_series = len(buckets) + 3   # the buckets, +Inf, sum and count
+        super().__init__(registry, name, help, label_names, label_values)
+
+    def changes(self, value: float, *labels: str) -> list[tuple[int, float]]:
+        """The changes to the shared values that observe `value`, for `Registry.add_many`."""
+        index = self.index(labels)
+        bucket = bisect_left(self.buckets, value)
+        return [(index + bucket, 1), (index + len(self.buckets) + 1, value), (index + len(self.buckets) + 2, 1)]
+
+    def observe(self, value: float, *labels: str) -> None:
+        self.registry.add_many(self.changes(value, *labels))
+
+    def render_series(self, labels: tuple[str, ...], values: list[float], index: int) -> list[str]:
+        lines = []
+        cumulative = 0.0
+        for i, bound in enumerate(self.buckets + [float('inf')]):
+            cumulative += values[index + i]
+            le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names + ('le',), labels + (le,))} {_format_value(cumulative)}")
+        label_text = _format_labels(self.label_names, labels)
+        lines.append(f"{self.name}_sum{label_text} {_format_value(values[index + len(self.buckets) + 1])}")
+        lines.append(f"{self.name}_count{label_text} {_format_value(values[index + len(self.buckets) + 2])}")
+        return lines
+
+def listen_queue(sock: socket.socket) -> tuple[int, int] | None:
+    """The number of connections waiting to be accepted on a listening TCP socket and the
+    limit of the queue, from the kernel's TCP_INFO, or None where that isn't available."""
+    if not hasattr(socket, 'TCP_INFO'):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+    except OSError:
+        return None
+    # for listening sockets, Linux reports these in 'tcpi_unacked' and 'tcpi_sacked'
+    length, limit = struct.unpack_from("II", info, 24)
+    return length, limit
+
+COMMANDS = ['compile', 'compile_batch', 'ping', 'stats', 'other']
+OUTCOMES = ['ok', 'error']
+PHASES = ['total', 'tokenize', 'parse'] + [f'optimize:{name}' for name in passes] + ['codegen', 'peephole']
+
+LATENCY_BUCKETS: list[float] = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS: list[float] = [100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000]
+
+class ServerMetrics:
+    """The metrics of the compile server."""
+
+    def __init__(self, listen_socket: socket.socket | None = None) -> None:
+        # the server's socket, whose accept queue is measured when the metrics are read
+        self.listen_socket = listen_socket
+        self.registry = Registry()
+        self.requests = Counter(
+            self.registry, 'compiler_requests_total', 'Requests handled, by command and outcome.',
+            ('command', 'outcome'), [(command, outcome) for command in COMMANDS for outcome in OUTCOMES],
+        )
+        self.compile_seconds = Histogram(
+            self.registry, 'compiler_compile_seconds',
+            'Time to compile a program, in total and by compiler phase. Cached programs only have a total.',
+            LATENCY_BUCKETS, ('phase',), [(phase,) for phase in PHASES],
+        )
+        self.source_bytes = Histogram(self.registry, 'compiler_source_bytes', 'Size of the programs to compile.', SIZE_BUCKETS)
+        self.executable_bytes = Histogram(self.registry, 'compiler_executable_bytes', 'Size of the compiled executables.', SIZE_BUCKETS)
+        self.in_flight = Gauge(self.registry, 'compiler_in_flight_requests', 'Requests being handled.')
+        self.connections = Gauge(self.registry, 'compiler_open_connections', 'Connections being handled.')
+        self.workers = Gauge(self.registry, 'compiler_workers', 'Worker processes, for servers with a fixed pool of them.')
+        self.pipelined_requests = Gauge(self.registry, 'compiler_pipelined_requests', 'Requests read by the asyncio server and not answered yet.')
+        self.registry.allocate()
+
+    def count_request(self, command: Any, error: bool) -> None:
+        self.requests.inc(command if command in COMMANDS else 'other', 'error' if error else 'ok')
+
+    @contextmanager
+    def request_in_flight(self) -> Iterator[None]:
+        self.in_flight.inc()
+        try:
+            yield
+        finally:
+            self.in_flight.dec()
+
+    def observe_compile(self, seconds: float, phases: dict[str, float], source_size: int, executable_size: int | None) -> None:
+        changes = self.compile_seconds.changes(seconds, 'total')
+        for phase, phase_seconds in phases.items():
+            if phase in PHASES:
+                changes += self.compile_seconds.changes(phase_seconds, phase)
+        changes += self.source_bytes.changes(source_size)
+        if executable_size is not None:
+            changes += self.executable_bytes.changes(executable_size)
+        self.registry.add_many(changes)
+
+    def render(self) -> str:
+        text = self.registry.render()
+        queue = listen_queue(self.listen_socket) if self.listen_socket is not None else None
+        if queue is not None:
+            text += (
+                "# HELP compiler_listen_queue_length Connections waiting to be accepted.\n"
+                "# TYPE compiler_listen_queue_length gauge\n"
+                f"compiler_listen_queue_length {queue[0]}\n"
+                "# HELP compiler_listen_queue_limit Connections that can wait to be accepted.\n"
+                "# TYPE compiler_listen_queue_limit gauge\n"
+                f"compiler_listen_queue_limit {queue[1]}\n"
+            )
+        return text
+
+def start_metrics_server(metrics: ServerMetrics, host: str, port: int) -> int:
+    """Serves `GET /metrics` from a forked process, and returns its pid.
+
+    The port is bound before forking, so that errors are raised here. The listener
+    is a process rather than a thread, because forking worker processes while other
+    threads run can deadlock them.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    http_server = HTTPServer((host, port), Handler)
+    pid = os.fork()
+    if pid == 0:
+        # the parent stops this process with SIGTERM, also when it gets SIGINT
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        try:
+            http_server.serve_forever()
+        except BaseException:
+            traceback.print_exc()
+            os._exit(1)
+        os._exit(0)
+    http_server.server_close()
+    print(f"Serving metrics at http://{host}:{port}/metrics")
+    return pid
+
+def stop_metrics_server(pid: int) -> None:
+    try:
+        os.kill(pid, signal.SIGTERM)
+        os.waitpid(pid, 0)
+    except (ProcessLookupError, ChildProcessError):
+        pass
@@ -0,0 +1,271 @@
+from typing import Callable
+from compiler.profiling import NULL_PROFILER, Profiler, count_nodes
+from compiler.traversal import Transformer
+import compiler.ast as ast
+
+# Integers are 64-bit and wrap around on overflow, and division truncates
+# towards zero, like the machine instructions the code generator uses.
+# Like them, division by zero and INT_MIN / -1 fail at run time.
+INT_MIN = -2**63
+INT_MAX = 2**63 - 1
+
+def wrap(value: int) -> int:
+    return (value - INT_MIN) % 2**64 + INT_MIN
+
+def divide(a: int, b: int) -> int:
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+def remainder(a: int, b: int) -> int:
+    return a - b * divide(a, b)
+
+Value = int | bool | None
+
+integer_operators: dict[str, Callable[[int, int], Value]] = {
+    '+': lambda a, b: wrap(a + b),
+    '-': lambda a, b: wrap(a - b),
+    '*': lambda a, b: wrap(a * b),
+    '/': lambda a, b: wrap(divide(a, b)),
+    '%': remainder,
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+boolean_operators: dict[str, Callable[[bool, bool], Value]] = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+# 'true' and 'false' are parsed as identifiers
+boolean_names = {'true': True, 'false': False}
+
+def constant_value(expr: ast.Expression) -> Value | ast.Expression:
+    """The value of a literal, including `true` and `false`, or `expr` itself if it isn't one."""
+    if isinstance(expr, ast.Literal):
+        return expr.value
+    if isinstance(expr, ast.Identifier) and expr.name in boolean_names:
+        return boolean_names[expr.name]
+    return expr
+
+def is_int(value: Value | ast.Expression) -> bool:
+    return type(value) is int
+
+def is_bool(value: Value | ast.Expression) -> bool:
+    return type(value) is bool
+
+int_result_operators = {'+', '-', '*', '/', '%'}
+bool_result_operators = {'==', '!=', '<', '<=', '>', '>=', 'and', 'or'}
+
+def obvious_type(expr: ast.Expression) -> type | None:
+    """`int` or `bool` if `expr` is a literal or an operation that can only give that type, or None.
+    An operation whose operands have the wrong types is still a type error after the nodes
+    around it are simplified away, so it counts too."""
+    value = constant_value(expr)
+    if not isinstance(value, ast.Expression):
+        return type(value) if value is not None else None
+    if isinstance(expr, ast.BinaryOp):
+        if expr.op in int_result_operators:
+            return int
+        if expr.op in bool_result_operators:
+            return bool
+    if isinstance(expr, ast.UnaryOp):
+        return int if expr.op == '-' else bool if expr.op == 'not' else None
+    return None
+
+def checked_type(expr: ast.Expression) -> type | None:
+    """The type of `expr` if it only has literals and operators and no type errors, or None.
+    Subtrees that are removed must be like this, so that their type errors aren't removed too.
+    The type of Unit is `type(None)`."""
+    # the nodes in pre-order, so that the children of each come after it
+    nodes: list[ast.Expression] = []
+    stack = [expr]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        if isinstance(node, ast.BinaryOp) and node.op != '=':
+            stack += [node.left, node.right]
+        elif isinstance(node, ast.UnaryOp):
+            stack.append(node.value)
+        elif isinstance(constant_value(node), ast.Expression):
+            return None
+    types: dict[int, type] = {}
+    for node in reversed(nodes):
+        if isinstance(node, ast.BinaryOp):
+            left, right = types[id(node.left)], types[id(node.right)]
+            if node.op in ('==', '!='):
+                well_typed = left is right
+            elif node.op in ('and', 'or'):
+                well_typed = left is bool and right is bool
+            else:
+                well_typed = left is int and right is int and node.op in integer_operators
+            if not well_typed:
+                return None
+            types[id(node)] = int if node.op in int_result_operators else bool
+        elif isinstance(node, ast.UnaryOp):
+            expected = int if node.op == '-' else bool if node.op == 'not' else None
+            if expected is None or types[id(node.value)] is not expected:
+                return None
+            types[id(node)] = expected
+        else:
+            types[id(node)] = type(constant_value(node))
+    return types[id(expr)]
+
+# === Passes ===
+
+# The passes are transformers (see 'compiler.traversal'), so they copy nodes
+# whose children change instead of modifying them.
+
+class ConstantFolder(Transformer):
+    """Evaluates operators whose operands are literals."""
+
+    def transform_unary_op(self, node: ast.UnaryOp) -> ast.Expression:
+        value = constant_value(node.value)
+        if node.op == '-' and is_int(value):
+            return ast.Literal(wrap(-value), loc=node.loc)  # type: ignore[operator]
+        if node.op == 'not' and is_bool(value):
+            return ast.Literal(not value, loc=node.loc)
+        return node
+
+    def transform_binary_op(self, node: ast.BinaryOp) -> ast.Expression:
+        if node.op == '=':
+            return node
+        left, right = constant_value(node.left), constant_value(node.right)
+        # 'and' and 'or' don't evaluate their right side if the left side decides the result,
+        # but it must still be a Bool
+        if node.op in ('and', 'or') and is_bool(left):
+            if left == (node.op == 'or'):
+                if checked_type(node.right) is bool:
+                    return ast.Literal(left, loc=node.loc)  # type: ignore[arg-type]
+                return node
+            if is_bool(right):
+                return ast.Literal(right, loc=node.loc)  # type: ignore[arg-type]
+            return node
+        if is_int(left) and is_int(right):
+            # division by zero and INT_MIN / -1 are left to fail at run time
+            if node.op in ('/', '%') and (right == 0 or (left == INT_MIN and right == -1)):
+                return node
+            if node.op in integer_operators:
+                return ast.Literal(integer_operators[node.op](left, right), loc=node.loc)  # type: ignore[arg-type]
+        if is_bool(left) and is_bool(right) and node.op in boolean_operators:
+            return ast.Literal(boolean_operators[node.op](left, right), loc=node.loc)  # type: ignore[arg-type]
+        return node
+
+class AlgebraSimplifier(Transformer):
+    """Removes operations that don't change their operand: `x * 1`, `x + 0`, `not not x`, ...
+
+    Only operands whose type is obvious (see `obvious_type`) are simplified, because
+    the types of variables aren't known here, and `true + 0` or `not not 5` must stay
+    type errors.
+    """
+
+    def transform_binary_op(self, node: ast.BinaryOp) -> ast.Expression:
+        left, right = constant_value(node.left), constant_value(node.right)
+        if node.op in ('+', '-') and is_int(right) and right == 0 and obvious_type(node.left) is int:
+            return node.left
+        if node.op == '+' and is_int(left) and left == 0 and obvious_type(node.right) is int:
+            return node.right
+        if node.op in ('*', '/') and is_int(right) and right == 1 and obvious_type(node.left) is int:
+            return node.left
+        if node.op == '*' and is_int(left) and left == 1 and obvious_type(node.right) is int:
+            return node.right
+        return node
+
+    def transform_unary_op(self, node: ast.UnaryOp) -> ast.Expression:
+        if isinstance(node.value, ast.UnaryOp) and node.value.op == node.op:
+            expected = int if node.op == '-' else bool if node.op == 'not' else None
+            if expected is not None and obvious_type(node.value.value) is expected:
+                return node.value.value
+        return node
+
+class IfPruner(Transformer):
+    """Replaces `if` expressions that have a literal condition with the branch that is taken.
+
+    Like in `AlgebraSimplifier`, type errors must stay: the branches must have the same
+    obvious type, and the branch that is removed must have no type errors (see `checked_type`).
+    """
+
+    def transform_if_expression(self, node: ast.IfExpression) -> ast.Expression:
+        cond = constant_value(node.cond)
+        if node.else_clause is None:
+            # the value of the whole expression is Unit, so it stays as it is if the condition is true
+            if cond is False and checked_type(node.then_clause) is not None:
+                return ast.Literal(None, loc=node.loc)
+            return node
+        if cond is True:
+            taken, removed = node.then_clause, node.else_clause
+        elif cond is False:
+            taken, removed = node.else_clause, node.then_clause
+        else:
+            return node
+        taken_type = obvious_type(taken)
+        if taken_type is not None and checked_type(removed) is taken_type:
+            return taken
+        return node
+
+class DeadLoopRemover(Transformer):
+    """Removes `while` loops whose condition is literally false, if their body has no type errors."""
+
+    def transform_while_expression(self, node: ast.WhileExpression) -> ast.Expression:
+        if constant_value(node.cond) is False and checked_type(node.body) is not None:
+            return ast.Literal(None, loc=node.loc)
+        return node
+
+def fold_constants(expr: ast.Expression) -> ast.Expression:
+    return ConstantFolder().transform(expr)
+
+def simplify_algebra(expr: ast.Expression) -> ast.Expression:
+    return AlgebraSimplifier().transform(expr)
+
+def prune_if_branches(expr: ast.Expression) -> ast.Expression:
+    return IfPruner().transform(expr)
+
+def remove_dead_loops(expr: ast.Expression) -> ast.Expression:
+    return DeadLoopRemover().transform(expr)
+
+passes: dict[str, Callable[[ast.Expression], ast.Expression]] = {
+    'constant_folding': fold_constants,
+    'algebraic_simplification': simplify_algebra,
+    'if_pruning': prune_if_branches,
+    'dead_loop_elimination': remove_dead_loops,
+}
+
+# the passes run at each optimization level, in order
+optimization_levels: dict[int, list[str]] = {
+    0: [],
+    1: ['constant_folding', 'if_pruning', 'dead_loop_elimination'],
+    2: ['constant_folding', 'algebraic_simplification', 'constant_folding', 'if_pruning', 'dead_loop_elimination'],
+}
+
+DEFAULT_OPTIMIZATION_LEVEL = 1
+
+class PassManager:
+    """Runs a list of passes from `passes` over an AST."""
+
+    def __init__(self, pass_names: list[str]) -> None:
+        for name in pass_names:
+            if name not in passes:
+                raise Exception(f'unknown optimization pass: {name}')
+        self.pass_names = pass_names
+
+    @classmethod
+    def for_level(cls, level: int) -> 'PassManager':
+        if level not in optimization_levels:
+            raise Exception(f'unknown optimization level: {level}')
+        return cls(optimization_levels[level])
+
+    def run(self, expr: ast.Expression, profiler: Profiler = NULL_PROFILER) -> ast.Expression:
+        """Returns the optimized AST. With an enabled profiler, records the time of each pass
+        as phase `optimize:<pass>` and the number of nodes it removed as count `removed_nodes:<pass>`."""
+        nodes = count_nodes(expr) if profiler.node_counts else 0
+        for name in self.pass_names:
+            with profiler.phase(f'optimize:{name}'):
+                expr = passes[name](expr)
+            if profiler.node_counts:
+                nodes_after = count_nodes(expr)
+                profiler.count(f'removed_nodes:{name}', nodes - nodes_after)
+                nodes = nodes_after
+        return expr
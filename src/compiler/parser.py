@@ -1,23 +1,117 @@
-from compiler.tokenizer import Token
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Iterator
+from compiler.arena import Arena
+from compiler.tokenizer import Location, Token
 import compiler.ast as ast
 
-def parse(tokens: list[Token]) -> ast.Expression:
-    # This keeps track of which token we're looking at.
-    pos = 0
+# Binding power of the binary operators. All of them are left associative:
+# the multiplicative ones bind tighter than the rest, which share one level.
+binary_precedence: dict[str, int] = {
+    **{op: 1 for op in ['or', 'and', '==', '!=', '<', '<=', '>', '>=', '+', '-']},
+    **{op: 2 for op in ['*', '/', '%']},
+}
 
-    # 'peek()' returns the token at 'pos',
-    # or a special 'end' token if we're past the end of the token list
-    def peek() -> Token:
-        if len(tokens) == 0:
+left_associative_binary_operators = frozenset(op for op, level in binary_precedence.items() if level == 1)
+multiplicative_operators = frozenset(op for op, level in binary_precedence.items() if level == 2)
+unary_operators = frozenset(['-', 'not'])
+
+class TokenStream:
+    """Reads tokens lazily from any iterable, buffering at most `lookahead` tokens."""
+
+    def __init__(self, tokens: Iterable[Token], lookahead: int = 1) -> None:
+        self._tokens: Iterator[Token] = iter(tokens)
+        self._buffer: deque[Token] = deque()
+        self._lookahead = lookahead
+        self._last: Token | None = None   # the most recently read token, for the 'end' location
+        self._end: Token | None = None
+        self.position = 0   # the number of tokens consumed so far
+
+    # 'peek(n)' returns the token 'n' positions ahead,
+    # or a special 'end' token if the stream runs out before that
+    def peek(self, n: int = 0) -> Token:
+        if n < len(self._buffer):
+            return self._buffer[n]
+        if n >= self._lookahead:
+            raise ValueError(f'cannot look {n} tokens ahead, lookahead is {self._lookahead}')
+        buffer = self._buffer
+        while len(buffer) <= n:
+            token = next(self._tokens, None)
+            if token is None:
+                return self._end_token()
+            buffer.append(token)
+            self._last = token
+        return buffer[n]
+
+    # 'next()' returns the current token and moves past it
+    def next(self) -> Token:
+        token = self.peek()
+        if self._buffer:
+            self._buffer.popleft()
+            self.position += 1
+        return token
+
+    # 'skip(count)' moves past the next 'count' tokens without looking at them
+    def skip(self, count: int) -> None:
+        buffered = min(count, len(self._buffer))
+        for _ in range(buffered):
+            self._buffer.popleft()
+        last = deque(islice(self._tokens, count - buffered), maxlen=1)
+        if last:
+            self._last = last[0]
+        self.position += count
+
+    def _end_token(self) -> Token:
+        if self._last is None:
             raise Exception(f'input was empty')
-        if pos < len(tokens):
-            return tokens[pos]
-        else:
-            return Token(
-                loc=tokens[-1].loc,
+        if self._end is None:
+            self._end = Token(
+                loc=self._last.loc,
                 type="end",
                 text="",
             )
+        return self._end
+
+# Expressions by the index of their first token: each entry is the index
+# of the token after the expression, and the parsed node.
+SubtreeTable = dict[int, tuple[int, ast.Expression]]
+
+def parse(
+    tokens: Iterable[Token],
+    arena: Arena | None = None,
+    subtrees: SubtreeTable | None = None,
+) -> ast.Expression:
+    # Tokens are pulled from the stream only as far as the parser needs them,
+    # so 'tokens' can be a list or a generator such as 'iter_tokens(...)'.
+    stream = TokenStream(tokens)
+    peek = stream.peek
+
+    # With 'subtrees', expressions found in it are reused instead of parsed again,
+    # and the ones parsed are added to it. An expression only depends on its own
+    # tokens and the one after it, so an entry stays valid as long as those tokens
+    # don't change (see 'compiler.incremental').
+    def reusable(parse_function: Callable[[], ast.Expression]) -> Callable[[], ast.Expression]:
+        if subtrees is None:
+            return parse_function
+
+        def parse_or_reuse() -> ast.Expression:
+            start = stream.position
+            if (entry := subtrees.get(start)) is not None:
+                end, node = entry
+                stream.skip(end - start)
+                return node
+            node = parse_function()
+            if not isinstance(node, (ast.Literal, ast.Identifier)):
+                subtrees[start] = (stream.position, node)
+            return node
+        return parse_or_reuse
+
+    # With an arena, equal leaf nodes and operator strings are shared.
+    make_literal = ast.Literal if arena is None else arena.literal
+    make_identifier = ast.Identifier if arena is None else arena.identifier
+
+    def name(text: str) -> str:
+        return text if arena is None else arena.name(text)
 
     # 'consume(expected)' returns the token at 'pos', moves 'pos' forward
     def consume(expected: str | list[str] | None = None) -> Token:
@@ -27,16 +121,14 @@ def parse(tokens: list[Token]) -> ast.Expression:
         if isinstance(expected, list) and token.text not in expected:
             comma_separated = ", ".join([f'"{e}"' for e in expected])
             raise Exception(f'{token.loc}: expected one of: {comma_separated}')
-        nonlocal pos
-        pos += 1
-        return token
+        return stream.next()
 
     # the parsing function for integer literals.
     def parse_int_literal() -> ast.Literal:
         if peek().type != 'int_literal':
             raise Exception(f'{peek().loc}: expected an integer literal')
         token = consume()
-        return ast.Literal(int(token.text))
+        return make_literal(int(token.text), loc=token.loc)
 
     # the parsing function for identifiers.
     def parse_identifier() -> ast.Identifier:
@@ -44,16 +136,16 @@ def parse(tokens: list[Token]) -> ast.Expression:
             raise Exception(f'{peek().loc}: expected an identifier')
         token = consume()
         if peek().text == "(":
-            return parse_function_call(ast.Identifier(token.text))
-        return ast.Identifier(token.text)
+            return parse_function_call(make_identifier(token.text, loc=token.loc), token.loc)
+        return make_identifier(token.text, loc=token.loc)
     
     # parsing for function calls
-    def parse_function_call(function_name: str) -> ast.FunctionCall:
+    def parse_function_call(function_name: ast.Identifier, loc: Location) -> ast.FunctionCall:
         args = []
         consume('(')
         if peek().text == ")":
             consume(")")
-            return ast.FunctionCall(function_name, args)
+            return ast.FunctionCall(function_name, args, loc=loc)
         while True:
             args.append(parse_expression())
             if peek().text == ")":
@@ -61,60 +153,45 @@ def parse(tokens: list[Token]) -> ast.Expression:
             if peek().text == ",":
                 consume(",")
         consume(')')
-        return ast.FunctionCall(function_name, args)
+        return ast.FunctionCall(function_name, args, loc=loc)
     
-    # the parsing function
+    # the parsing function for factors, dispatched on the text or type of the next token
     def parse_factor() -> ast.Expression:
-      if peek().text == "(":
-          return parse_parenthesized()
-      elif peek().text in ["not", "-"]:
-          return parse_unary_ops()
-      elif peek().text == "if":
-          return parse_if_expression()
-      elif peek().type == 'int_literal':
-          return parse_int_literal()
-      elif peek().type == 'identifier':
-          return parse_identifier()
-      else:
-          raise Exception(f'{peek().loc}: expected "(", "if", an integer literal or an identifier')
+        token = peek()
+        parse_function = factor_parsers_by_text.get(token.text) or factor_parsers_by_type.get(token.type)
+        if parse_function is None:
+            raise Exception(f'{token.loc}: expected "(", "if", an integer literal or an identifier')
+        return parse_function()
 
     # parsing function for unary operators - and not
     def parse_unary_ops() -> ast.Expression:
-        while peek().text in ['-', 'not']:
-            operator_token = consume()
-            operator = operator_token.text
-            operand = parse_factor()
-        return ast.UnaryOp(operator, operand)
+        # the operand is a single factor, which may itself be a unary operation
+        operator_token = stream.next()
+        operator = name(operator_token.text)
+        operand = parse_factor()
+        return ast.UnaryOp(operator, operand, loc=operator_token.loc)
     
     # parsing for an assignment "="
     def parse_assignment():
         left: ast.Expression = parse_left_binary_operators()
         if peek().text == "=":
-            consume("=")
+            operator_token = consume("=")
             right = parse_assignment()
-            return ast.BinaryOp(left, "=", right)
+            return ast.BinaryOp(left, "=", right, loc=operator_token.loc)
         return left
     
     # parsing function for left associative binary operators
     def parse_left_binary_operators() -> ast.Expression:
-        left_associative_binary_operators = {op for l in [
-            ['or'],
-            ['and'],
-            ['==', '!='],
-            ['<', '<=', '>', '>='],
-            ['+', '-'],
-            ['*', '/', '%'],
-        ] for op in l}
-
         left: ast.Expression = parse_term()
         while peek().text in left_associative_binary_operators:
-            operator_token = consume()
-            operator = operator_token.text
+            operator_token = stream.next()
+            operator = name(operator_token.text)
             right = parse_term()
             left = ast.BinaryOp(
                 left,
                 operator,
-                right
+                right,
+                loc=operator_token.loc,
             )
         return left
     
@@ -127,37 +204,29 @@ def parse(tokens: list[Token]) -> ast.Expression:
       consume(')')
       return expr
     
-    # the parsing function for "+ and -" expressions
+    # the parsing function for expressions without assignments
     def parse_expression() -> ast.Expression:
-        left: ast.Expression = parse_left_binary_operators()
-        while peek().text in ['+', '-']:
-            operator_token = consume()
-            operator = operator_token.text
-            right = parse_left_binary_operators()
-            left = ast.BinaryOp(
-                left,
-                operator,
-                right
-            )
-        return left
+        return parse_left_binary_operators()
+    parse_expression = reusable(parse_expression)
 
     # the parsing function for "* and /" expressions
     def parse_term() -> ast.Expression:
         left: ast.Expression = parse_factor()
-        while peek().text in ['*', '/', '%']:
-            operator_token = consume()
-            operator = operator_token.text
+        while peek().text in multiplicative_operators:
+            operator_token = stream.next()
+            operator = name(operator_token.text)
             right = parse_factor()
             left = ast.BinaryOp(
                 left,
                 operator,
-                right
+                right,
+                loc=operator_token.loc,
             )
         return left
     
     # parsing for if expressions
     def parse_if_expression() -> ast.Expression:
-        consume("if")
+        if_token = consume("if")
         cond = parse_expression()
         consume("then")
         then_clause = parse_expression()
@@ -166,17 +235,28 @@ def parse(tokens: list[Token]) -> ast.Expression:
             else_clause = parse_expression()
         else:
             else_clause = None
-        return ast.IfExpression(cond, then_clause, else_clause)
+        return ast.IfExpression(cond, then_clause, else_clause, loc=if_token.loc)
     
     # parsing for while expressions
     def parse_while_expression() -> ast.Expression:
         if peek().text == "while":
-            consume("while")
+            while_token = consume("while")
             cond = parse_expression()
             body = parse_assignment()
-            return ast.WhileExpression(cond, body)
+            return ast.WhileExpression(cond, body, loc=while_token.loc)
         return parse_assignment()   # if not while, check right associative =
     
+    factor_parsers_by_text: dict[str, Callable[[], ast.Expression]] = {
+        "(": parse_parenthesized,
+        "-": parse_unary_ops,
+        "not": parse_unary_ops,
+        "if": parse_if_expression,
+    }
+    factor_parsers_by_type: dict[str, Callable[[], ast.Expression]] = {
+        "int_literal": parse_int_literal,
+        "identifier": parse_identifier,
+    }
+
     # start parsing
     def start_parsing() -> ast.Expression:
         return parse_while_expression() # starts with while
@@ -0,0 +1,141 @@
+"""A peephole optimizer for generated x86-64 assembly in AT&T syntax.
+
+Code generated one IR instruction at a time stores every result in its stack slot and
+loads it back for the next instruction, and jumps to labels that follow right after.
+The optimizer slides a window over the lines and rewrites the instructions in it with
+the patterns in `patterns`. Lines are kept on a stack as they are rewritten, so that a
+rewrite is matched again with the lines before it, and each line is looked at a bounded
+number of times.
+
+Labels, directives and comments are never rewritten, and instructions don't move
+across labels, so jumps into the middle of a pattern can't be broken.
+"""
+from typing import Callable, NamedTuple
+import re
+from compiler.profiling import NULL_PROFILER, Profiler
+
+class Instruction(NamedTuple):
+    """A line of assembly, with its mnemonic and operands if it is an instruction, or its name if it is a label."""
+    line: str
+    mnemonic: str = ''
+    operands: tuple[str, ...] = ()
+    label: str | None = None
+
+_label_pattern = re.compile(r'\s*([A-Za-z0-9_.$]+):\s*(?:#.*)?')
+_instruction_pattern = re.compile(r'\s*([a-z][a-z0-9]*)(?:\s+([^#]*?))?\s*(?:#.*)?')
+# a comma that isn't inside the parentheses of a memory operand like '8(%rax,%rcx,8)'
+_operand_separator = re.compile(r',(?![^(]*\))')
+_register = re.compile(r'%[a-z0-9]+')
+
+def parse_line(line: str) -> Instruction:
+    if (m := _label_pattern.fullmatch(line)) is not None:
+        return Instruction(line, label=m[1])
+    if line.lstrip().startswith('.') or (m := _instruction_pattern.fullmatch(line)) is None:
+        return Instruction(line)
+    operands = tuple(operand.strip() for operand in _operand_separator.split(m[2])) if m[2] else ()
+    return Instruction(line, m[1], operands)
+
+def _is_register(operand: str) -> bool:
+    return _register.fullmatch(operand) is not None
+
+def _is_memory(operand: str) -> bool:
+    return operand.endswith(')') and not operand.startswith('*')
+
+def _indented(like: Instruction, text: str) -> str:
+    return like.line[:len(like.line) - len(like.line.lstrip())] + text
+
+def _self_move(window: list[Instruction]) -> list[str] | None:
+    # only the 64-bit move: 'movl %eax, %eax' clears the upper half of %rax
+    move = window[0]
+    if move.mnemonic == 'movq' and len(move.operands) == 2 and move.operands[0] == move.operands[1] and _is_register(move.operands[0]):
+        return []
+    return None
+
+def _store_then_load(window: list[Instruction]) -> list[str] | None:
+    store, load = window
+    if store.mnemonic != 'movq' or load.mnemonic != 'movq' or len(store.operands) != 2 or len(load.operands) != 2:
+        return None
+    source, slot = store.operands
+    if not _is_register(source) or not _is_memory(slot) or load.operands[0] != slot or not _is_register(load.operands[1]):
+        return None
+    if load.operands[1] == source:
+        return [store.line]
+    return [store.line, _indented(load, f'movq {source}, {load.operands[1]}')]
+
+def _repeated_load(window: list[Instruction]) -> list[str] | None:
+    first, second = window
+    if first.mnemonic != 'movq' or len(first.operands) != 2 or first.operands != second.operands or second.mnemonic != 'movq':
+        return None
+    source, destination = first.operands
+    # the second load reads a different address if the first one changed its register
+    if not _is_memory(source) or not _is_register(destination) or destination in source:
+        return None
+    return [first.line]
+
+def _jump_to_next(window: list[Instruction]) -> list[str] | None:
+    jump, label = window
+    if label.label is not None and jump.mnemonic.startswith('j') and jump.operands == (label.label,):
+        return [label.line]
+    return None
+
+def _push_then_pop(window: list[Instruction]) -> list[str] | None:
+    push, pop = window
+    if push.mnemonic != 'pushq' or pop.mnemonic != 'popq' or not _is_register(push.operands[0]) or not _is_register(pop.operands[0]):
+        return None
+    if push.operands[0] == pop.operands[0]:
+        return []
+    return [_indented(push, f'movq {push.operands[0]}, {pop.operands[0]}')]
+
+# The rewrite patterns, with the number of lines in their window. A pattern returns
+# the lines that replace its window, or None if it doesn't match.
+patterns: dict[str, tuple[int, Callable[[list[Instruction]], list[str] | None]]] = {
+    'self_move': (1, _self_move),
+    'store_then_load': (2, _store_then_load),
+    'repeated_load': (2, _repeated_load),
+    'jump_to_next': (2, _jump_to_next),
+    'push_then_pop': (2, _push_then_pop),
+}
+
+# the patterns used at each optimization level
+peephole_levels: dict[int, list[str]] = {
+    0: [],
+    1: [],
+    2: list(patterns),
+}
+
+def optimize(lines: list[str], pattern_names: list[str], counts: dict[str, int] | None = None) -> list[str]:
+    """Returns `lines` rewritten with the patterns in `pattern_names`, adding the number of rewrites
+    with each pattern to `counts`."""
+    selected = [(name, *patterns[name]) for name in pattern_names]
+    output: list[Instruction] = []
+    pending = [parse_line(line) for line in reversed(lines)]
+    while pending:
+        output.append(pending.pop())
+        for name, size, rewrite in selected:
+            if len(output) < size:
+                continue
+            replacement = rewrite(output[-size:])
+            if replacement is not None:
+                if counts is not None:
+                    counts[name] = counts.get(name, 0) + 1
+                del output[-size:]
+                # the replacement is matched again, with the lines before it
+                pending.extend(parse_line(line) for line in reversed(replacement))
+                break
+    return [instruction.line for instruction in output]
+
+def optimize_assembly(lines: list[str], optimization_level: int, profiler: Profiler = NULL_PROFILER) -> list[str]:
+    """Runs the patterns of `optimization_level` over `lines`. With an enabled profiler, records
+    the time as phase `peephole` and the rewrites with each pattern as count `rewrites:<pattern>`."""
+    if optimization_level not in peephole_levels:
+        raise Exception(f'unknown optimization level: {optimization_level}')
+    pattern_names = peephole_levels[optimization_level]
+    if not pattern_names:
+        return lines
+    counts: dict[str, int] = {}
+    with profiler.phase('peephole'):
+        lines = optimize(lines, pattern_names, counts)
+    if profiler.enabled:
+        for name, count in counts.items():
+            profiler.count(f'rewrites:{name}', count)
+    return lines
@@ -0,0 +1,164 @@
+from typing import Any, Iterable
+from compiler.arena import Arena
+from compiler.parser import TokenStream, binary_precedence, unary_operators
+from compiler.tokenizer import Token
+import compiler.ast as ast
+
+# Kinds of the frames on the parser stack. Each frame records what to do
+# with the expression that is currently being parsed once it is complete.
+# 'loc' is the location of the keyword or operator that started the frame.
+_BINARY = 0         # (_BINARY, left, operator, precedence, loc)
+_UNARY = 1          # (_UNARY, operator, loc)
+_PARENTHESES = 2    # (_PARENTHESES,)
+_IF_COND = 3        # (_IF_COND, loc)
+_IF_THEN = 4        # (_IF_THEN, cond, loc)
+_IF_ELSE = 5        # (_IF_ELSE, cond, then_clause, loc)
+_CALL = 6           # (_CALL, name, arguments, loc)
+_WHILE_COND = 7     # (_WHILE_COND, loc)
+_WHILE_BODY = 8     # (_WHILE_BODY, cond, loc)
+_ASSIGNMENT = 9     # (_ASSIGNMENT,)
+_ASSIGN_RIGHT = 10  # (_ASSIGN_RIGHT, left, loc)
+
+def parse(tokens: Iterable[Token], arena: Arena | None = None) -> ast.Expression:
+    """Parses the same language into the same trees as `compiler.parser.parse`,
+    but with operator precedence climbing over an explicit stack instead of recursion,
+    so the nesting depth is only limited by memory.
+    """
+    stream = TokenStream(tokens)
+    peek = stream.peek
+    next_token = stream.next
+
+    make_literal = ast.Literal if arena is None else arena.literal
+    make_identifier = ast.Identifier if arena is None else arena.identifier
+
+    def name(text: str) -> str:
+        return text if arena is None else arena.name(text)
+
+    def consume(expected: str) -> Token:
+        token = peek()
+        if token.text != expected:
+            raise Exception(f'{token.loc}: expected "{expected}"')
+        return next_token()
+
+    stack: list[tuple[Any, ...]] = []
+    if peek().text == "while":
+        stack.append((_WHILE_COND, next_token().loc))
+    else:
+        stack.append((_ASSIGNMENT,))
+
+    while True:
+        # Read prefix tokens until we have a complete factor.
+        token = peek()
+        text = token.text
+        if text == "(":
+            next_token()
+            stack.append((_PARENTHESES,))
+            continue
+        elif text in unary_operators:
+            next_token()
+            stack.append((_UNARY, name(text), token.loc))
+            continue
+        elif text == "if":
+            next_token()
+            stack.append((_IF_COND, token.loc))
+            continue
+        elif token.type == 'int_literal':
+            next_token()
+            operand: ast.Expression = make_literal(int(text), loc=token.loc)
+        elif token.type == 'identifier':
+            next_token()
+            if peek().text != "(":
+                operand = make_identifier(text, loc=token.loc)
+            else:
+                next_token()
+                function_name = make_identifier(text, loc=token.loc)
+                if peek().text != ")":
+                    stack.append((_CALL, function_name, [], token.loc))
+                    continue
+                next_token()
+                operand = ast.FunctionCall(function_name, [], loc=token.loc)
+        else:
+            raise Exception(f'{token.loc}: expected "(", "if", an integer literal or an identifier')
+
+        # Combine the operand with the frames on the stack
+        # until we need to read another factor.
+        while True:
+            frame = stack[-1]
+            kind = frame[0]
+            if kind == _UNARY:
+                stack.pop()
+                operand = ast.UnaryOp(frame[1], operand, loc=frame[2])
+                continue
+
+            token = peek()
+            text = token.text
+            precedence = binary_precedence.get(text)
+            if precedence is not None:
+                while kind == _BINARY and frame[3] >= precedence:
+                    stack.pop()
+                    operand = ast.BinaryOp(frame[1], frame[2], operand, loc=frame[4])
+                    frame = stack[-1]
+                    kind = frame[0]
+                next_token()
+                stack.append((_BINARY, operand, name(text), precedence, token.loc))
+                break
+
+            # No binary operator follows, so the current expression is complete.
+            while kind == _BINARY:
+                stack.pop()
+                operand = ast.BinaryOp(frame[1], frame[2], operand, loc=frame[4])
+                frame = stack[-1]
+                kind = frame[0]
+
+            if kind == _PARENTHESES:
+                consume(")")
+                stack.pop()
+            elif kind == _IF_COND:
+                consume("then")
+                stack[-1] = (_IF_THEN, operand, frame[1])
+                break
+            elif kind == _IF_THEN:
+                if text == "else":
+                    next_token()
+                    stack[-1] = (_IF_ELSE, frame[1], operand, frame[2])
+                    break
+                stack.pop()
+                operand = ast.IfExpression(frame[1], operand, None, loc=frame[2])
+            elif kind == _IF_ELSE:
+                stack.pop()
+                operand = ast.IfExpression(frame[1], frame[2], operand, loc=frame[3])
+            elif kind == _CALL:
+                frame[2].append(operand)
+                if text == ")":
+                    next_token()
+                    stack.pop()
+                    operand = ast.FunctionCall(frame[1], frame[2], loc=frame[3])
+                    continue
+                if text == ",":
+                    next_token()
+                break
+            elif kind == _WHILE_COND:
+                stack[-1] = (_WHILE_BODY, operand, frame[1])
+                stack.append((_ASSIGNMENT,))
+                break
+            else:
+                # '=' is right associative and only allowed at the top level
+                if text == "=":
+                    next_token()
+                    stack.append((_ASSIGN_RIGHT, operand, token.loc))
+                    break
+                while kind == _ASSIGN_RIGHT:
+                    stack.pop()
+                    operand = ast.BinaryOp(frame[1], "=", operand, loc=frame[2])
+                    frame = stack[-1]
+                    kind = frame[0]
+                stack.pop()
+                if stack:
+                    _, cond, loc = stack.pop()
+                    operand = ast.WhileExpression(cond, operand, loc=loc)
+
+                # Make sure the entire input is always parsed.
+                token = peek()
+                if token.type != 'end':
+                    raise Exception(f'{token.loc}: unexpected token "{token.text}"')
+                return operand
@@ -0,0 +1,70 @@
+from socketserver import TCPServer
+from types import FrameType
+from typing import Callable
+import os
+import signal
+import traceback
+
+def serve_prefork(server: TCPServer, workers: int, on_worker_count: Callable[[int], None] | None = None) -> None:
+    """Serves requests from `workers` long-lived worker processes that all accept on the socket of `server`.
+
+    At most `workers` requests are handled at a time. Further connections wait in the
+    listen queue of `server.request_queue_size` entries, and the kernel holds off new
+    clients once it is full. SIGINT or SIGTERM stops accepting new connections and
+    lets the workers finish their current request before exiting. A worker that dies
+    is replaced. `on_worker_count` is called with the number of running workers whenever it changes.
+
+    Other children of the calling process may exit while this runs, and are left alone.
+    """
+    # Wait for connections at most this long, to check for 'stopping' while idle. With a timeout,
+    # a worker that loses the race for a connection doesn't get stuck in accept() either.
+    # (A non-blocking socket would make handle_request() poll without waiting at all.)
+    server.socket.settimeout(0.5)
+    parent_pid = os.getpid()
+    pids: set[int] = set()
+    stopping = False
+
+    def stop(signum: int, frame: FrameType | None) -> None:
+        nonlocal stopping
+        stopping = True
+        if os.getpid() == parent_pid:
+            for pid in list(pids):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+    def run_worker() -> None:
+        while not stopping:
+            server.handle_request()
+        server.server_close()
+
+    def start_worker() -> int:
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker()
+            except BaseException:
+                traceback.print_exc()
+                os._exit(1)
+            os._exit(0)
+        return pid
+
+    previous_handlers = [signal.signal(signal.SIGINT, stop), signal.signal(signal.SIGTERM, stop)]
+    try:
+        for _ in range(workers):
+            pids.add(start_worker())
+        if on_worker_count is not None:
+            on_worker_count(len(pids))
+        while pids:
+            pid, _ = os.wait()
+            if pid not in pids:
+                continue
+            pids.discard(pid)
+            if not stopping:
+                pids.add(start_worker())
+            if on_worker_count is not None:
+                on_worker_count(len(pids))
+    finally:
+        signal.signal(signal.SIGINT, previous_handlers[0])
+        signal.signal(signal.SIGTERM, previous_handlers[1])
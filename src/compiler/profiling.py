@@ -0,0 +1,105 @@
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from dataclasses import dataclass, fields
+from typing import Any, Iterator
+import time
+import tracemalloc
+import compiler.ast as ast
+
+@dataclass
+class PhaseStats:
+    seconds: float = 0.0
+    peak_memory: int | None = None   # bytes allocated at the peak, above the start of the phase
+
+class Profiler:
+    """Collects the time of each compilation phase, and counts such as the number of tokens.
+
+    With `memory=True`, the peak memory allocated during each phase is measured with
+    `tracemalloc`, which slows down everything while it is on. With `node_counts=False`,
+    the ASTs aren't walked to count their nodes, for when only the phase times are needed.
+    Phases must not nest.
+    """
+
+    enabled = True
+
+    def __init__(self, memory: bool = False, node_counts: bool = True) -> None:
+        self.memory = memory
+        self.node_counts = node_counts
+        self.phases: dict[str, PhaseStats] = {}
+        self.counts: dict[str, int] = {}
+
+    @contextmanager
+    def _measure(self, name: str) -> Iterator[None]:
+        stats = self.phases.setdefault(name, PhaseStats())
+        tracing = self.memory and not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        if self.memory:
+            tracemalloc.reset_peak()
+            start_memory, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # phases that fail are recorded too
+            stats.seconds += time.perf_counter() - start
+            if self.memory:
+                _, peak = tracemalloc.get_traced_memory()
+                stats.peak_memory = max(stats.peak_memory or 0, peak - start_memory)
+            if tracing:
+                tracemalloc.stop()
+
+    def phase(self, name: str) -> AbstractContextManager[None]:
+        """Measures the code in a `with` block as phase `name`."""
+        return self._measure(name)
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "phases": {
+                name: {"seconds": stats.seconds, **({"peak_memory": stats.peak_memory} if stats.peak_memory is not None else {})}
+                for name, stats in self.phases.items()
+            },
+            "counts": dict(self.counts),
+        }
+
+    def report(self) -> str:
+        lines = []
+        for name, stats in self.phases.items():
+            line = f"{name:<10} {stats.seconds * 1000:>10.3f} ms"
+            if stats.peak_memory is not None:
+                line += f" {stats.peak_memory / 1024:>12.1f} KiB peak"
+            lines.append(line)
+        lines.extend(f"{name:<10} {value:>10}" for name, value in self.counts.items())
+        return "\n".join(lines)
+
+class NullProfiler(Profiler):
+    """A profiler that measures nothing, used when profiling is off."""
+
+    enabled = False
+    _no_measurement = nullcontext()
+
+    def __init__(self) -> None:
+        super().__init__(node_counts=False)
+
+    def phase(self, name: str) -> AbstractContextManager[None]:
+        return self._no_measurement
+
+    def count(self, name: str, value: int) -> None:
+        pass
+
+NULL_PROFILER = NullProfiler()
+
+def count_nodes(expr: ast.Expression) -> int:
+    """Counts the nodes of an AST, without recursion so that deep trees work too."""
+    count = 0
+    stack: list[Any] = [expr]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, ast.Expression):
+            count += 1
+            stack.extend(getattr(value, field.name) for field in fields(value))
+        elif isinstance(value, list):
+            stack.extend(value)
+    return count
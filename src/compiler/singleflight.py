@@ -0,0 +1,158 @@
+"""Coalescing of identical compilations that run at the same time, across processes.
+
+Each key has a lock file in a shared directory. The first process to lock it compiles.
+Processes that find the lock taken wait for it, holding a shared lock on the key's
+waiters file while they do. When the compiling process finishes and finds the waiters
+file locked, it writes the result, or the pickled exception, to the key's result file
+with the time it finished. The waiters use the result if it finished after they started
+waiting, and the last of them to read it removes it. If the compiling process died
+without a result, the next one in line compiles instead. A process that has waited
+longer than the timeout gives up and compiles by itself.
+
+So a compilation that nobody waits for writes nothing, and result files only exist while
+their waiters read them. The process that finds nobody waiting at the end also removes the
+lock and waiters files, while holding both locks. Processes that opened them before that
+notice it when they get the lock, and start again with new files.
+"""
+from pathlib import Path
+from traceback import format_exception
+from typing import Callable
+import fcntl
+import os
+import pickle
+import struct
+import tempfile
+import time
+from compiler.cache import Counters, write_atomically
+
+# a result file starts with the time it was written and whether it holds an error
+_HEADER = struct.Struct("<qB")
+
+# the longest sleep between attempts to take a lock that has a timeout
+_MAX_POLL_INTERVAL = 0.05
+
+def _pickle_exception(e: Exception) -> bytes:
+    """`e` pickled, with the traceback of where it was raised as a note, or an `Exception`
+    with its message if it can't be pickled and unpickled."""
+    try:
+        error = pickle.loads(pickle.dumps(e))
+    except Exception:
+        error = Exception(str(e))
+    error.add_note(f"Raised while compiling in process {os.getpid()}:\n" + "".join(format_exception(e)).rstrip())
+    return pickle.dumps(error)
+
+def _lock_before(fd: int, deadline: float) -> bool:
+    """Takes an exclusive lock on `fd`, or returns False if it is still taken at `deadline`."""
+    interval = 0.001
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, _MAX_POLL_INTERVAL)
+
+def _is_linked(fd: int, path: Path) -> bool:
+    """Whether `fd` is still the file at `path`."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    own = os.fstat(fd)
+    return (stat.st_dev, stat.st_ino) == (own.st_dev, own.st_ino)
+
+class SingleFlight:
+    """Runs at most one compilation per key at a time among all processes using `directory`.
+
+    Without `directory`, a temporary one is created, which the processes forked
+    after this share. It is removed by `close`. A call waits at most `timeout` seconds
+    for another one before compiling by itself. `stats` counts the compilations, as
+    `coalesced` the ones that were saved by waiting for another one, and as `timed_out`
+    the waits that were given up.
+    """
+
+    def __init__(self, directory: str | None = None, timeout: float = 60.0) -> None:
+        self._temporary_directory: tempfile.TemporaryDirectory[str] | None = None
+        if directory is None:
+            self._temporary_directory = tempfile.TemporaryDirectory(prefix="compiler-inflight-")
+            directory = self._temporary_directory.name
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+        self.stats = Counters(["compiled", "coalesced", "timed_out"])
+
+    def close(self) -> None:
+        if self._temporary_directory is not None:
+            self._temporary_directory.cleanup()
+
+    def run(self, key: str, compile_function: Callable[[], bytes]) -> bytes:
+        """Returns the result of `compile_function`, or of a call for the same `key`
+        that was running in another process, whose exception is raised here too."""
+        started = time.time_ns()
+        deadline = time.monotonic() + self.timeout
+        waiters_path = self.directory / f"{key}.waiters"
+        lock_path = self.directory / f"{key}.lock"
+        while True:
+            # the locks are released when the files are closed, also when the process dies
+            waiters_fd = os.open(waiters_path, os.O_RDWR | os.O_CREAT, 0o600)
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(waiters_fd, fcntl.LOCK_SH)
+                if not _lock_before(fd, deadline):
+                    break
+                if not (_is_linked(waiters_fd, waiters_path) and _is_linked(fd, lock_path)):
+                    continue   # removed by the last process before us, so start over with new files
+                shared = self._read_result(key, started)
+                fcntl.flock(waiters_fd, fcntl.LOCK_UN)
+                if shared is not None:
+                    self.stats.increment("coalesced")
+                    self._remove_result_unless_waited_for(key, waiters_fd)
+                    is_error, data = shared
+                    if is_error:
+                        raise pickle.loads(data)
+                    return data
+                self.stats.increment("compiled")
+                try:
+                    executable = compile_function()
+                except Exception as e:
+                    if self._remove_result_unless_waited_for(key, waiters_fd):
+                        self._write_result(key, True, _pickle_exception(e))
+                    raise
+                if self._remove_result_unless_waited_for(key, waiters_fd):
+                    self._write_result(key, False, executable)
+                return executable
+            finally:
+                os.close(fd)
+                os.close(waiters_fd)
+        self.stats.increment("timed_out")
+        self.stats.increment("compiled")
+        return compile_function()
+
+    def _remove_result_unless_waited_for(self, key: str, waiters_fd: int) -> bool:
+        """Removes the files of `key` if no process is waiting for it,
+        and otherwise returns True. Only called with the key's lock held."""
+        try:
+            fcntl.flock(waiters_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        for suffix in ("result", "waiters", "lock"):
+            (self.directory / f"{key}.{suffix}").unlink(missing_ok=True)
+        fcntl.flock(waiters_fd, fcntl.LOCK_UN)
+        return False
+
+    def _read_result(self, key: str, started: int) -> tuple[bool, bytes] | None:
+        """The result for `key` if it was written after `started`."""
+        try:
+            data = (self.directory / f"{key}.result").read_bytes()
+        except FileNotFoundError:
+            return None
+        finished, is_error = _HEADER.unpack_from(data)
+        if finished < started:
+            return None
+        return bool(is_error), data[_HEADER.size:]
+
+    def _write_result(self, key: str, is_error: bool, data: bytes) -> None:
+        write_atomically(self.directory / f"{key}.result", _HEADER.pack(time.time_ns(), is_error), data)
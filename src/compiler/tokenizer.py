@@ -1,5 +1,8 @@
+from array import array
 from dataclasses import dataclass
-from typing import Literal
+from mmap import ACCESS_READ, mmap
+from typing import Iterator, Literal, TextIO
+import os
 import re
 
 TokenType = Literal["int_literal", "identifier", "operator", "punctuation", "end"]
@@ -27,40 +30,242 @@ class Token:
   text: str
   loc: Location
 
-def tokenize(source_code: str) -> list[Token]:
-  tokens = {
-    re.compile(r"\s+"): "whitespace",
-    re.compile(r"//.*|#.*"): "comment",
-    re.compile(r"[0-9]+"): "int_literal",
-    re.compile(r"[a-zA-Z_][a-zA-Z0-9_]*"): "identifier",
-    re.compile(r"==|!=|<=|>=|=|<|>|\+|\-|\*|\/|%"): "operator",
-    re.compile(r"[(){},;]"): "punctuation",
-  }
-
-  result: list[Token] = []
+# token patterns in priority order: the first alternative that matches wins
+token_patterns: list[tuple[str, str]] = [
+  ("whitespace", r"\s+"),
+  ("comment", r"//.*|#.*"),
+  ("int_literal", r"[0-9]+"),
+  ("identifier", r"[a-zA-Z_][a-zA-Z0-9_]*"),
+  ("operator", r"==|!=|<=|>=|=|<|>|\+|\-|\*|\/|%"),
+  ("punctuation", r"[(){},;]"),
+]
+
+# all token patterns combined into a single regex with one named group per token type
+token_regex = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in token_patterns))
+
+# The same regex for ASCII source code in bytes. In bytes patterns, '\s' doesn't match
+# the ASCII separator characters \x1c-\x1f like it does in str patterns, so they are listed.
+ascii_whitespace_pattern = r"[ \t\n\r\f\v\x1c-\x1f]+"
+token_regex_bytes = re.compile("|".join(
+  f"(?P<{name}>{ascii_whitespace_pattern if name == 'whitespace' else pattern})" for name, pattern in token_patterns
+).encode())
+
+# Source code as a str, or as ASCII bytes such as a memory-mapped file (see 'map_source_file').
+Source = str | bytes | mmap
+
+skipped_token_types = frozenset(["whitespace", "comment"])
+
+def scan_spans(source_code: Source, first_line: int = 1, offset: int = 0) -> Iterator[tuple[str, int, int, int, int]]:
+  """Yields `(type, start, end, line, column)` for each token of `source_code`,
+  which must start at the beginning of line `first_line`.
+
+  `offset` is the position of `source_code` in the whole input and is only used in error messages.
+  """
+  if isinstance(source_code, str):
+    match_at = token_regex.match
+    newline: str | bytes = "\n"
+  else:
+    match_at = token_regex_bytes.match  # type: ignore[assignment]
+    newline = b"\n"
   source_len = len(source_code)
   position = 0
+  line = first_line
+  line_start = 0   # position where the current line starts
 
   while position < source_len:
-    match_found = False   # tracks if match was found at current position
-    for regex, token_type in tokens.items():
-      match = regex.match(source_code, position)
-      if match:
-        match_found = True
-        match_text = match.group(0)
-        if token_type not in ["whitespace", "comment"]:
-          line = source_code.count("\n", 0, match.start()) + 1
-          last_newline = source_code.rfind("\n", 0, match.start())
-          column = (match.start() - last_newline) if last_newline != -1 else (match.start() + 1)  
-          result.append(Token(
-          type=token_type,
-          text=match_text,
-          loc=Location(__file__, line, column)
-        ))
-        position = match.end()
-        break
-
-    if not match_found:
-      raise Exception(f"Tokenization failed near: '{source_code[position:position + 10]}' at position {position}")
-
-  return result
\ No newline at end of file
+    match = match_at(source_code, position)  # type: ignore[arg-type]
+    if match is None:
+      near = source_code[position:position + 10]
+      if not isinstance(near, str):
+        near = near.decode('ascii', errors='replace')
+      raise Exception(f"Tokenization failed near: '{near}' at position {offset + position}")
+    token_type = match.lastgroup
+    end = match.end()
+    if token_type in skipped_token_types:
+      # only whitespace can contain newlines, comments stop before them
+      newlines = match.group().count(newline)  # type: ignore[arg-type]
+      if newlines:
+        line += newlines
+        line_start = source_code.rfind(newline, position, end) + 1  # type: ignore[arg-type]
+    else:
+      yield token_type, position, end, line, position - line_start + 1  # type: ignore[misc]
+    position = end
+
+def scan(source_code: Source, first_line: int = 1, offset: int = 0) -> Iterator[Token]:
+  """Like `scan_spans`, but yields `Token`s. The text of each token is decoded
+  from bytes only when the token is produced."""
+  is_str = isinstance(source_code, str)
+  for token_type, start, end, line, column in scan_spans(source_code, first_line, offset):
+    text = source_code[start:end]
+    yield Token(
+      type=token_type,  # type: ignore[arg-type]
+      text=text if is_str else text.decode('ascii'),  # type: ignore[arg-type, union-attr]
+      loc=Location(__file__, line, column)
+    )
+
+def tokenize(source_code: str) -> list[Token]:
+  return list(scan(source_code))
+
+def map_source_file(path: str) -> mmap | None:
+  """Maps a source code file into memory for tokenizing it as bytes, without reading it into a str.
+
+  Returns None if the file is empty, which can't be mapped, or isn't ASCII, because the
+  columns of tokens after a multi-byte character would then count bytes instead of characters.
+  Also returns None if the file contains carriage returns, which only the text file path
+  translates into newlines.
+  """
+  with open(path, 'rb') as f:
+    if os.fstat(f.fileno()).st_size == 0:
+      return None
+    source = mmap(f.fileno(), 0, access=ACCESS_READ)
+  if re.search(rb"[\x80-\xff\r]", source) is not None:
+    source.close()
+    return None
+  return source
+
+def iter_tokens(source: Source | TextIO, chunk_size: int = 64 * 1024) -> Iterator[Token]:
+  """Yields tokens lazily from source code or from a text file object read in chunks.
+
+  No token spans a newline, so each chunk is cut after its last newline
+  and the rest is carried over to the next chunk.
+  """
+  if isinstance(source, (str, bytes, mmap)):
+    yield from scan(source)
+    return
+
+  line = 1
+  offset = 0
+  pending = ""
+  while chunk := source.read(chunk_size):
+    text = pending + chunk
+    cut = text.rfind("\n") + 1
+    if cut == 0:
+      pending = text
+      continue
+    yield from scan(text[:cut], line, offset)
+    line += text.count("\n", 0, cut)
+    offset += cut
+    pending = text[cut:]
+  yield from scan(pending, line, offset)
+
+token_type_names: list[str] = [name for name, _ in token_patterns]
+token_type_codes: dict[str, int] = {name: code for code, name in enumerate(token_type_names)}
+
+class TokenBuffer:
+  """Compact token storage with one array per token field instead of one object per token.
+
+  Token text is sliced from the source, and decoded if the source is bytes, only when asked for,
+  and `Token`/`Location` objects are created on demand when indexing or iterating.
+  """
+
+  def __init__(self, source_code: Source, file: str = __file__) -> None:
+    self.source_code = source_code
+    self.file = file
+    self.kinds = array('B')
+    self.starts = array('q')
+    self.ends = array('q')
+    self.lines = array('q')
+    self.columns = array('q')
+
+  def append(self, token_type: str, start: int, end: int, line: int, column: int) -> None:
+    self.kinds.append(token_type_codes[token_type])
+    self.starts.append(start)
+    self.ends.append(end)
+    self.lines.append(line)
+    self.columns.append(column)
+
+  def __len__(self) -> int:
+    return len(self.kinds)
+
+  def type(self, index: int) -> TokenType:
+    return token_type_names[self.kinds[index]]  # type: ignore[return-value]
+
+  def text(self, index: int) -> str:
+    text = self.source_code[self.starts[index]:self.ends[index]]
+    return text if isinstance(text, str) else text.decode('ascii')
+
+  def location(self, index: int) -> Location:
+    return Location(self.file, self.lines[index], self.columns[index])
+
+  def __getitem__(self, index: int) -> Token:
+    if index < 0:
+      index += len(self)
+    if not 0 <= index < len(self):
+      raise IndexError('token index out of range')
+    return Token(type=self.type(index), text=self.text(index), loc=self.location(index))
+
+  def __iter__(self) -> Iterator[Token]:
+    for index in range(len(self)):
+      yield self[index]
+
+  def nbytes(self) -> int:
+    """Size of the token arrays in bytes, not counting the source code."""
+    return sum(column.itemsize * len(column) for column in (self.kinds, self.starts, self.ends, self.lines, self.columns))
+
+def tokenize_to_buffer(source_code: Source) -> TokenBuffer:
+  buffer = TokenBuffer(source_code)
+  append = buffer.append
+  for token_type, start, end, line, column in scan_spans(source_code):
+    append(token_type, start, end, line, column)
+  return buffer
+
+# === Parallel tokenizing ===
+
+# the source being tokenized by 'tokenize_parallel', inherited by the forked worker processes
+_parallel_source = ""
+
+def _scan_chunk(start: int, end: int, first_line: int) -> tuple[array, array, array, array, array]:
+  # arrays are much cheaper to send back to the parent process than tokens
+  kinds, starts, ends, lines, columns = array('B'), array('q'), array('q'), array('q'), array('q')
+  for token_type, token_start, token_end, line, column in scan_spans(_parallel_source[start:end], first_line, start):
+    kinds.append(token_type_codes[token_type])
+    starts.append(start + token_start)
+    ends.append(start + token_end)
+    lines.append(line)
+    columns.append(column)
+  return kinds, starts, ends, lines, columns
+
+def _split_lines(source_code: str, chunk_count: int) -> list[tuple[int, int, int]]:
+  """Splits the source into about `chunk_count` chunks of whole lines, as `(start, end, first_line)`."""
+  chunk_size = max(1, len(source_code) // chunk_count)
+  chunks = []
+  start = 0
+  line = 1
+  while start < len(source_code):
+    end = source_code.find("\n", start + chunk_size) + 1
+    if end == 0:
+      end = len(source_code)
+    chunks.append((start, end, line))
+    line += source_code.count("\n", start, end)
+    start = end
+  return chunks
+
+def tokenize_parallel(source_code: str, workers: int | None = None, chunks_per_worker: int = 4) -> TokenBuffer:
+  """Returns the same tokens as `tokenize`, in a `TokenBuffer`, but scans chunks of whole lines
+  in a pool of forked processes.
+
+  This works because no token spans a newline: comments end at the end of the line,
+  and newlines in whitespace only move the line of the following tokens. The arrays of
+  the chunks are joined as they are, so that tokens are only created when they are read.
+  """
+  # imported here, because the worker processes aren't needed by anything else in this module
+  from concurrent.futures import ProcessPoolExecutor
+  import multiprocessing
+
+  global _parallel_source
+  workers = workers or os.cpu_count() or 1
+  chunks = _split_lines(source_code, workers * chunks_per_worker)
+  _parallel_source = source_code
+  try:
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as pool:
+      results = pool.map(_scan_chunk, *zip(*chunks)) if chunks else iter([])
+      buffer = TokenBuffer(source_code)
+      for kinds, starts, ends, lines, columns in results:
+        buffer.kinds.extend(kinds)
+        buffer.starts.extend(starts)
+        buffer.ends.extend(ends)
+        buffer.lines.extend(lines)
+        buffer.columns.extend(columns)
+      return buffer
+  finally:
+    _parallel_source = ""
@@ -0,0 +1,181 @@
+"""Walking and rewriting ASTs without recursion.
+
+A `Visitor` computes a value for each node from the values of its children, and a
+`Transformer` replaces nodes after their children have been transformed. Both use
+an explicit stack, because operator chains make very deep trees.
+
+Subclasses handle a node class with a method named after it in snake case:
+`visit_binary_op`, `transform_if_expression` and so on. A node class without a
+method of its own is handled by the method for its nearest base class, so
+`visit_expression` and `transform_expression` handle everything else. The method
+for each node class is looked up once per subclass and then cached.
+"""
+from itertools import repeat
+from typing import Any, Callable, ClassVar, Generic, Sequence, TypeVar
+import re
+import compiler.ast as ast
+
+T = TypeVar('T')
+
+# The children of each node class, in evaluation order.
+# The name of a function call isn't a child, because it isn't evaluated like other identifiers.
+_children_getters: dict[type, Callable[[Any], Sequence[ast.Expression]]] = {
+    ast.Literal: lambda expr: (),
+    ast.Identifier: lambda expr: (),
+    ast.BinaryOp: lambda expr: (expr.left, expr.right),
+    ast.UnaryOp: lambda expr: (expr.value,),
+    ast.IfExpression: lambda expr: (
+        (expr.cond, expr.then_clause) if expr.else_clause is None else (expr.cond, expr.then_clause, expr.else_clause)
+    ),
+    ast.WhileExpression: lambda expr: (expr.cond, expr.body),
+    ast.FunctionCall: lambda expr: expr.arguments,
+}
+
+# Copies of a node with new children, in the order of '_children_getters'.
+_rebuilders: dict[type, Callable[[Any, Sequence[ast.Expression]], ast.Expression]] = {
+    ast.BinaryOp: lambda expr, new: ast.BinaryOp(new[0], expr.op, new[1], loc=expr.loc),
+    ast.UnaryOp: lambda expr, new: ast.UnaryOp(expr.op, new[0], loc=expr.loc),
+    ast.IfExpression: lambda expr, new: ast.IfExpression(new[0], new[1], new[2] if len(new) > 2 else None, loc=expr.loc),
+    ast.WhileExpression: lambda expr, new: ast.WhileExpression(new[0], new[1], loc=expr.loc),
+    ast.FunctionCall: lambda expr, new: ast.FunctionCall(expr.name, list(new), loc=expr.loc),
+}
+
+def _lookup(table: dict[type, T], node_class: type) -> T:
+    """Finds the entry for `node_class` or its nearest base class, and caches it for `node_class`."""
+    for base in node_class.__mro__:
+        if base in table:
+            table[node_class] = table[base]
+            return table[base]
+    raise Exception(f'unknown AST node class: {node_class.__name__}')
+
+def children(expr: ast.Expression) -> Sequence[ast.Expression]:
+    getter = _children_getters.get(type(expr)) or _lookup(_children_getters, type(expr))
+    return getter(expr)
+
+def with_children(expr: ast.Expression, new_children: Sequence[ast.Expression]) -> ast.Expression:
+    """Returns `expr` if `new_children` are its children, and otherwise a copy of it with them.
+
+    Nodes are never modified, because subtrees can be shared (see 'compiler.arena'
+    and 'compiler.incremental').
+    """
+    if all(new is old for new, old in zip(new_children, children(expr))):
+        return expr
+    rebuild = _rebuilders.get(type(expr)) or _lookup(_rebuilders, type(expr))
+    return rebuild(expr, new_children)
+
+def _snake_case(name: str) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+# the child count of nodes whose children haven't been pushed yet
+_UNEXPANDED = -1
+
+class _Dispatcher:
+    _prefix: ClassVar[str]
+    _handlers: ClassVar[dict[type, Callable[..., Any]]]
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._handlers = {}
+
+    @classmethod
+    def _find_handler(cls, node_class: type) -> Callable[..., Any]:
+        for base in node_class.__mro__:
+            handler = getattr(cls, f'{cls._prefix}_{_snake_case(base.__name__)}', None)
+            if handler is not None:
+                cls._handlers[node_class] = handler
+                return handler  # type: ignore[no-any-return]
+        raise Exception(f'{cls.__name__} has no handler for {node_class.__name__}')
+
+class Visitor(_Dispatcher, Generic[T]):
+    """Computes a value for each node, bottom up.
+
+    The handler of a node gets the node and the values of its children as arguments,
+    like `visit_binary_op(self, node, left, right)` or `visit_function_call(self, node, *arguments)`.
+    Before that, `enter` is called with the node in evaluation order, and can give the node's value
+    to skip its children and its handler.
+    """
+    _prefix = 'visit'
+
+    def visit(self, expr: ast.Expression) -> T:
+        handlers = type(self)._handlers
+        find_handler = type(self)._find_handler
+        # most visitors don't override 'enter', and then it isn't called at all
+        enter = self.enter if type(self).enter is not Visitor.enter else None
+        values: list[T] = []
+        # The nodes still to be expanded, and after them the nodes whose children are being visited,
+        # with the number of their children. Parallel lists allocate less than a list of pairs.
+        nodes: list[ast.Expression] = [expr]
+        counts: list[int] = [_UNEXPANDED]
+        while nodes:
+            node = nodes.pop()
+            count = counts.pop()
+            if count == _UNEXPANDED:
+                if enter is not None:
+                    value = enter(node)
+                    if value is not None:
+                        values.append(value)
+                        continue
+                node_children = children(node)
+                if node_children:
+                    nodes.append(node)
+                    counts.append(len(node_children))
+                    nodes.extend(reversed(node_children))
+                    counts.extend(repeat(_UNEXPANDED, len(node_children)))
+                    continue
+                handler = handlers.get(type(node)) or find_handler(type(node))
+                values.append(handler(self, node))
+            else:
+                handler = handlers.get(type(node)) or find_handler(type(node))
+                first = len(values) - count
+                value = handler(self, node, *values[first:])
+                del values[first:]
+                values.append(value)
+        return values[0]
+
+    def enter(self, node: ast.Expression) -> T | None:
+        """Called before the children of `node` are visited. Returns None to visit them,
+        or the value of the node to skip them."""
+        return None
+
+    def visit_expression(self, node: ast.Expression, *children: T) -> T:
+        """The handler for nodes without one of their own. Returns None."""
+        return None  # type: ignore[return-value]
+
+class Transformer(_Dispatcher):
+    """Replaces each node with the value of its handler, bottom up.
+
+    The handler of a node gets the node with its children already transformed,
+    like `transform_binary_op(self, node)`. A node is only copied if one of its
+    children changed, so handlers can tell that nothing below a node changed
+    if it is the node they started with.
+    """
+    _prefix = 'transform'
+
+    def transform(self, expr: ast.Expression) -> ast.Expression:
+        handlers = type(self)._handlers
+        find_handler = type(self)._find_handler
+        results: list[ast.Expression] = []
+        nodes: list[ast.Expression] = [expr]
+        counts: list[int] = [_UNEXPANDED]
+        while nodes:
+            node = nodes.pop()
+            count = counts.pop()
+            if count == _UNEXPANDED:
+                node_children = children(node)
+                if node_children:
+                    nodes.append(node)
+                    counts.append(len(node_children))
+                    nodes.extend(reversed(node_children))
+                    counts.extend(repeat(_UNEXPANDED, len(node_children)))
+                    continue
+            else:
+                first = len(results) - count
+                node = with_children(node, results[first:])
+                del results[first:]
+            handler = handlers.get(type(node)) or find_handler(type(node))
+            results.append(handler(self, node))
+        return results[0]
+
+    def transform_expression(self, node: ast.Expression) -> ast.Expression:
+        """The handler for nodes without one of their own. Returns the node unchanged."""
+        return node
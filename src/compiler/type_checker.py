@@ -0,0 +1,244 @@
+"""Type checking of ASTs, with the types of the nodes kept in a side table.
+
+Types are stored in `TypeChecker` by node identity instead of on the nodes, because
+nodes can be shared (see 'compiler.arena' and 'compiler.incremental'). When a subtree
+that was checked before is checked again, as after an incremental parse reuses it,
+its earlier result is reused if the variables it depends on still have the same types.
+
+A variable gets its type from its first assignment, or from the variables given to
+`TypeChecker.check`, and can't be assigned a value of another type after that.
+"""
+from typing import Any
+from compiler.optimizer import boolean_names
+from compiler.traversal import Visitor, children
+import compiler.ast as ast
+
+class Type:
+    """A type of values. `Int`, `Bool` and `Unit` are its only instances, so types are compared by identity."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return self.name
+
+Int = Type('Int')
+Bool = Type('Bool')
+Unit = Type('Unit')
+
+# the types of the parameters and the result of a function
+FunctionType = tuple[list[Type], Type]
+
+builtin_functions: dict[str, FunctionType] = {
+    'print_int': ([Int], Unit),
+    'print_bool': ([Bool], Unit),
+    'read_int': ([], Int),
+}
+
+arithmetic_operators = {'+', '-', '*', '/', '%'}
+comparison_operators = {'<', '<=', '>', '>='}
+equality_operators = {'==', '!='}
+logical_operators = {'and', 'or'}
+
+# The variables that a subtree reads or assigns before assigning them itself, with the types
+# they had then (None if they were unassigned), and the types of the variables it assigns.
+Dependencies = dict[str, Type | None]
+Assignments = dict[str, Type]
+
+# The result of checking a subtree: the node, its type, the number of nodes in the subtree,
+# and its dependencies and assignments, which are None if there are none.
+Result = tuple[ast.Expression, Type, int, Dependencies | None, Assignments | None]
+
+def literal_type(value: int | bool | None) -> Type:
+    if type(value) is bool:
+        return Bool
+    return Unit if value is None else Int
+
+class TypeChecker(Visitor[Result]):
+    """Checks ASTs and keeps the types of their nodes.
+
+    The results of the subtrees with children are kept between calls to `check`,
+    so that a subtree that is checked again in the same variable types is only
+    looked up. The results of nodes that aren't in the last checked AST are
+    dropped when they outnumber its nodes.
+    """
+
+    def __init__(self, functions: dict[str, FunctionType] | None = None) -> None:
+        self.functions = builtin_functions if functions is None else {**builtin_functions, **functions}
+        # the types of the variables, after the last call to 'check'
+        self.variables: dict[str, Type] = {}
+        # the number of subtrees whose earlier result the last call to 'check' reused
+        self.reused_subtrees = 0
+        # Results by node identity. A result holds its node, so that no other node gets the same id.
+        self._results: dict[int, Result] = {}
+        # whether the next identifier is the target of an assignment instead of a variable that is read
+        self._assignment_target = False
+
+    def check(self, expr: ast.Expression, variables: dict[str, Type] | None = None) -> Type:
+        """Returns the type of `expr`, or raises an exception at the first type error.
+        `variables` gives the types of the variables that are assigned before the program runs."""
+        self.variables = dict(variables or {})
+        self.reused_subtrees = 0
+        self._assignment_target = False
+        _, expr_type, size, _, _ = self.visit(expr)
+        if len(self._results) > size:
+            self._keep_results_of(expr)
+        return expr_type
+
+    def type_of(self, expr: ast.Expression) -> Type:
+        """The type of a node of the last checked AST."""
+        if isinstance(expr, ast.Literal):
+            return literal_type(expr.value)
+        if isinstance(expr, ast.Identifier):
+            if expr.name in boolean_names:
+                return Bool
+            if expr.name not in self.variables:
+                raise Exception(f'{expr.loc}: unknown variable "{expr.name}"')
+            return self.variables[expr.name]
+        result = self._results.get(id(expr))
+        if result is None or result[0] is not expr:
+            raise Exception(f'{expr.loc}: expression has not been type checked')
+        return result[1]
+
+    def _keep_results_of(self, expr: ast.Expression) -> None:
+        results: dict[int, Result] = {}
+        stack = [expr]
+        while stack:
+            node = stack.pop()
+            result = self._results.get(id(node))
+            # only nodes with children have results, and all of those in 'expr' do
+            if result is not None:
+                results[id(node)] = result
+                stack.extend(children(node))
+        self._results = results
+
+    def _result(
+        self,
+        node: ast.Expression,
+        node_type: Type,
+        child_results: tuple[Result, ...],
+        dependencies: Dependencies | None = None,
+        assignments: Assignments | None = None,
+    ) -> Result:
+        """Stores the result of `node`, combining the dependencies and assignments of its children,
+        in evaluation order, with its own. The dictionaries of children are shared, never modified."""
+        size = 1
+        all_dependencies: Dependencies | None = None
+        all_assignments: Assignments | None = None
+        for child in child_results + ((node, node_type, 0, dependencies, assignments),):
+            size += child[2]
+            child_dependencies = child[3]
+            if child_dependencies:
+                if all_dependencies is None and all_assignments is None:
+                    all_dependencies = child_dependencies
+                else:
+                    # variables that were already read or assigned don't depend on earlier types
+                    new = {
+                        name: variable_type for name, variable_type in child_dependencies.items()
+                        if (all_dependencies is None or name not in all_dependencies)
+                        and (all_assignments is None or name not in all_assignments)
+                    }
+                    if new:
+                        all_dependencies = {**all_dependencies, **new} if all_dependencies else new
+            child_assignments = child[4]
+            if child_assignments:
+                all_assignments = {**all_assignments, **child_assignments} if all_assignments else child_assignments
+        result = (node, node_type, size, all_dependencies, all_assignments)
+        self._results[id(node)] = result
+        return result
+
+    def enter(self, node: ast.Expression) -> Result | None:
+        result = self._results.get(id(node))
+        if result is not None:
+            dependencies = result[3]
+            variables = self.variables
+            if dependencies is None or all(variables.get(name) is t for name, t in dependencies.items()):
+                if result[4] is not None:
+                    variables.update(result[4])
+                self.reused_subtrees += 1
+                return result
+        if type(node) is ast.BinaryOp and node.op == '=':
+            if not isinstance(node.left, ast.Identifier) or node.left.name in boolean_names:
+                raise Exception(f'{node.loc}: can only assign to a variable')
+            self._assignment_target = True
+        return None
+
+    def visit_literal(self, node: ast.Literal) -> Result:
+        return (node, literal_type(node.value), 1, None, None)
+
+    def visit_identifier(self, node: ast.Identifier) -> Result:
+        if self._assignment_target:
+            # the assignment checks and sets the type of the variable
+            self._assignment_target = False
+            return (node, Unit, 1, None, None)
+        if node.name in boolean_names:
+            return (node, Bool, 1, None, None)
+        variable_type = self.variables.get(node.name)
+        if variable_type is None:
+            raise Exception(f'{node.loc}: unknown variable "{node.name}"')
+        return (node, variable_type, 1, {node.name: variable_type}, None)
+
+    def visit_binary_op(self, node: ast.BinaryOp, left: Result, right: Result) -> Result:
+        op = node.op
+        left_type, right_type = left[1], right[1]
+        if op == '=':
+            name = node.left.name  # type: ignore[attr-defined]
+            variable_type = self.variables.get(name)
+            if variable_type is None:
+                self.variables[name] = right_type
+            elif variable_type is not right_type:
+                raise Exception(f'{node.loc}: cannot assign {right_type} to variable "{name}" of type {variable_type}')
+            return self._result(node, right_type, (left, right), {name: variable_type}, {name: right_type})
+
+        if op in arithmetic_operators or op in comparison_operators:
+            if left_type is not Int or right_type is not Int:
+                raise Exception(f'{node.loc}: operator "{op}" expects Int operands, got {left_type} and {right_type}')
+            result_type = Int if op in arithmetic_operators else Bool
+        elif op in equality_operators:
+            if left_type is not right_type:
+                raise Exception(f'{node.loc}: operator "{op}" expects operands of the same type, got {left_type} and {right_type}')
+            result_type = Bool
+        elif op in logical_operators:
+            if left_type is not Bool or right_type is not Bool:
+                raise Exception(f'{node.loc}: operator "{op}" expects Bool operands, got {left_type} and {right_type}')
+            result_type = Bool
+        else:
+            raise Exception(f'{node.loc}: unknown operator "{op}"')
+        return self._result(node, result_type, (left, right))
+
+    def visit_unary_op(self, node: ast.UnaryOp, value: Result) -> Result:
+        expected = Int if node.op == '-' else Bool if node.op == 'not' else None
+        if expected is None:
+            raise Exception(f'{node.loc}: unknown operator "{node.op}"')
+        if value[1] is not expected:
+            raise Exception(f'{node.loc}: operator "{node.op}" expects an {expected} operand, got {value[1]}')
+        return self._result(node, expected, (value,))
+
+    def visit_if_expression(self, node: ast.IfExpression, cond: Result, then_clause: Result, *else_clause: Result) -> Result:
+        if cond[1] is not Bool:
+            raise Exception(f'{node.loc}: the condition of "if" must be a Bool, got {cond[1]}')
+        if not else_clause:
+            return self._result(node, Unit, (cond, then_clause))
+        if then_clause[1] is not else_clause[0][1]:
+            raise Exception(f'{node.loc}: "then" and "else" have different types: {then_clause[1]} and {else_clause[0][1]}')
+        return self._result(node, then_clause[1], (cond, then_clause, else_clause[0]))
+
+    def visit_while_expression(self, node: ast.WhileExpression, cond: Result, body: Result) -> Result:
+        if cond[1] is not Bool:
+            raise Exception(f'{node.loc}: the condition of "while" must be a Bool, got {cond[1]}')
+        return self._result(node, Unit, (cond, body))
+
+    def visit_function_call(self, node: ast.FunctionCall, *arguments: Result) -> Result:
+        name = node.name.name
+        if name not in self.functions:
+            raise Exception(f'{node.loc}: unknown function "{name}"')
+        parameter_types, result_type = self.functions[name]
+        if len(arguments) != len(parameter_types):
+            raise Exception(f'{node.loc}: function "{name}" expects {len(parameter_types)} arguments, got {len(arguments)}')
+        for i, (argument, parameter_type) in enumerate(zip(arguments, parameter_types)):
+            if argument[1] is not parameter_type:
+                raise Exception(f'{node.loc}: argument {i + 1} of "{name}" must be {parameter_type}, got {argument[1]}')
+        return self._result(node, result_type, arguments)
+
+    def visit_expression(self, node: ast.Expression, *children: Any) -> Result:
+        raise Exception(f'{node.loc}: cannot type check {node}')
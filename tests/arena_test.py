@@ -0,0 +1,25 @@
+from compiler import ast
+from compiler.arena import Arena
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+
+def test_arena_keeps_structural_equality() -> None:
+    source = "f(x + 1, x * 1, if x then 1 else true)"
+    assert parse(tokenize(source), Arena()) == parse(tokenize(source))
+
+
+def test_arena_shares_leaf_nodes() -> None:
+    arena = Arena()
+    tree = parse(tokenize("x + 1 + x + 1"), arena)
+    assert isinstance(tree, ast.BinaryOp) and isinstance(tree.left, ast.BinaryOp)
+    assert tree.right is tree.left.left.right  # type: ignore[attr-defined]
+    assert tree.left.right is tree.left.left.left  # type: ignore[attr-defined]
+    assert arena.reused_nodes == 2
+
+
+def test_arena_keeps_booleans_and_integers_apart() -> None:
+    arena = Arena()
+    assert arena.literal(1) is arena.literal(1)
+    assert arena.literal(True) is not arena.literal(1)
+    assert arena.literal(True).value is True
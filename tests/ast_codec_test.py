@@ -0,0 +1,58 @@
+import pytest
+from compiler import ast, pratt_parser
+from compiler.arena import Arena
+from compiler.ast_codec import decode, encode, parse_cached
+from compiler.cache import CompilationCache
+from compiler.parser import parse
+from compiler.tokenizer import Location, tokenize
+from tests.helpers import SOURCES, locations
+
+
+def test_round_trip() -> None:
+  for source in SOURCES + ["f(-9223372036854775808, 300, 0 - 1)"]:
+    tree = parse(tokenize(source.replace(" ", "\n ")))
+    decoded = decode(encode(tree))
+    assert decoded == tree
+    assert locations(decoded) == locations(tree)
+
+
+def test_round_trip_without_locations() -> None:
+  tree = ast.IfExpression(ast.Literal(True), ast.Literal(None), ast.UnaryOp("not", ast.Literal(False)))
+  decoded = decode(encode(tree))
+  assert decoded == tree and decoded.loc is None
+
+
+def test_locations_in_several_files() -> None:
+  tree = ast.BinaryOp(ast.Identifier("a", loc=Location("a.src", 3, 1)), "+", ast.Identifier("b", loc=Location("b.src", 1, 7)))
+  decoded = decode(encode(tree))
+  assert isinstance(decoded, ast.BinaryOp) and decoded.loc is None
+  assert decoded.left.loc == Location("a.src", 3, 1)
+  assert decoded.right.loc == Location("b.src", 1, 7)
+
+
+def test_strings_are_stored_once() -> None:
+  tree = parse(tokenize("long_variable_name + long_variable_name * long_variable_name"))
+  assert encode(tree).count(b"long_variable_name") == 1
+
+
+def test_arena_and_deep_trees() -> None:
+  tree = parse(tokenize("f(x, x, 1, 1)"), Arena())
+  assert decode(encode(tree)) == tree
+  deep = pratt_parser.parse(tokenize("(" * 50_000 + "-1" + ")" * 50_000 + " + 1" * 50_000))
+  assert len(locations(decode(encode(deep)))) == len(locations(deep))
+
+
+def test_invalid_data() -> None:
+  data = encode(parse(tokenize("f(1, 2)")))
+  with pytest.raises(Exception, match="not an encoded AST"):
+    decode(b"pickle")
+  with pytest.raises(Exception, match="truncated"):
+    decode(data[:-3])
+
+
+def test_parse_cached() -> None:
+  cache = CompilationCache()
+  first = parse_cached("a + f(b)", cache)
+  second = parse_cached("a + f(b)", cache)
+  assert first == second and first is not second
+  assert cache.stats.as_dict()["memory_hits"] == 1
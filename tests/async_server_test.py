@@ -0,0 +1,108 @@
+import json
+import multiprocessing
+import socket
+import time
+from typing import Any
+from compiler import binary_protocol
+from compiler.async_server import run_async_server
+from compiler.metrics import ServerMetrics
+from tests.helpers import connect, echo_handler, free_port
+
+
+def exchange(port: int, requests: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Sends `requests` on one connection, and returns the responses until the server closes it."""
+    with connect(port) as sock:
+        sock.sendall(b"".join(json.dumps(r).encode() + b"\n" for r in requests))
+        sock.shutdown(socket.SHUT_WR)
+        data = b""
+        while chunk := sock.recv(65536):
+            data += chunk
+    return [json.loads(line) for line in data.splitlines()]
+
+
+def test_pipelined_requests_are_answered_in_order() -> None:
+    port = free_port()
+    server = multiprocessing.get_context("fork").Process(
+        target=run_async_server, args=("127.0.0.1", port, echo_handler, 2)
+    )
+    server.start()
+    try:
+        with connect(port) as sock:
+            requests = [
+                {"command": "sleep", "seconds": 0.3},
+                {"command": "ping"},
+                {"command": "compile", "code": "1 + 2\n3"},
+            ]
+            # the last request is terminated by closing the connection instead of a newline
+            sock.sendall(("\n".join(json.dumps(r) for r in requests)).encode())
+            sock.shutdown(socket.SHUT_WR)
+            data = b""
+            while chunk := sock.recv(65536):
+                data += chunk
+        assert [json.loads(line) for line in data.splitlines()] == [{"echo": r} for r in requests]
+    finally:
+        server.terminate()
+        server.join()
+
+
+def test_workers_that_die_are_replaced() -> None:
+    port = free_port()
+    server = multiprocessing.get_context("fork").Process(
+        target=run_async_server, args=("127.0.0.1", port, echo_handler, 2)
+    )
+    server.start()
+    try:
+        responses = exchange(port, [{"command": "crash"}])
+        assert len(responses) == 1 and "BrokenProcessPool" in responses[0]["error"]
+        # the connections after it are served by a new pool, and are closed when they end
+        for _ in range(2):
+            assert exchange(port, [{"command": "ping"}]) == [{"echo": {"command": "ping"}}]
+    finally:
+        server.terminate()
+        server.join()
+
+
+def test_metrics() -> None:
+    metrics = ServerMetrics()
+    port = free_port()
+    server = multiprocessing.get_context("fork").Process(
+        target=run_async_server, args=("127.0.0.1", port, echo_handler, 2), kwargs={"metrics": metrics}
+    )
+    server.start()
+    try:
+        with connect(port) as sock:
+            sock.sendall(b"".join(json.dumps(r).encode() + b"\n" for r in [{"command": "sleep", "seconds": 0.5}, {"command": "ping"}]))
+            time.sleep(0.25)
+            text = metrics.render()
+            assert "compiler_workers 2\n" in text
+            assert "compiler_open_connections 1\n" in text
+            assert "compiler_pipelined_requests 2\n" in text
+            sock.shutdown(socket.SHUT_WR)
+            while sock.recv(65536):
+                pass
+        time.sleep(0.1)
+        text = metrics.render()
+        assert "compiler_open_connections 0\n" in text
+        assert "compiler_pipelined_requests 0\n" in text
+    finally:
+        server.terminate()
+        server.join()
+
+
+def test_binary_requests_that_are_too_large_get_an_error() -> None:
+    port = free_port()
+    server = multiprocessing.get_context("fork").Process(
+        target=run_async_server, args=("127.0.0.1", port, echo_handler, 1)
+    )
+    server.start()
+    try:
+        with connect(port) as sock, sock.makefile("rb") as stream:
+            sock.sendall(binary_protocol.MAGIC + binary_protocol.request_header.pack(0, 2**32 - 1))
+            header = binary_protocol.read_exactly(stream, binary_protocol.response_header.size)
+            _, status, _, metadata_length, _ = binary_protocol.response_header.unpack(header)
+            assert status == binary_protocol.STATUS_ERROR
+            assert "larger than the limit" in json.loads(binary_protocol.read_exactly(stream, metadata_length))["error"]
+            assert stream.read() == b""
+    finally:
+        server.terminate()
+        server.join()
@@ -0,0 +1,45 @@
+import io
+import socket
+import threading
+from typing import Any
+import pytest
+from compiler import binary_protocol
+from tests.helpers import serve_one
+
+
+def round_trip(metadata: dict[str, Any], payload: bytes, compress: bool) -> tuple[Any, dict[str, Any], bytes]:
+    client, server = socket.socketpair()
+    received: list[Any] = []
+    thread = threading.Thread(target=serve_one, args=(server, metadata, payload, received))
+    thread.start()
+    with client, server, client.makefile('rb') as stream:
+        response = binary_protocol.send_request(client, stream, {"command": "compile", "code": "1 + 2"}, compress)
+        thread.join()
+    return received[0], *response
+
+
+def test_round_trip() -> None:
+    executable = bytes(range(256)) * 1000
+    request, metadata, payload = round_trip({}, executable, compress=False)
+    assert request == (0, b'{"command": "compile", "code": "1 + 2"}')
+    assert metadata == {}
+    assert payload == executable
+
+
+def test_compressed_payload() -> None:
+    executable = b"\x90" * 100_000
+    request, metadata, payload = round_trip({}, executable, compress=True)
+    assert request[0] == binary_protocol.FLAG_COMPRESS
+    assert payload == executable
+
+
+def test_error_response() -> None:
+    _, metadata, payload = round_trip({"error": "oops"}, b"", compress=True)
+    assert metadata == {"error": "oops"}
+    assert payload == b""
+
+
+def test_request_size_is_limited() -> None:
+    stream = io.BytesIO(binary_protocol.request_header.pack(0, binary_protocol.MAX_REQUEST_SIZE + 1))
+    with pytest.raises(Exception, match="larger than the limit"):
+        binary_protocol.read_request(stream)
@@ -0,0 +1,45 @@
+from pathlib import Path
+from compiler.cache import CompilationCache, cache_key
+
+
+def test_cache_hit_skips_compilation() -> None:
+    cache = CompilationCache()
+    calls: list[str] = []
+
+    def compile() -> bytes:
+        calls.append("compiled")
+        return b"executable"
+
+    assert cache.compile("1 + 2", compile) == b"executable"
+    assert cache.compile("1 + 2", compile) == b"executable"
+    assert calls == ["compiled"]
+    assert cache.stats.as_dict() == {"memory_hits": 1, "disk_hits": 0, "misses": 1, "evictions": 0}
+
+
+def test_cache_key_depends_on_source() -> None:
+    assert cache_key("1 + 2") == cache_key("1 + 2")
+    assert cache_key("1 + 2") != cache_key("1 + 3")
+
+
+def test_memory_tier_evicts_least_recently_used() -> None:
+    cache = CompilationCache(memory_limit=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234"
+    assert cache.get("c") == b"1234"
+    assert cache.memory_size == 8
+    assert cache.stats.as_dict()["evictions"] == 1
+
+
+def test_disk_tier_is_shared(tmp_path: Path) -> None:
+    first = CompilationCache(directory=str(tmp_path))
+    second = CompilationCache(directory=str(tmp_path))
+    key = cache_key("x")
+    first.put(key, b"executable")
+    assert (tmp_path / key[:2] / key[2:]).read_bytes() == b"executable"
+    assert second.get(key) == b"executable"
+    assert second.get(key) == b"executable"
+    assert second.stats.as_dict() == {"memory_hits": 1, "disk_hits": 1, "misses": 0, "evictions": 0}
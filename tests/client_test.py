@@ -0,0 +1,136 @@
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+import pytest
+from compiler import __main__ as compiler_main
+from compiler import binary_protocol, client
+from compiler.async_server import run_async_server
+from tests.helpers import connect, echo_handler, free_port, serve_one
+
+
+def serve_once(metadata: dict[str, Any], payload: bytes, received: list[Any]) -> tuple[str, threading.Thread]:
+    listener = socket.create_server(("127.0.0.1", 0))
+
+    def accept() -> None:
+        with listener:
+            sock, _ = listener.accept()
+            with sock:
+                serve_one(sock, metadata, payload, received)
+
+    thread = threading.Thread(target=accept)
+    thread.start()
+    return f"127.0.0.1:{listener.getsockname()[1]}", thread
+
+
+def unused_address() -> str:
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        return f"127.0.0.1:{listener.getsockname()[1]}"
+
+
+def test_parse_server_address() -> None:
+    assert client.parse_server_address("localhost:3000") == ("localhost", 3000)
+    assert client.parse_server_address(":3000") == ("127.0.0.1", 3000)
+    with pytest.raises(Exception, match="host:port"):
+        client.parse_server_address("localhost")
+
+
+def test_compile_remote() -> None:
+    received: list[Any] = []
+    address, thread = serve_once({}, b"executable", received)
+    assert client.compile_remote(address, "1 + 2", 2) == ({}, b"executable")
+    thread.join()
+    assert received == [(0, b'{"command": "compile", "code": "1 + 2", "optimization_level": 2}')]
+
+
+def test_compile_remote_without_server() -> None:
+    assert client.compile_remote(unused_address(), "1 + 2") is None
+
+
+@contextmanager
+def async_server(**kwargs: Any) -> Iterator[str]:
+    port = free_port()
+    server = multiprocessing.get_context("fork").Process(target=run_async_server, args=("127.0.0.1", port, echo_handler, 1), kwargs=kwargs)
+    server.start()
+    try:
+        connect(port).close()
+        yield f"127.0.0.1:{port}"
+    finally:
+        server.terminate()
+        server.join()
+
+
+def test_compile_remote_with_async_server() -> None:
+    with async_server(handle_binary_request=lambda body: ({"size": len(body)}, b"executable")) as address:
+        assert client.compile_remote(address, "1 + 2") == ({"size": 39}, b"executable")
+        # a connection can carry several requests
+        with socket.create_connection(client.parse_server_address(address)) as sock, sock.makefile("rb") as stream:
+            for _ in range(2):
+                assert binary_protocol.send_request(sock, stream, {"command": "ping"}) == ({"size": 19}, b"executable")
+    # without a binary handler, the JSON handler answers
+    with async_server() as address:
+        assert client.compile_remote(address, "1 + 2") == ({"echo": {"command": "compile", "code": "1 + 2"}}, b"")
+
+
+def test_compile_remote_gives_up_on_a_silent_server(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(client, "RESPONSE_TIMEOUT", 0.2)
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        started = time.monotonic()
+        assert client.compile_remote(f"127.0.0.1:{listener.getsockname()[1]}", "1 + 2") is None
+        assert time.monotonic() - started < 5
+
+
+def test_response_timeout(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv(client.TIMEOUT_ENVIRONMENT_VARIABLE, raising=False)
+    assert client.response_timeout() == client.RESPONSE_TIMEOUT
+    monkeypatch.setenv(client.TIMEOUT_ENVIRONMENT_VARIABLE, "600")
+    assert client.response_timeout() == 600
+    # a long compilation can be waited for as long as it takes
+    monkeypatch.setenv(client.TIMEOUT_ENVIRONMENT_VARIABLE, "0")
+    assert client.response_timeout() is None
+    monkeypatch.setenv(client.TIMEOUT_ENVIRONMENT_VARIABLE, "soon")
+    with pytest.raises(Exception, match="expected seconds"):
+        client.response_timeout()
+
+
+def test_compile_remote_waits_for_slow_compilations(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(client, "RESPONSE_TIMEOUT", 0.2)
+    monkeypatch.setenv(client.TIMEOUT_ENVIRONMENT_VARIABLE, "0")
+
+    def slow_compile(body: bytes) -> tuple[dict[str, Any], bytes]:
+        time.sleep(0.5)
+        return {}, b"executable"
+
+    with async_server(handle_binary_request=slow_compile) as address:
+        assert client.compile_remote(address, "1 + 2") == ({}, b"executable")
+
+
+def test_main_writes_remote_executable(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "program").write_text("1 + 2")
+    address, thread = serve_once({}, b"executable", [])
+    monkeypatch.setattr(sys, "argv", ["main", "compile", str(tmp_path / "program"), f"--output={tmp_path / 'out'}", f"--server={address}"])
+    assert client.main() == 0
+    thread.join()
+    assert (tmp_path / "out").read_bytes() == b"executable"
+
+
+def test_main_falls_back_to_local_compiler(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "program").write_text("1 + 2")
+    argv = ["main", "compile", str(tmp_path / "program"), f"--output={tmp_path / 'out'}"]
+    monkeypatch.setattr(sys, "argv", argv + [f"--server={unused_address()}"])
+    monkeypatch.setattr(compiler_main, "main", lambda: 0 if sys.argv == argv else 1)
+    assert client.main() == 0
+
+
+def test_main_prints_remote_error_with_file_name(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]) -> None:
+    (tmp_path / "program").write_text("1 +")
+    address, thread = serve_once({"error": "Exception: unexpected end of input\n"}, b"", [])
+    monkeypatch.setattr(sys, "argv", ["main", "compile", str(tmp_path / "program"), f"--output={tmp_path / 'out'}", f"--server={address}"])
+    assert client.main() == 1
+    thread.join()
+    assert capsys.readouterr().err == f"{tmp_path / 'program'}: Exception: unexpected end of input\n"
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,85 @@
+"""Helpers shared by several test modules."""
+import json
+import os
+import socket
+import time
+from dataclasses import fields
+from typing import Any
+from compiler import ast, binary_protocol
+
+# programs that both parsers accept, or reject with the same error
+SOURCES = [
+    "1",
+    "1 + 2 * 3 - 4 / 5 % 6",
+    "a == b + c < d and e or f != g",
+    "1 * (2 + 3) / 4",
+    "-x - y",
+    "not not x and -(1 + 2)",
+    "- - 1 * 2",
+    "if a then b",
+    "if a then b + c else x * y",
+    "1 + if true then 2 else 3 * 4",
+    "if true then 2 else if false then 3 else 4",
+    "if 2 + 2 then if 1 + 3 then 4 else 5 else 6",
+    "- if a then b else c",
+    "if a then b = c",
+    "f()",
+    "f(a, b)",
+    "f(x + y, g(z), h())",
+    "f(a b)",
+    "a = b = c + 1",
+    "while true 1 + 1",
+    "while (x < 10) x = x + 1",
+    "while f(x) if x then y else z = 2",
+]
+
+
+def locations(expr: ast.Expression) -> list[tuple[str, int, int]]:
+    """The type and location of every node of `expr`."""
+    result = []
+    stack: list[object] = [expr]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, ast.Expression):
+            assert value.loc is not None
+            result.append((type(value).__name__, value.loc.line, value.loc.column))
+            stack.extend(getattr(value, field.name) for field in fields(value) if field.name != "loc")
+        elif isinstance(value, list):
+            stack.extend(value)
+    return result
+
+
+def echo_handler(input_str: str) -> dict[str, Any]:
+    """A JSON request handler that answers with the request, after sleeping or crashing if asked to."""
+    input = json.loads(input_str)
+    if input["command"] == "sleep":
+        time.sleep(input["seconds"])
+    if input["command"] == "crash":
+        os._exit(1)
+    return {"echo": input}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port: int = s.getsockname()[1]
+        return port
+
+
+def connect(port: int) -> socket.socket:
+    """Connects to a server that is starting."""
+    for _ in range(100):
+        try:
+            return socket.create_connection(("127.0.0.1", port))
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+    raise AssertionError("the server didn't start")
+
+
+def serve_one(sock: socket.socket, metadata: dict[str, Any], payload: bytes, received: list[Any]) -> None:
+    """Answers one binary protocol request on `sock`, appending its flags and body to `received`."""
+    with sock.makefile('rb') as stream:
+        assert stream.read(len(binary_protocol.MAGIC)) == binary_protocol.MAGIC
+        flags, body = binary_protocol.read_request(stream)
+        received.append((flags, bytes(body)))
+        binary_protocol.write_response(sock, metadata, payload, flags)
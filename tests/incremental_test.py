@@ -0,0 +1,86 @@
+import random
+import pytest
+from compiler import ast
+from compiler.incremental import Edit, IncrementalParser, retokenize
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+SOURCE = "f(\n  a + 1,\n  g(b, (c * 2)),\n  h()\n) + x"
+
+
+def test_retokenize_matches_full_tokenize() -> None:
+  tokens = tokenize(SOURCE)
+  for edit in [
+    Edit(SOURCE.index("1"), 1, "100"),
+    Edit(SOURCE.index("g"), 0, "\n\n"),
+    Edit(SOURCE.index("a"), SOURCE.index("h") - SOURCE.index("a"), "y"),
+    Edit(len(SOURCE), 0, " - z"),
+    Edit(0, 0, "// comment\n"),
+  ]:
+    result = retokenize(SOURCE, tokens, edit)
+    assert result.source_code == edit.apply(SOURCE)
+    assert [(t.type, t.text, t.loc.line, t.loc.column) for t in result.tokens] == [
+      (t.type, t.text, t.loc.line, t.loc.column) for t in tokenize(result.source_code)
+    ]
+
+
+def test_retokenize_reuses_tokens_of_unchanged_lines() -> None:
+  tokens = tokenize(SOURCE)
+  result = retokenize(SOURCE, tokens, Edit(SOURCE.index("1"), 1, "2"))
+  assert result.tokens[0] is tokens[0]
+  assert result.tokens[-1] is tokens[-1]
+  assert (result.start, result.old_end, result.end) == (2, 6, 6)
+
+
+def test_incremental_parser_reuses_unchanged_subtrees() -> None:
+  parser = IncrementalParser(SOURCE)
+  old_tree = parser.tree
+  assert isinstance(old_tree, ast.BinaryOp) and isinstance(old_tree.left, ast.FunctionCall)
+
+  tree = parser.edit(SOURCE.index("1"), 1, "2")
+  assert tree == parse(tokenize(parser.source_code))
+  assert isinstance(tree, ast.BinaryOp) and isinstance(tree.left, ast.FunctionCall)
+  assert tree.left.arguments[1] is old_tree.left.arguments[1]
+  assert tree.left.arguments[2] is old_tree.left.arguments[2]
+
+
+def test_incremental_parser_keeps_last_tree_on_errors() -> None:
+  parser = IncrementalParser("f(1, 2)")
+  with pytest.raises(Exception, match="expected"):
+    parser.edit(len("f(1, 2"), 1, "")
+  assert parser.tree == parse(tokenize("f(1, 2)"))
+
+  with pytest.raises(Exception, match="Tokenization failed"):
+    parser.edit(0, 0, "$")
+  with pytest.raises(Exception, match="expected"):
+    parser.edit(0, 1, "")
+  assert parser.edit(len("f(1, 2"), 0, ")") == parse(tokenize("f(1, 2)"))
+
+
+def test_incremental_parser_random_edits() -> None:
+  rng = random.Random(0)
+  fragments = ["(", ")", ",", "\n", " ", "1", "x", "f(", "+", "*", "if", "then", "else"]
+  source = SOURCE
+  parser = IncrementalParser(source)
+  for _ in range(300):
+    offset = rng.randint(0, len(source))
+    removed = rng.randint(0, min(3, len(source) - offset))
+    inserted = "".join(rng.choices(fragments, k=rng.randint(0, 2)))
+    source = source[:offset] + inserted + source[offset + removed:]
+    try:
+      expected: ast.Expression | str = parse(tokenize(source))
+    except Exception as e:
+      expected = str(e)
+    try:
+      actual: ast.Expression | str = parser.edit(offset, removed, inserted)
+    except Exception as e:
+      actual = str(e)
+    assert actual == expected, source
+
+
+def test_incremental_parser_updates_locations() -> None:
+  parser = IncrementalParser(SOURCE)
+  tree = parser.edit(0, 0, "\n\n")
+  assert isinstance(tree, ast.BinaryOp) and isinstance(tree.left, ast.FunctionCall)
+  call = tree.left.arguments[1]
+  assert call.loc is not None and call.loc.line == 5
@@ -0,0 +1,85 @@
+import io
+import sys
+import pytest
+from compiler import ast, pratt_parser
+from compiler.interpreter import Program, Value, run
+from compiler.optimizer import INT_MAX, INT_MIN, PassManager
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+
+
+def evaluate(source: str, variables: dict[str, Value] | None = None, stdin: str = "") -> tuple[Value, str]:
+  stdout = io.StringIO()
+  value = run(parse(tokenize(source)), variables, io.StringIO(stdin), stdout)
+  return value, stdout.getvalue()
+
+
+def test_expressions() -> None:
+  assert evaluate("1 + 2 * 3") == (7, "")
+  assert evaluate("0 - 7 / 2") == (-3, "")
+  assert evaluate("(0 - 7) % 2") == (-1, "")
+  assert evaluate(f"{INT_MAX} + 1") == (INT_MIN, "")
+  assert evaluate("not (1 < 2) or (3 >= 3)") == (True, "")
+  assert evaluate("if 1 == 2 then 3 else -4") == (-4, "")
+  assert evaluate("if false then 3") == (None, "")
+  assert evaluate("1 == true") == (False, "")
+
+
+def test_variables_and_loops() -> None:
+  variables: dict[str, Value] = {"i": 0, "unused": 1}
+  assert evaluate("while i < 10 i = i + 1", variables) == (None, "")
+  assert variables == {"i": 10, "unused": 1}
+  assert evaluate("a = b = 3") == (3, "")
+
+
+def test_builtins() -> None:
+  assert evaluate("print_int(read_int() * 2)", stdin="21\n") == (None, "42\n")
+  assert evaluate("print_bool(1 < 2)") == (None, "true\n")
+
+
+def test_short_circuit() -> None:
+  assert evaluate("false and print_bool(true)") == (False, "")
+  assert evaluate("true or print_bool(true)") == (True, "")
+
+
+def test_errors() -> None:
+  with pytest.raises(Exception, match='variable "x" used before assignment'):
+    evaluate("x + 1")
+  with pytest.raises(Exception, match='variable "y" used before assignment'):
+    evaluate("x * y", {"x": 1})
+  with pytest.raises(Exception, match='operator "<" expects Int operands'):
+    evaluate("x < y", {"x": 1, "y": False})
+  with pytest.raises(Exception, match="division by zero"):
+    evaluate("1 / (2 - 2)")
+  with pytest.raises(Exception, match="division overflow"):
+    evaluate("x / (0 - 1)", {"x": INT_MIN})
+  with pytest.raises(Exception, match="division overflow"):
+    evaluate("x % y", {"x": INT_MIN, "y": -1})
+  with pytest.raises(Exception, match="division overflow"):
+    run(PassManager.for_level(2).run(parse(tokenize(f"(0 - {INT_MAX} - 1) / (0 - 1)"))))
+  with pytest.raises(Exception, match='unknown function "f"'):
+    evaluate("f(1)")
+  with pytest.raises(Exception, match="expects 1 arguments, got 2"):
+    evaluate("print_int(1, 2)")
+  with pytest.raises(Exception, match="can only assign to a variable"):
+    evaluate("1 = 2")
+  with pytest.raises(Exception, match='operator "\\+" expects Int operands'):
+    evaluate("1 + true")
+  with pytest.raises(Exception, match="if expects a Bool"):
+    evaluate("if 1 then 2")
+
+
+def test_program_runs_many_times() -> None:
+  program = Program(parse(tokenize("while n > 0 n = n - 1")))
+  assert program.slots == {"n": 0}
+  for n in [0, 5, 100]:
+    variables: dict[str, Value] = {"n": n}
+    program(variables)
+    assert variables == {"n": 0}
+
+
+def test_deep_trees() -> None:
+  limit = sys.getrecursionlimit()
+  assert run(pratt_parser.parse(tokenize("x" + " + 1" * 100_000)), {"x": 1}) == 100_001
+  assert run(pratt_parser.parse(tokenize("- " * 100_000 + "1"))) == 1
+  assert sys.getrecursionlimit() == limit
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+from pathlib import Path
+import pytest
+from compiler import __main__ as main
+from compiler.cache import CompilationCache
+from compiler.metrics import ServerMetrics
+from compiler.profiling import NULL_PROFILER, Profiler
+
+
+def fake_compiler(source_code: str, input_file_name: str, profiler: Profiler = NULL_PROFILER, optimization_level: int = 1) -> bytes:
+    with profiler.phase("parse"):
+        if "error" in source_code:
+            raise Exception(f"{input_file_name}: bad program")
+    return source_code.encode()
+
+
+@pytest.fixture(autouse=True)
+def use_fake_compiler(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(main, "call_compiler", fake_compiler)
+
+
+def test_compile_batch_keeps_going_after_errors() -> None:
+    sources = [("1 + 2", "a"), ("error", "b"), ("3", "c")]
+    results = main.compile_batch(sources)
+    assert results[0] == b"1 + 2"
+    assert isinstance(results[1], str) and "b: bad program" in results[1]
+    assert results[2] == b"3"
+
+
+def test_compile_batch_in_parallel() -> None:
+    sources = [(f"error {i}" if i % 3 == 0 else str(i), f"p{i}") for i in range(20)]
+    assert main.compile_batch(sources, jobs=4) == main.compile_batch(sources)
+
+
+def test_compile_batch_uses_cache() -> None:
+    cache = CompilationCache()
+    main.compile_batch([("1", "a"), ("error", "b")], cache=cache)
+    main.compile_batch([("1", "a"), ("2", "b")], cache=cache)
+    assert cache.stats.as_dict()["memory_hits"] == 1
+
+
+def test_compile_batch_request() -> None:
+    request = json.dumps({"command": "compile_batch", "programs": ["1", "error"], "jobs": 2})
+    results = main.handle_request(request, CompilationCache())["results"]
+    assert results[0] == {"program": "MQ=="}
+    assert "bad program" in results[1]["error"]
+
+
+def test_compile_batch_request_limits_jobs() -> None:
+    assert main.request_jobs({}) == 1
+    assert main.request_jobs({"jobs": 10_000}) == (os.cpu_count() or 1)
+    request = json.dumps({"command": "compile_batch", "programs": ["1"], "jobs": 0})
+    assert '"jobs" must be at least 1' in main.handle_request(request, CompilationCache())["error"]
+
+
+def test_compile_batch_command(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    for directory in ["a", "b"]:
+        (tmp_path / directory).mkdir()
+        (tmp_path / directory / "main.src").write_text(directory)
+    (tmp_path / "a" / "other.src").write_text("other")
+    output_dir = tmp_path / "out"
+
+    monkeypatch.setattr(sys, "argv", ["main", "compile-batch", str(tmp_path / "a" / "main.src"), str(tmp_path / "a" / "other.src"), f"--output-dir={output_dir}"])
+    assert main.main() == 0
+    assert (output_dir / "main").read_bytes() == b"a" and (output_dir / "other").read_bytes() == b"other"
+
+    # files with the same name would overwrite each other's output
+    monkeypatch.setattr(sys, "argv", ["main", "compile-batch", str(tmp_path / "a" / "main.src"), str(tmp_path / "b" / "main.src"), f"--output-dir={output_dir}"])
+    with pytest.raises(Exception, match="would both be compiled to"):
+        main.main()
+
+
+def test_large_files_are_tokenized_in_parallel_by_default(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    source = tmp_path / "source"
+    source.write_text("1 + 2\n" * 100)
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    assert main.parallel_tokenizer_jobs(str(source), None, 600) == 8
+    assert main.parallel_tokenizer_jobs(str(source), 3, 600) == 3
+    assert main.parallel_tokenizer_jobs(str(source), 1, 600) == 1
+    assert main.parallel_tokenizer_jobs(str(source), None, 601) == 1
+    assert main.parallel_tokenizer_jobs(None, None, 0) == 1
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    assert main.parallel_tokenizer_jobs(str(source), None, 600) == 1
+
+
+def test_binary_request_returns_raw_executable() -> None:
+    cache = CompilationCache()
+    assert main.handle_binary_request(b'{"command": "compile", "code": "1 + 2"}', cache) == ({}, b"1 + 2")
+    metadata, payload = main.handle_binary_request(b'{"command": "compile", "code": "error"}', cache)
+    assert "bad program" in metadata["error"] and payload == b""
+    assert main.handle_binary_request(b'{"command": "ping"}', cache) == ({}, b"")
+
+
+def test_profile_in_responses() -> None:
+    cache = CompilationCache()
+    result = main.handle_request(json.dumps({"command": "compile", "code": "1", "profile": True}), cache)
+    assert result["program"] == "MQ==" and list(result["profile"]["phases"]) == ["parse"]
+    assert "profile" not in main.handle_request(json.dumps({"command": "compile", "code": "2"}), cache)
+
+    metadata, payload = main.handle_binary_request(b'{"command": "compile", "code": "error", "profile": true}', cache)
+    assert "bad program" in metadata["error"] and "parse" in metadata["profile"]["phases"]
+
+
+def test_requests_are_counted_in_metrics() -> None:
+    cache = CompilationCache()
+    metrics = ServerMetrics()
+    main.handle_request(json.dumps({"command": "compile", "code": "1"}), cache, metrics=metrics)
+    main.handle_request(json.dumps({"command": "compile", "code": "error"}), cache, metrics=metrics)
+    main.handle_request("not json", cache, metrics=metrics)
+    main.handle_binary_request(b'{"command": "compile", "code": "1 + 2"}', cache, metrics=metrics)
+    main.handle_binary_request(b'{"command": "ping"}', cache, metrics=metrics)
+    text = metrics.render()
+    assert 'compiler_requests_total{command="compile",outcome="ok"} 2\n' in text
+    assert 'compiler_requests_total{command="compile",outcome="error"} 1\n' in text
+    assert 'compiler_requests_total{command="other",outcome="error"} 1\n' in text
+    assert 'compiler_requests_total{command="ping",outcome="ok"} 1\n' in text
+    assert 'compiler_compile_seconds_count{phase="parse"} 3\n' in text
+    assert 'compiler_executable_bytes_count 2\n' in text
+    assert 'compiler_in_flight_requests 0\n' in text
@@ -0,0 +1,84 @@
+import os
+import socket
+import urllib.error
+import urllib.request
+import pytest
+from compiler.metrics import Counter, Histogram, Registry, ServerMetrics, listen_queue, start_metrics_server, stop_metrics_server
+
+
+def test_render_counter_and_histogram() -> None:
+    registry = Registry()
+    counter = Counter(registry, "requests_total", "Requests.", ("outcome",), [("ok",), ("error",)])
+    histogram = Histogram(registry, "latency_seconds", "Latency.", [0.1, 1])
+    registry.allocate()
+    counter.inc("ok")
+    counter.inc("ok", amount=2)
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(2.5)
+    assert registry.render() == (
+        "# HELP requests_total Requests.\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{outcome="ok"} 3\n'
+        'requests_total{outcome="error"} 0\n'
+        "# HELP latency_seconds Latency.\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1"} 2\n'
+        'latency_seconds_bucket{le="+Inf"} 3\n'
+        "latency_seconds_sum 3.05\n"
+        "latency_seconds_count 3\n"
+    )
+    with pytest.raises(Exception, match="undeclared labels"):
+        counter.inc("timeout")
+
+
+def test_metrics_are_shared_with_forked_processes() -> None:
+    metrics = ServerMetrics()
+    pids = []
+    for _ in range(3):
+        pid = os.fork()
+        if pid == 0:
+            for _ in range(100):
+                metrics.count_request("ping", False)
+            metrics.observe_compile(0.002, {"parse": 0.001}, 500, 2000)
+            os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    text = metrics.render()
+    assert 'compiler_requests_total{command="ping",outcome="ok"} 300\n' in text
+    assert 'compiler_compile_seconds_count{phase="parse"} 3\n' in text
+    assert 'compiler_executable_bytes_bucket{le="1000"} 0\n' in text
+    assert 'compiler_executable_bytes_bucket{le="10000"} 3\n' in text
+
+
+def test_listen_queue() -> None:
+    with socket.create_server(("127.0.0.1", 0), backlog=7) as server:
+        queue = listen_queue(server)
+        if queue is None:
+            pytest.skip("TCP_INFO is not available")
+        clients = [socket.create_connection(server.getsockname()) for _ in range(3)]
+        try:
+            assert listen_queue(server) == (3, 7)
+        finally:
+            for client in clients:
+                client.close()
+
+
+def test_metrics_server() -> None:
+    metrics = ServerMetrics()
+    metrics.count_request("compile", True)
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    pid = start_metrics_server(metrics, "127.0.0.1", port)
+    try:
+        metrics.count_request("compile", True)
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            text = response.read().decode()
+        assert 'compiler_requests_total{command="compile",outcome="error"} 2\n' in text
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/other")
+    finally:
+        stop_metrics_server(pid)
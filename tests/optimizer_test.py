@@ -0,0 +1,103 @@
+import pytest
+from compiler import ast, pratt_parser
+from compiler.optimizer import INT_MAX, INT_MIN, PassManager, fold_constants, prune_if_branches, remove_dead_loops, simplify_algebra
+from compiler.parser import parse
+from compiler.profiling import Profiler
+from compiler.tokenizer import tokenize
+
+
+def optimize(source: str, level: int = 2) -> ast.Expression:
+  return PassManager.for_level(level).run(parse(tokenize(source)))
+
+
+def test_constant_folding() -> None:
+  assert fold_constants(parse(tokenize("1 + 2 * 3"))) == ast.Literal(7)
+  assert fold_constants(parse(tokenize("f(-(4 - 10) % 4, 2 < 3)"))) == ast.FunctionCall(
+    ast.Identifier("f"), [ast.Literal(2), ast.Literal(True)]
+  )
+  assert fold_constants(parse(tokenize("not true == false"))) == ast.Literal(True)
+  assert fold_constants(parse(tokenize("x + 1 * 2"))) == ast.BinaryOp(ast.Identifier("x"), "+", ast.Literal(2))
+
+
+def test_constant_folding_follows_machine_arithmetic() -> None:
+  assert fold_constants(parse(tokenize(f"{INT_MAX} + 1"))) == ast.Literal(INT_MIN)
+  assert fold_constants(parse(tokenize("0 - 7 / 2"))) == ast.Literal(-3)
+  assert fold_constants(parse(tokenize("(0 - 7) / 2"))) == ast.Literal(-3)
+  assert fold_constants(parse(tokenize("(0 - 7) % 2"))) == ast.Literal(-1)
+  assert fold_constants(parse(tokenize("7 % (0 - 2)"))) == ast.Literal(1)
+  # left for the program to fail at run time
+  assert fold_constants(parse(tokenize("1 / 0"))) == parse(tokenize("1 / 0"))
+  assert isinstance(fold_constants(parse(tokenize(f"(0 - {INT_MAX} - 1) / (0 - 1)"))), ast.BinaryOp)
+
+
+def test_constant_folding_short_circuits() -> None:
+  assert fold_constants(parse(tokenize("false and (1 < 2 / 0)"))) == ast.Literal(False)
+  assert fold_constants(parse(tokenize("true or not false"))) == ast.Literal(True)
+  assert fold_constants(parse(tokenize("true and false"))) == ast.Literal(False)
+  assert fold_constants(parse(tokenize("true and f(x)"))) == parse(tokenize("true and f(x)"))
+  # type errors are not folded, also on the side that isn't evaluated
+  for source in ["1 + true", "false and 5", "true or 1", "false and 1 < true", "true or f(x)"]:
+    assert fold_constants(parse(tokenize(source))) == parse(tokenize(source))
+
+
+def test_algebraic_simplification() -> None:
+  assert simplify_algebra(parse(tokenize("(x + 2) * 1 + 0"))) == parse(tokenize("x + 2"))
+  assert simplify_algebra(parse(tokenize("1 * (0 + x % 3) / 1 - 0"))) == parse(tokenize("x % 3"))
+  assert simplify_algebra(parse(tokenize("not not (a < b)"))) == parse(tokenize("a < b"))
+  assert simplify_algebra(parse(tokenize("- - - (x * 2)"))) == parse(tokenize("-(x * 2)"))
+  assert simplify_algebra(parse(tokenize("- - 5"))) == ast.Literal(5)
+  assert simplify_algebra(parse(tokenize("x * 0"))) == parse(tokenize("x * 0"))
+  # without the types of variables and functions, their operations are left alone
+  for source in ["x * 1", "0 + f(x)", "not not x", "- - x"]:
+    assert simplify_algebra(parse(tokenize(source))) == parse(tokenize(source))
+  # type errors are not simplified away
+  for source in ["true + 0", "1 * false", "not not 5", "- - true", "- - (a < b)", "not not (x + 1)"]:
+    assert simplify_algebra(parse(tokenize(source))) == parse(tokenize(source))
+
+
+def test_dead_branches_and_loops() -> None:
+  assert prune_if_branches(parse(tokenize("if true then a + 1 else 2"))) == parse(tokenize("a + 1"))
+  assert prune_if_branches(parse(tokenize("if false then 1 < 2 else not b"))) == parse(tokenize("not b"))
+  assert prune_if_branches(parse(tokenize("if false then 1 == 1"))) == ast.Literal(None)
+  assert prune_if_branches(parse(tokenize("if true then a"))) == parse(tokenize("if true then a"))
+  assert remove_dead_loops(parse(tokenize("while false 1 + 1"))) == ast.Literal(None)
+  assert remove_dead_loops(parse(tokenize("while x 1 + 1"))) == parse(tokenize("while x 1 + 1"))
+  # without the types of variables and functions, the code that isn't run stays
+  for source in ["if true then a else b", "if false then a else 1", "if false then f(x)"]:
+    assert prune_if_branches(parse(tokenize(source))) == parse(tokenize(source))
+  assert remove_dead_loops(parse(tokenize("while false x = x + 1"))) == parse(tokenize("while false x = x + 1"))
+  # type errors are not pruned away
+  for source in ["if true then 1 else false", "if false then true + 1 else 2", "if false then 1 + true"]:
+    assert prune_if_branches(parse(tokenize(source))) == parse(tokenize(source))
+  assert prune_if_branches(parse(tokenize("if true then 1 + true else 2"))) == parse(tokenize("1 + true"))
+  assert remove_dead_loops(parse(tokenize("while false 1 + true"))) == parse(tokenize("while false 1 + true"))
+
+
+def test_optimization_levels() -> None:
+  source = "while 1 > 2 (if 2 * 2 == 4 then 3 else 1 / 0)"
+  assert optimize(source, 0) == parse(tokenize(source))
+  assert optimize(source, 1) == ast.Literal(None)
+  assert optimize("f(if 2 * 2 == 4 then x * 1 else 0)", 1) == parse(tokenize("f(x * 1)"))
+  assert optimize("f(if 2 * 2 == 4 then (x + 1) * 1 else 0)", 2) == parse(tokenize("f(x + 1)"))
+  with pytest.raises(Exception, match="unknown optimization level"):
+    PassManager.for_level(9)
+
+
+def test_passes_dont_modify_the_input() -> None:
+  tree = parse(tokenize("f(1 + 2, if true then x * 1 else 0)"))
+  copy = parse(tokenize("f(1 + 2, if true then x * 1 else 0)"))
+  PassManager.for_level(2).run(tree)
+  assert tree == copy
+
+
+def test_deep_trees() -> None:
+  tree = pratt_parser.parse(tokenize("1" + " + 1" * 100_000))
+  assert PassManager.for_level(2).run(tree) == ast.Literal(100_001)
+
+
+def test_pass_statistics() -> None:
+  profiler = Profiler()
+  PassManager.for_level(1).run(parse(tokenize("x + (1 + 2)")), profiler)
+  assert "optimize:constant_folding" in profiler.phases
+  assert profiler.counts["removed_nodes:constant_folding"] == 2
+  assert profiler.counts["removed_nodes:if_pruning"] == 0
@@ -1,7 +1,8 @@
+import io
 import pytest
 from compiler import ast
-from compiler.parser import parse
-from compiler.tokenizer import tokenize
+from compiler.parser import TokenStream, parse
+from compiler.tokenizer import iter_tokens, tokenize, tokenize_to_buffer
 
 
 def test_parser_basics() -> None:
@@ -308,4 +309,44 @@ def test_while_clauses() -> None:
       "=",
       ast.BinaryOp(ast.Identifier("x"), "+", ast.Literal(1))
     )
-  )
\ No newline at end of file
+  )
+def test_parse_token_stream() -> None:
+  assert parse(iter_tokens(io.StringIO("f(a,\n b * 2)"))) == ast.FunctionCall(
+    name=ast.Identifier("f"),
+    arguments=[ast.Identifier("a"), ast.BinaryOp(ast.Identifier("b"), "*", ast.Literal(2))]
+  )
+
+def test_token_stream_lookahead() -> None:
+  stream = TokenStream(tokenize("a b"), lookahead=2)
+  assert stream.peek(1).text == "b"
+  assert stream.next().text == "a"
+  assert stream.next().text == "b"
+  assert stream.peek().type == "end"
+  with pytest.raises(ValueError):
+    stream.peek(2)
+
+def test_parse_token_buffer() -> None:
+  assert parse(tokenize_to_buffer("a = b * (1 + 2)")) == parse(tokenize("a = b * (1 + 2)"))
+
+def test_unary_operand_is_a_single_factor() -> None:
+  assert parse(tokenize("-x - y")) == ast.BinaryOp(
+    left=ast.UnaryOp("-", ast.Identifier("x")),
+    op="-",
+    right=ast.Identifier("y")
+  )
+  assert parse(tokenize("not a and not b")) == ast.BinaryOp(
+    left=ast.UnaryOp("not", ast.Identifier("a")),
+    op="and",
+    right=ast.UnaryOp("not", ast.Identifier("b"))
+  )
+
+
+def test_locations() -> None:
+  expr = parse(tokenize("x = if a\n  then f(1) else -b"))
+  assert isinstance(expr, ast.BinaryOp) and isinstance(expr.right, ast.IfExpression)
+  assert expr.loc is not None and (expr.loc.line, expr.loc.column) == (1, 3)
+  if_expr = expr.right
+  assert if_expr.loc is not None and (if_expr.loc.line, if_expr.loc.column) == (1, 5)
+  assert if_expr.then_clause.loc is not None and (if_expr.then_clause.loc.line, if_expr.then_clause.loc.column) == (2, 8)
+  assert if_expr.else_clause is not None and if_expr.else_clause.loc is not None
+  assert (if_expr.else_clause.loc.line, if_expr.else_clause.loc.column) == (2, 18)
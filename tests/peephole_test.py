@@ -0,0 +1,62 @@
+import pytest
+from compiler.peephole import Instruction, optimize, optimize_assembly, parse_line, patterns
+from compiler.profiling import Profiler
+
+
+def rewrite(*lines: str, counts: dict[str, int] | None = None) -> list[str]:
+  return optimize(list(lines), list(patterns), counts)
+
+
+def test_parse_line() -> None:
+  assert parse_line("    movq 8(%rax,%rcx,8), %rdx  # load") == Instruction("    movq 8(%rax,%rcx,8), %rdx  # load", "movq", ("8(%rax,%rcx,8)", "%rdx"))
+  assert parse_line(".L3:") == Instruction(".L3:", label=".L3")
+  assert parse_line("    .global main") == Instruction("    .global main")
+  assert parse_line("    cqto") == Instruction("    cqto", "cqto")
+
+
+def test_store_then_load() -> None:
+  assert rewrite("    movq %rax, -8(%rbp)", "    movq -8(%rbp), %rax") == ["    movq %rax, -8(%rbp)"]
+  assert rewrite("    movq %rax, -8(%rbp)", "    movq -8(%rbp), %rcx") == ["    movq %rax, -8(%rbp)", "    movq %rax, %rcx"]
+  assert rewrite("    movq %rax, -8(%rbp)", "    movq -16(%rbp), %rax") == ["    movq %rax, -8(%rbp)", "    movq -16(%rbp), %rax"]
+  # a label between them can be jumped to with another value in memory
+  unchanged = ["    movq %rax, -8(%rbp)", ".L1:", "    movq -8(%rbp), %rax"]
+  assert rewrite(*unchanged) == unchanged
+
+
+def test_moves_and_loads() -> None:
+  assert rewrite("    movq %rax, %rax", "    movl %eax, %eax") == ["    movl %eax, %eax"]
+  assert rewrite("    movq -8(%rbp), %rax", "    movq -8(%rbp), %rax") == ["    movq -8(%rbp), %rax"]
+  assert rewrite("    movq (%rax), %rax", "    movq (%rax), %rax") == ["    movq (%rax), %rax", "    movq (%rax), %rax"]
+  assert rewrite("    pushq %rax", "    popq %rcx", "    pushq %rdx", "    popq %rdx") == ["    movq %rax, %rcx"]
+
+
+def test_jump_to_next() -> None:
+  assert rewrite("    jmp .L1", ".L1:", "    jne .L2", ".L2:") == [".L1:", ".L2:"]
+  assert rewrite("    jmp .L1", ".L2:", ".L1:") == ["    jmp .L1", ".L2:", ".L1:"]
+
+
+def test_rewrites_expose_more_rewrites() -> None:
+  counts: dict[str, int] = {}
+  lines = rewrite(
+    "    movq %rax, -8(%rbp)",
+    "    movq -8(%rbp), %rax",
+    "    movq %rax, %rax",
+    "    jmp .L1",
+    "    pushq %rax",
+    "    popq %rax",
+    ".L1:",
+    counts=counts,
+  )
+  assert lines == ["    movq %rax, -8(%rbp)", ".L1:"]
+  assert counts == {"store_then_load": 1, "self_move": 1, "push_then_pop": 1, "jump_to_next": 1}
+
+
+def test_optimization_levels() -> None:
+  lines = ["    movq %rax, %rax"]
+  assert optimize_assembly(lines, 1) == lines
+  profiler = Profiler()
+  assert optimize_assembly(lines, 2, profiler) == []
+  assert "peephole" in profiler.phases
+  assert profiler.counts == {"rewrites:self_move": 1}
+  with pytest.raises(Exception, match="unknown optimization level"):
+    optimize_assembly(lines, 3)
@@ -0,0 +1,84 @@
+import random
+from typing import Callable
+from compiler import ast, parser, pratt_parser
+from compiler.tokenizer import Token, tokenize
+from tests.helpers import SOURCES, locations
+
+BAD_SOURCES = [
+  "",
+  "a + b c",
+  "(a = b)",
+  "1 +",
+  "f(a",
+  "if a b",
+  "(1 + 2",
+  "f(a = b)",
+  "x = )",
+]
+
+
+def random_source(rng: random.Random, depth: int = 0) -> str:
+  choice = rng.randrange(8 if depth < 4 else 2)
+  if choice == 0:
+    return str(rng.randrange(100))
+  if choice == 1:
+    return rng.choice(["a", "b", "true"])
+  if choice == 2:
+    op = rng.choice(["+", "-", "*", "/", "%", "==", "<", ">=", "and", "or"])
+    return f"{random_source(rng, depth + 1)} {op} {random_source(rng, depth + 1)}"
+  if choice == 3:
+    return f"{rng.choice(['-', 'not '])}{random_source(rng, depth + 1)}"
+  if choice == 4:
+    return f"({random_source(rng, depth + 1)})"
+  if choice == 5:
+    else_part = f" else {random_source(rng, depth + 1)}" if rng.random() < 0.5 else ""
+    return f"if {random_source(rng, depth + 1)} then {random_source(rng, depth + 1)}{else_part}"
+  if choice == 6:
+    args = ", ".join(random_source(rng, depth + 1) for _ in range(rng.randrange(3)))
+    return f"f({args})"
+  return f"{random_source(rng, depth + 1)} {rng.choice(['+', '*'])} {random_source(rng, depth + 1)}"
+
+
+def outcome(parse: Callable[[list[Token]], ast.Expression], source: str) -> ast.Expression | str:
+  try:
+    return parse(tokenize(source))
+  except Exception as e:
+    return str(e)
+
+
+def test_same_trees_as_recursive_parser() -> None:
+  for source in SOURCES:
+    assert pratt_parser.parse(tokenize(source)) == parser.parse(tokenize(source)), source
+
+  rng = random.Random(0)
+  for _ in range(500):
+    source = random_source(rng)
+    if rng.random() < 0.3:
+      source = f"x = {source}"
+    if rng.random() < 0.2:
+      source = f"while {random_source(rng, 2)} {source}"
+    assert outcome(pratt_parser.parse, source) == outcome(parser.parse, source), source
+
+
+def test_same_errors_as_recursive_parser() -> None:
+  for source in BAD_SOURCES:
+    error = outcome(parser.parse, source)
+    assert isinstance(error, str)
+    assert outcome(pratt_parser.parse, source) == error, source
+
+
+def test_same_locations_as_recursive_parser() -> None:
+  for source in SOURCES:
+    tokens = tokenize(source.replace(" ", "\n "))
+    assert locations(pratt_parser.parse(tokens)) == locations(parser.parse(tokens)), source
+
+
+def test_deep_nesting() -> None:
+  depth = 100_000
+  assert pratt_parser.parse(tokenize("(" * depth + "1" + ")" * depth)) == ast.Literal(1)
+
+  tree = pratt_parser.parse(tokenize("-" * depth + "x"))
+  for _ in range(depth):
+    assert isinstance(tree, ast.UnaryOp)
+    tree = tree.value
+  assert tree == ast.Identifier("x")
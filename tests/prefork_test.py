@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from socketserver import StreamRequestHandler, TCPServer
+from compiler.prefork import serve_prefork
+from tests.helpers import free_port
+
+# the number of requests being handled, and the most there have been at once
+active = multiprocessing.get_context("fork").Array('q', 2)
+
+
+class PidHandler(StreamRequestHandler):
+    """Answers with the pid of the worker, after sleeping for the number of seconds in the request."""
+
+    def handle(self) -> None:
+        with active.get_lock():
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        try:
+            time.sleep(float(self.rfile.read()))
+            self.wfile.write(str(os.getpid()).encode())
+        finally:
+            with active.get_lock():
+                active[0] -= 1
+
+
+class Server(TCPServer):
+    allow_reuse_address = True
+
+
+def start_pool(port: int, workers: int) -> int:
+    """Starts `serve_prefork` in a child process and returns its pid."""
+    server = Server(("127.0.0.1", port), PidHandler)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            serve_prefork(server, workers)
+        except BaseException:
+            os._exit(1)
+        os._exit(0)
+    server.server_close()
+    return pid
+
+
+def request(port: int, seconds: float = 0) -> int:
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(str(seconds).encode())
+        sock.shutdown(socket.SHUT_WR)
+        return int(sock.makefile().read())
+
+
+def cpu_seconds(pid: int) -> float:
+    """The CPU time used by process `pid` so far, from /proc."""
+    fields = Path(f"/proc/{pid}/stat").read_text().rpartition(")")[2].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def test_prefork_pool() -> None:
+    port = free_port()
+    active[0] = active[1] = 0
+    supervisor = start_pool(port, 2)
+    try:
+        workers = {request(port) for _ in range(20)}
+        assert len(workers) <= 2
+
+        # idle workers wait for connections instead of polling for them
+        if os.path.exists("/proc"):
+            used = {pid: cpu_seconds(pid) for pid in workers}
+            time.sleep(1)
+            assert all(cpu_seconds(pid) - used[pid] < 0.2 for pid in workers)
+
+        # at most one request per worker is handled at a time, and the others wait in the listen queue
+        with ThreadPoolExecutor(6) as pool:
+            assert len(set(pool.map(lambda _: request(port, 0.2), range(6)))) <= 2
+        assert active[1] == 2
+
+        # a worker that dies is replaced
+        killed = workers.pop()
+        os.kill(killed, signal.SIGKILL)
+        for _ in range(100):
+            pid = request(port)
+            assert pid != killed
+            if pid not in workers:
+                break
+            time.sleep(0.01)
+        else:
+            raise AssertionError("the killed worker was not replaced")
+
+        # SIGTERM lets the request in progress finish, then stops the pool
+        with ThreadPoolExecutor(1) as pool:
+            slow = pool.submit(request, port, 0.5)
+            time.sleep(0.2)
+            os.kill(supervisor, signal.SIGTERM)
+            assert slow.result() > 0
+        _, status = os.waitpid(supervisor, 0)
+        supervisor = 0
+        assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+        with socket.socket() as sock:
+            assert sock.connect_ex(("127.0.0.1", port)) != 0
+    finally:
+        if supervisor:
+            # SIGTERM, so that the workers are stopped too
+            os.kill(supervisor, signal.SIGTERM)
+            os.waitpid(supervisor, 0)
@@ -0,0 +1,50 @@
+import pytest
+from compiler import __main__ as main, pratt_parser
+from compiler.parser import parse
+from compiler.profiling import NULL_PROFILER, Profiler, count_nodes
+from compiler.tokenizer import tokenize
+
+
+def test_profiler_records_phases_and_counts() -> None:
+  profiler = Profiler(memory=True)
+  with profiler.phase("allocate"):
+    data = [object() for _ in range(10_000)]
+  with pytest.raises(ValueError):
+    with profiler.phase("fail"):
+      raise ValueError()
+  profiler.count("objects", len(data))
+  profiler.count("objects", 1)
+
+  result = profiler.as_dict()
+  assert list(result["phases"]) == ["allocate", "fail"]
+  assert result["phases"]["allocate"]["peak_memory"] > 10_000 * 16
+  assert result["counts"] == {"objects": 10_001}
+  assert "allocate" in profiler.report()
+
+
+def test_null_profiler_records_nothing() -> None:
+  with NULL_PROFILER.phase("parse"):
+    NULL_PROFILER.count("tokens", 1)
+  assert NULL_PROFILER.as_dict() == {"phases": {}, "counts": {}}
+
+
+def test_count_nodes() -> None:
+  assert count_nodes(parse(tokenize("f(a, 1 + -b)"))) == 7
+  assert count_nodes(pratt_parser.parse(tokenize("- " * 10_000 + "1"))) == 10_001
+
+
+def test_compiler_phases() -> None:
+  profiler = Profiler()
+  with pytest.raises(NotImplementedError):
+    main.call_compiler("f(a, 1 + -b)", "test", profiler, optimization_level=0)
+  assert list(profiler.phases) == ["tokenize", "parse", "codegen"]
+  assert profiler.counts == {"tokens": 9, "nodes": 7}
+
+
+def test_phases_without_node_counts() -> None:
+  profiler = Profiler(node_counts=False)
+  with pytest.raises(NotImplementedError):
+    main.call_compiler("f(a, 1 + -b)", "test", profiler, optimization_level=1)
+  assert "optimize:constant_folding" in profiler.phases
+  assert profiler.counts == {"tokens": 9}
+  assert not NULL_PROFILER.node_counts
@@ -0,0 +1,124 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable
+import pytest
+from compiler.singleflight import SingleFlight
+
+
+def run_in_children(single_flight: SingleFlight, compile_function: Callable[[], bytes], count: int, results: Path) -> None:
+    """Runs `single_flight.run` in `count` processes that start 0.1 s apart, writing their results under `results`."""
+    pids = []
+    for i in range(count):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                output = single_flight.run("key", compile_function)
+            except Exception as e:
+                output = f"{type(e).__name__}: {e}".encode()
+            (results / str(i)).write_bytes(output)
+            os._exit(0)
+        pids.append(pid)
+        time.sleep(0.1)
+    for pid in pids:
+        os.waitpid(pid, 0)
+
+
+def test_concurrent_calls_are_coalesced(tmp_path: Path) -> None:
+    single_flight = SingleFlight()
+    calls = tmp_path / "calls"
+
+    def compile() -> bytes:
+        with open(calls, "a") as f:
+            f.write("compiled\n")
+        time.sleep(0.5)
+        return b"executable"
+
+    run_in_children(single_flight, compile, 4, tmp_path)
+    assert calls.read_text() == "compiled\n"
+    assert [(tmp_path / str(i)).read_bytes() for i in range(4)] == [b"executable"] * 4
+    assert single_flight.stats.as_dict() == {"compiled": 1, "coalesced": 3, "timed_out": 0}
+    # the last process to read the result removed it, and the lock files
+    assert list(single_flight.directory.iterdir()) == []
+    single_flight.close()
+    assert not single_flight.directory.exists()
+
+
+def test_errors_are_shared(tmp_path: Path) -> None:
+    single_flight = SingleFlight(str(tmp_path / "inflight"))
+
+    def compile() -> bytes:
+        time.sleep(0.3)
+        raise ValueError("bad program")
+
+    run_in_children(single_flight, compile, 2, tmp_path)
+    assert [(tmp_path / str(i)).read_bytes() for i in range(2)] == [b"ValueError: bad program"] * 2
+    assert single_flight.stats.as_dict() == {"compiled": 1, "coalesced": 1, "timed_out": 0}
+    assert list(single_flight.directory.glob("*.result")) == []
+
+
+def test_finished_results_are_not_reused() -> None:
+    single_flight = SingleFlight()
+    assert single_flight.run("key", lambda: b"first") == b"first"
+    assert single_flight.run("key", lambda: b"second") == b"second"
+
+    def fail() -> bytes:
+        raise Exception("failed")
+
+    with pytest.raises(Exception, match="failed"):
+        single_flight.run("key", fail)
+    assert single_flight.stats.as_dict() == {"compiled": 3, "coalesced": 0, "timed_out": 0}
+    # nobody was waiting, so no result was written, and the lock files were removed
+    assert list(single_flight.directory.iterdir()) == []
+    single_flight.close()
+
+
+def test_waiting_process_compiles_if_the_first_one_dies(tmp_path: Path) -> None:
+    single_flight = SingleFlight()
+
+    def compile() -> bytes:
+        if not (tmp_path / "died").exists():
+            (tmp_path / "died").touch()
+            time.sleep(0.3)
+            os._exit(1)
+        return b"executable"
+
+    run_in_children(single_flight, compile, 2, tmp_path)
+    assert not (tmp_path / "0").exists()
+    assert (tmp_path / "1").read_bytes() == b"executable"
+    assert single_flight.stats.as_dict() == {"compiled": 2, "coalesced": 0, "timed_out": 0}
+    single_flight.close()
+
+
+def test_waiting_gives_up_after_the_timeout(tmp_path: Path) -> None:
+    single_flight = SingleFlight(timeout=0.2)
+
+    def compile() -> bytes:
+        time.sleep(0.6)
+        return b"executable"
+
+    run_in_children(single_flight, compile, 2, tmp_path)
+    assert [(tmp_path / str(i)).read_bytes() for i in range(2)] == [b"executable"] * 2
+    assert single_flight.stats.as_dict() == {"compiled": 2, "coalesced": 0, "timed_out": 1}
+    assert list(single_flight.directory.iterdir()) == []
+    single_flight.close()
+
+
+def test_calls_after_the_files_are_removed(tmp_path: Path) -> None:
+    single_flight = SingleFlight()
+    calls = tmp_path / "calls"
+
+    def compile() -> bytes:
+        with open(calls, "a") as f:
+            f.write("compiled\n")
+        time.sleep(0.15)
+        return b"executable"
+
+    # processes start while others are removing the files and creating new ones
+    run_in_children(single_flight, compile, 6, tmp_path)
+    assert [(tmp_path / str(i)).read_bytes() for i in range(6)] == [b"executable"] * 6
+    stats = single_flight.stats.as_dict()
+    assert stats["compiled"] == len(calls.read_text().splitlines())
+    assert stats["compiled"] + stats["coalesced"] == 6 and stats["timed_out"] == 0
+    assert list(single_flight.directory.iterdir()) == []
+    single_flight.close()
@@ -1,4 +1,7 @@
-from compiler.tokenizer import Token, tokenize, L
+import io
+from pathlib import Path
+import pytest
+from compiler.tokenizer import Token, iter_tokens, map_source_file, scan, tokenize, tokenize_parallel, tokenize_to_buffer, L
 
 def test_tokenizer_basics() -> None:
     assert tokenize("   \n    hi   (hello)\n") == [
@@ -69,4 +72,86 @@ def test_tokenizer_int_operators() -> None:
         Token(loc=L, type="int_literal", text="2"),
         Token(loc=L, type="operator", text=">="),
         Token(loc=L, type="int_literal", text="2")
-    ]
\ No newline at end of file
+    ]
+
+def test_tokenizer_locations() -> None:
+    tokens = tokenize("a + 1\n  // comment\n\n   foo(b)")
+    assert [(t.text, t.loc.line, t.loc.column) for t in tokens] == [
+        ("a", 1, 1),
+        ("+", 1, 3),
+        ("1", 1, 5),
+        ("foo", 4, 4),
+        ("(", 4, 7),
+        ("b", 4, 8),
+        (")", 4, 9),
+    ]
+
+def test_tokenizer_rejects_unknown_characters() -> None:
+    with pytest.raises(Exception, match="Tokenization failed near: '\\$ b' at position 2"):
+        tokenize("a $ b")
+
+def test_iter_tokens_reads_file_in_chunks() -> None:
+    source = "x = 1\n# comment\nwhile (x < 100)\n  x = x * 2 // double it\n" * 5
+    expected = [(t.type, t.text, t.loc.line, t.loc.column) for t in tokenize(source)]
+    for chunk_size in [1, 3, 7, 64]:
+        tokens = iter_tokens(io.StringIO(source), chunk_size=chunk_size)
+        assert [(t.type, t.text, t.loc.line, t.loc.column) for t in tokens] == expected
+
+def test_token_buffer_matches_tokenize() -> None:
+    source = "if a <= 10 then\n  f(a, -b) # comment\nelse 0"
+    buffer = tokenize_to_buffer(source)
+    assert len(buffer) == len(tokenize(source))
+    assert list(buffer) == tokenize(source)
+    assert [t.loc for t in buffer] == [t.loc for t in tokenize(source)]
+    assert buffer.type(1) == "identifier"
+    assert buffer.text(2) == "<="
+    assert buffer[-1] == Token(loc=L, type="int_literal", text="0")
+    with pytest.raises(IndexError):
+        buffer[len(buffer)]
+
+def test_tokenize_parallel() -> None:
+    source = "".join(f"f(x{i}, {i}) // comment {i}\n  \n# more\nif a then b\n" for i in range(500))
+    for workers in [1, 3]:
+        buffer = tokenize_parallel(source, workers)
+        assert list(buffer) == tokenize(source)
+        assert [t.loc for t in buffer] == [t.loc for t in tokenize(source)]
+    assert len(tokenize_parallel("", 2)) == 0
+    assert list(tokenize_parallel("1 + 2", 2)) == tokenize("1 + 2")
+    with pytest.raises(Exception, match=f"Tokenization failed near: '\\$' at position {len(source) + 2}"):
+        tokenize_parallel(source + "a $", 3)
+
+def test_tokenize_ascii_bytes() -> None:
+    source = "if a\x1c<= 3 then\r\n  f(x_1, 10) // comment\n\t# another\x0b\n-2"
+    assert list(scan(source.encode())) == tokenize(source)
+    assert list(tokenize_to_buffer(source.encode())) == tokenize(source)
+    with pytest.raises(Exception, match="Tokenization failed near: '\\$ 1' at position 4"):
+        list(scan(b"1 + $ 1"))
+
+def test_map_source_file(tmp_path: Path) -> None:
+    path = tmp_path / "program"
+    path.write_text("x = 1\n\n  + y // done\n")
+    source = map_source_file(str(path))
+    assert source is not None
+    assert list(iter_tokens(source)) == tokenize(path.read_text())
+    source.close()
+
+    # the columns of non-ASCII source code count characters, so it is tokenized as a str
+    path.write_text("x = 1 // π\ny")
+    assert map_source_file(str(path)) is None
+    path.write_text("")
+    assert map_source_file(str(path)) is None
+
+
+def test_map_source_file_newlines(tmp_path: Path) -> None:
+    path = tmp_path / "program"
+    path.write_bytes(b"x = 1\ny\n  + z\n")
+    source = map_source_file(str(path))
+    assert source is not None
+    expected = list(iter_tokens(source))
+    source.close()
+    # carriage returns are newlines in text files, so those are tokenized the same way as a str
+    for data in [b"x = 1\r\ny\r\n  + z\r\n", b"x = 1\ry\r  + z\r"]:
+        path.write_bytes(data)
+        assert map_source_file(str(path)) is None
+        with open(path) as f:
+            assert list(iter_tokens(f)) == expected
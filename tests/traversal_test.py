@@ -0,0 +1,97 @@
+from compiler import ast, pratt_parser
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.traversal import Transformer, Visitor, children, with_children
+
+
+class Printer(Visitor[str]):
+  def visit_literal(self, node: ast.Literal) -> str:
+    return str(node.value)
+
+  def visit_identifier(self, node: ast.Identifier) -> str:
+    return node.name
+
+  def visit_binary_op(self, node: ast.BinaryOp, left: str, right: str) -> str:
+    return f"({left} {node.op} {right})"
+
+  def visit_unary_op(self, node: ast.UnaryOp, value: str) -> str:
+    return f"({node.op} {value})"
+
+  def visit_if_expression(self, node: ast.IfExpression, *clauses: str) -> str:
+    return "if " + " then ".join(clauses[:2]) + (f" else {clauses[2]}" if len(clauses) > 2 else "")
+
+  def visit_while_expression(self, node: ast.WhileExpression, cond: str, body: str) -> str:
+    return f"while {cond} do {body}"
+
+  def visit_function_call(self, node: ast.FunctionCall, *arguments: str) -> str:
+    return f"{node.name.name}({', '.join(arguments)})"
+
+
+class NodeCounter(Visitor[int]):
+  def visit_expression(self, node: ast.Expression, *children: int) -> int:
+    return 1 + sum(children)
+
+
+class Renamer(Transformer):
+  def transform_identifier(self, node: ast.Identifier) -> ast.Expression:
+    return ast.Identifier(node.name.upper(), loc=node.loc) if node.name == "x" else node
+
+
+def test_visitor_covers_all_nodes() -> None:
+  assert Printer().visit(parse(tokenize("f(-x, 1 + 2 * y)"))) == "f((- x), (1 + (2 * y)))"
+  assert Printer().visit(parse(tokenize("if not a then b else c"))) == "if (not a) then b else c"
+  assert Printer().visit(parse(tokenize("if a then b"))) == "if a then b"
+  assert Printer().visit(parse(tokenize("while (a < 3) a = a + 1"))) == "while (a < 3) do (a = (a + 1))"
+
+
+def test_default_handlers() -> None:
+  expr = parse(tokenize("f(a, 1 + -b)"))
+  # the function name isn't a child
+  assert NodeCounter().visit(expr) == 6
+  assert Visitor().visit(expr) is None
+  assert Transformer().transform(expr) is expr
+
+
+def test_transformer_copies_only_changed_subtrees() -> None:
+  expr = parse(tokenize("if x then f(1 + 2, y) else x * 3"))
+  assert isinstance(expr, ast.IfExpression) and isinstance(expr.then_clause, ast.FunctionCall)
+  result = Renamer().transform(expr)
+  assert result == parse(tokenize("if X then f(1 + 2, y) else X * 3"))
+  assert isinstance(result, ast.IfExpression) and result.then_clause is expr.then_clause
+  assert result.loc == expr.loc and result.else_clause.loc == expr.else_clause.loc  # type: ignore[union-attr]
+
+
+def test_deep_trees() -> None:
+  depth = 100_000
+  expr = pratt_parser.parse(tokenize("- " * depth + "x"))
+  assert NodeCounter().visit(expr) == depth + 1
+  renamed = Renamer().transform(expr)
+  while isinstance(renamed, ast.UnaryOp):
+    renamed = renamed.value
+  assert renamed == ast.Identifier("X")
+
+
+def test_children_and_with_children() -> None:
+  expr = parse(tokenize("if a then b"))
+  assert children(expr) == (ast.Identifier("a"), ast.Identifier("b"))
+  assert with_children(expr, children(expr)) is expr
+  assert with_children(expr, [ast.Identifier("c"), ast.Identifier("b")]) == parse(tokenize("if c then b"))
+
+
+def test_handlers_of_base_classes() -> None:
+  class Special(ast.Literal):
+    pass
+
+  class LiteralCounter(NodeCounter):
+    def visit_literal(self, node: ast.Literal) -> int:
+      return 100
+
+  assert LiteralCounter().visit(ast.BinaryOp(Special(1), "+", ast.Identifier("a"))) == 102
+
+
+def test_enter_can_skip_subtrees() -> None:
+  class CallsAreOne(NodeCounter):
+    def enter(self, node: ast.Expression) -> int | None:
+      return 1 if isinstance(node, ast.FunctionCall) else None
+
+  assert CallsAreOne().visit(parse(tokenize("1 + f(a, b + c)"))) == 3
@@ -0,0 +1,107 @@
+import pytest
+from compiler import ast, pratt_parser
+from compiler.incremental import IncrementalParser
+from compiler.parser import parse
+from compiler.tokenizer import tokenize
+from compiler.type_checker import Bool, Int, TypeChecker, Unit
+
+
+def check(source: str, **variables: object) -> object:
+  return TypeChecker().check(parse(tokenize(source)), variables)  # type: ignore[arg-type]
+
+
+def test_types_of_expressions() -> None:
+  assert check("1 + 2 * 3") == Int
+  assert check("1 < 2 and not false") == Bool
+  assert check("true == (1 != 2)") == Bool
+  assert check("if true then 1 else 2") == Int
+  assert check("if true then 1") == Unit
+  assert check("print_int(-read_int())") == Unit
+  assert check("x = 3") == Int
+  assert check("while (x < 10) x = x + 1", x=Int) == Unit
+
+
+def test_type_errors() -> None:
+  with pytest.raises(Exception, match=r'line=1, column=3\): operator "\+" expects Int operands, got Int and Bool'):
+    check("1 + true")
+  with pytest.raises(Exception, match='"then" and "else" have different types: Int and Bool'):
+    check("if true then 1 else false")
+  with pytest.raises(Exception, match='condition of "while" must be a Bool, got Int'):
+    check("while 1 x = 1")
+  with pytest.raises(Exception, match='argument 1 of "print_bool" must be Bool, got Int'):
+    check("print_bool(1)")
+  with pytest.raises(Exception, match='function "read_int" expects 0 arguments, got 1'):
+    check("read_int(1)")
+  with pytest.raises(Exception, match='unknown function "f"'):
+    check("f()")
+  with pytest.raises(Exception, match='expects operands of the same type'):
+    check("1 == false")
+
+
+def test_variables() -> None:
+  with pytest.raises(Exception, match='unknown variable "y"'):
+    check("x = y")
+  with pytest.raises(Exception, match='cannot assign Bool to variable "x" of type Int'):
+    check("x = true", x=Int)
+  with pytest.raises(Exception, match='can only assign to a variable'):
+    check("true = false")
+  checker = TypeChecker()
+  expr = parse(tokenize("while (a < b) a = c = a + 1"))
+  assert checker.check(expr, {"a": Int, "b": Int}) == Unit
+  assert checker.variables == {"a": Int, "b": Int, "c": Int}
+
+
+def test_types_are_kept_in_a_side_table() -> None:
+  checker = TypeChecker()
+  expr = parse(tokenize("x = if y then 1 + 2 else 3"))
+  checker.check(expr, {"y": Bool})
+  assert isinstance(expr, ast.BinaryOp) and isinstance(expr.right, ast.IfExpression)
+  assert checker.type_of(expr.right) == Int
+  assert checker.type_of(expr.right.cond) == Bool
+  assert checker.type_of(expr.left) == Int
+  with pytest.raises(Exception, match="has not been type checked"):
+    checker.type_of(parse(tokenize("1 + 2")))
+
+
+def test_user_functions() -> None:
+  checker = TypeChecker({"max": ([Int, Int], Int)})
+  assert checker.check(parse(tokenize("max(1, max(2, 3)) < 4"))) == Bool
+
+
+def test_reuses_unchanged_subtrees() -> None:
+  source = "print_int(\n(a + 1) *\n(b - 2) +\n(a * 3))"
+  incremental = IncrementalParser(source)
+  checker = TypeChecker()
+  variables = {"a": Int, "b": Int}
+  assert checker.check(incremental.tree, variables) == Unit  # type: ignore[arg-type]
+  assert checker.reused_subtrees == 0
+
+  # the same tree is only looked up
+  assert checker.check(incremental.tree, variables) == Unit  # type: ignore[arg-type]
+  assert checker.reused_subtrees == 1
+
+  # '(a + 1)' and '(b - 2)' were reused by the parser
+  tree = incremental.edit(source.index("3"), 1, "4")
+  assert checker.check(tree, variables) == Unit
+  assert checker.reused_subtrees == 2
+
+  # a reused subtree is checked again if the types of its variables changed
+  with pytest.raises(Exception, match='operator "\\+" expects Int operands, got Bool and Int'):
+    checker.check(tree, {"a": Bool, "b": Int})
+
+
+def test_assignments_of_reused_subtrees() -> None:
+  checker = TypeChecker()
+  assignment = parse(tokenize("x = 1"))
+  assert checker.check(ast.BinaryOp(assignment, "+", ast.Identifier("x"))) == Int
+  # reusing 'x = 1' also assigns 'x'
+  assert checker.check(ast.BinaryOp(assignment, "+", ast.Identifier("x"))) == Int
+  assert checker.reused_subtrees == 1
+  assert checker.variables == {"x": Int}
+  # 'x = 1' depends on the type of 'x' before it
+  with pytest.raises(Exception, match="cannot assign Int"):
+    checker.check(assignment, {"x": Bool})
+
+
+def test_deep_trees() -> None:
+  assert TypeChecker().check(pratt_parser.parse(tokenize("- " * 100_000 + "x")), {"x": Int}) == Int